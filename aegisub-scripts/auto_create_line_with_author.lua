@@ -11,7 +11,9 @@ end
 -- Hàm chính để thêm dòng phụ đề mới với tên tác giả
 function add_actor_line(subs, sel)
     local new_sel = {}  -- Tạo bảng chứa các chỉ số dòng mới
-    for i, idx in ipairs(sel) do  -- Lặp qua các chỉ số dòng đã chọn
+    local offset = 0  -- Số dòng đã chèn, các chỉ số phía sau bị dời đi bấy nhiêu
+    for i, sel_idx in ipairs(sel) do  -- Lặp qua các chỉ số dòng đã chọn
+        local idx = sel_idx + offset  -- Chỉ số thực của dòng sau các lần chèn trước đó
         local line = subs[idx]  -- Lấy dòng phụ đề hiện tại
         if line.actor ~= "" then  -- Nếu dòng có tên tác giả
             local new_line = line  -- Sao chép dòng hiện tại
@@ -20,6 +22,7 @@ function add_actor_line(subs, sel)
             new_line.style = "ActorStyle"  -- Thiết lập style cho dòng mới
             subs.insert(idx + 1, new_line)  -- Chèn dòng mới vào sau dòng hiện tại
             table.insert(new_sel, idx + 1)  -- Thêm chỉ số dòng mới vào bảng new_sel
+            offset = offset + 1
         end
     end
     aegisub.set_undo_point("Add Actor Name Line with Style")  -- Đánh dấu điểm hoàn tác
@@ -1,20 +1,25 @@
 # app.py
 import customtkinter as ctk
 from tkinter import filedialog
-import threading
 import json
 import os
 import subprocess
-import datetime
-import queue
-from processor import run_processing_logic
+import threading
+from app_paths import get_app_data_dir
+from job_queue import JobQueue, FINISHED_STATUSES, STATUS_DONE
+from preview import DEFAULT_PREVIEW_CLIP_SECONDS, render_preview
+from processor import format_time
+from status_events import LogBuffer, LogEvent, StatusPipeline
+
+STATUS_POLL_INTERVAL_MS = 100
 
 
-# ... (Hàm get_settings_path và biến SETTINGS_FILE giữ nguyên) ...
 def get_settings_path():
-    app_data_path = os.path.join(os.getenv('APPDATA'), "SubtitleMerger")
-    os.makedirs(app_data_path, exist_ok=True)
-    return os.path.join(app_data_path, "settings.json")
+    return os.path.join(get_app_data_dir(), "settings.json")
+
+
+def get_log_spill_path():
+    return os.path.join(get_app_data_dir(), "log_overflow.txt")
 
 
 SETTINGS_FILE = get_settings_path()
@@ -28,16 +33,17 @@ class VideoApp(ctk.CTk):
         ctk.set_appearance_mode("light")
         ctk.set_default_color_theme("blue")
         self.title("Subtitle Merger")
-        self.geometry("600x600")
+        self.geometry("600x640")
         self.resizable(False, False)
         self.grid_columnconfigure(1, weight=1)
         self.grid_rowconfigure(9, weight=1)
-        self.processing_thread = None
-        self.pause_event = threading.Event()
-        self.pause_event.set()
-        self.cancel_requested = False
+        self.current_job = None
         self.is_paused = False
-        self.log_queue = queue.Queue()
+        self.status_pipeline = StatusPipeline()
+        self.log_buffer = LogBuffer(spill_path=get_log_spill_path())
+        self.job_queue = JobQueue(max_workers=1,
+                                  status_callback=lambda job, message: self.status_pipeline.put(message, job.job_id))
+        self.job_queue.start()
 
         self.create_widgets()
         self.load_settings()
@@ -46,60 +52,40 @@ class VideoApp(ctk.CTk):
         self._process_log_queue()
 
     def _process_log_queue(self):
+        # Mỗi nhịp chỉ vẽ lại tiến trình mới nhất và ghi cả loạt log một lần
         try:
-            while not self.log_queue.empty():
-                message = self.log_queue.get_nowait()
-                self._handle_status_update(message)
-        except queue.Empty:
-            pass
+            progress, logs = self.status_pipeline.drain()
+            if self.current_job and self.current_job.job_id in progress:
+                self._show_progress(progress[self.current_job.job_id])
+            if logs:
+                self._append_log_events(logs)
         finally:
-            self.after(100, self._process_log_queue)
+            self.after(STATUS_POLL_INTERVAL_MS, self._process_log_queue)
 
-    def _handle_status_update(self, message):
-        if message.startswith("PROGRESS|"):
-            try:
-                percentage = int(message.split("|")[1])
-                self.progress_bar.set(percentage / 100)
-            except (ValueError, IndexError):
-                pass
-        elif message.startswith("TIME_INFO|"):
-            try:
-                current_time_str, total_duration_str = message.split("|")[1:3]
-                self.time_info_label.configure(text=f"{current_time_str} / {total_duration_str}")
-            except (ValueError, IndexError):
-                pass
-        else:
-            level = "INFO"
-            # --- THAY ĐỔI: Kiểm tra log không còn icon ---
-            if "Hoàn thành!" in message:
-                level = "SUCCESS"
-            elif "Lỗi:" in message:
-                level = "ERROR"
-            elif "Cảnh báo:" in message:
-                level = "WARNING"
-            elif "Đã hủy bỏ" in message:
-                level = "WARNING"
-            self._log_message(message, level)
-
-    def status_callback(self, message):
-        self.log_queue.put(message)
+    def _show_progress(self, event):
+        self.progress_bar.set(event.percentage / 100)
+        time_info = f"{format_time(event.out_time)} / {format_time(event.total_duration)}"
+        if event.speed > 0:
+            time_info += f"  |  {event.fps:.0f} fps  |  {event.speed:.2f}x"
+        if event.eta is not None and event.out_time < event.total_duration:
+            time_info += f"  |  ETA {format_time(event.eta)}"
+        self.time_info_label.configure(text=time_info)
 
     def _toggle_pause_resume(self):
         self.is_paused = not self.is_paused
         if self.is_paused:
-            self.pause_event.clear()
+            self.job_queue.pause(self.current_job.job_id)
             # --- THAY ĐỔI: Bỏ icon ---
             self.pause_resume_button.configure(text="Resume")
             self._log_message("Quá trình xử lý đã tạm dừng.", "WARNING")
         else:
-            self.pause_event.set()
+            self.job_queue.resume(self.current_job.job_id)
             # --- THAY ĐỔI: Bỏ icon ---
             self.pause_resume_button.configure(text="Pause")
             self._log_message("Quá trình xử lý được tiếp tục.", "INFO")
 
     def _cancel_processing(self):
-        self.cancel_requested = True
-        if self.is_paused: self.pause_event.set()
+        if self.current_job: self.job_queue.cancel(self.current_job.job_id)
         self.cancel_button.configure(state="disabled", text="Đang hủy...")
 
     def _reset_ui_to_idle(self):
@@ -107,9 +93,7 @@ class VideoApp(ctk.CTk):
         self.cancel_button.grid_remove()
         self.process_button.grid(row=0, column=0, columnspan=3, sticky="ew")
         self.process_button.configure(state="normal", text="Bắt đầu Xử lý")
-        log_content = self.log_textbox.get("1.0", "end-1c")
-        # --- THAY ĐỔI: Kiểm tra log không còn icon ---
-        if "Hoàn thành!" in log_content:
+        if self.current_job and self.current_job.status == STATUS_DONE:
             self.post_process_frame.grid()
 
     def _play_video(self):
@@ -129,17 +113,45 @@ class VideoApp(ctk.CTk):
                 self._log_message(f"Không thể mở thư mục: {e}", "ERROR")
 
     def _log_message(self, message: str, level: str = "INFO"):
+        self._append_log_events([LogEvent(message, level.upper())])
+
+    def _append_log_events(self, events):
         try:
-            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            full_message = f"[{timestamp}] [{level.upper()}] {message}\n"
+            evicted = self.log_buffer.extend(events)
             self.log_textbox.configure(state="normal")
-            self.log_textbox.insert("end", full_message, level.upper())
+            if evicted:
+                self.log_textbox.delete("1.0", f"{evicted + 1}.0")
+            for event in self.log_buffer.get_visible(events):
+                self.log_textbox.insert("end", f"{event.format()}\n", event.level)
             self.log_textbox.configure(state="disabled")
             self.log_textbox.see("end")
-            self.update_idletasks()
         except Exception as e:
             print(f"Lỗi khi ghi log: {e}")
 
+    def _collect_params(self):
+        params = {key: var.get() for key, var in self.paths.items()}
+        params.update({key: var.get() for key, var in self.options.items()})
+        return params
+
+    def _start_preview(self, clip_seconds: float):
+        params = self._collect_params()
+        if not all([params['video_path'], params['logo_path'], params['subtitle_path']]):
+            self._log_message("Lỗi: Vui lòng chọn video, logo và phụ đề trước khi xem trước.", "ERROR")
+            return
+        timestamp = self.preview_time.get()
+        self._log_message(f"Đang dựng bản xem trước tại {timestamp}...", "INFO")
+        threading.Thread(target=self._run_preview, args=(params, timestamp, clip_seconds), daemon=True).start()
+
+    def _run_preview(self, params, timestamp, clip_seconds):
+        # Chạy ngoài luồng giao diện; thông báo đi qua status_pipeline như các job thường
+        try:
+            preview_path = render_preview(params, timestamp, clip_seconds, self.status_pipeline.put)
+            if preview_path:
+                self.status_pipeline.put(f"Bản xem trước: {preview_path}")
+                os.startfile(preview_path)
+        except Exception as e:
+            self.status_pipeline.put(f"Lỗi: Không thể tạo bản xem trước: {e}")
+
     def _validate_numeric_input(self, P):
         return P.isdigit() or P == ""
 
@@ -284,35 +296,47 @@ class VideoApp(ctk.CTk):
             button.grid(row=0, column=i, padx=0, pady=0, sticky="ew")
             self.codec_buttons[codec_info['value']] = button
 
+        self.preview_time = ctk.StringVar(value="00:00:10")
+        ctk.CTkLabel(options_frame, text="Xem trước:", text_color="black").grid(row=3, column=0, padx=(10, 5),
+                                                                              pady=(0, 10), sticky="w")
+        preview_frame = ctk.CTkFrame(options_frame, fg_color="transparent")
+        preview_frame.grid(row=3, column=1, columnspan=3, padx=(5, 10), pady=(0, 10), sticky="ew")
+        preview_frame.grid_columnconfigure((0, 1, 2), weight=1)
+        ctk.CTkEntry(preview_frame, textvariable=self.preview_time, border_width=1, border_color="black",
+                     fg_color="white", text_color="black", corner_radius=0).grid(row=0, column=0, padx=(0, 5),
+                                                                                 sticky="ew")
+        ctk.CTkButton(preview_frame, text="Ảnh", command=lambda: self._start_preview(0), fg_color="white",
+                      text_color="black", border_width=1, border_color="black", hover_color="lightgray",
+                      corner_radius=0).grid(row=0, column=1, padx=5, sticky="ew")
+        ctk.CTkButton(preview_frame, text=f"Clip {DEFAULT_PREVIEW_CLIP_SECONDS:.0f}s",
+                      command=lambda: self._start_preview(DEFAULT_PREVIEW_CLIP_SECONDS), fg_color="white",
+                      text_color="black", border_width=1, border_color="black", hover_color="lightgray",
+                      corner_radius=0).grid(row=0, column=2, padx=(5, 0), sticky="ew")
+
     def start_processing_thread(self):
         self.log_textbox.configure(state="normal");
         self.log_textbox.delete("1.0", "end");
         self.log_textbox.configure(state="disabled")
+        self.log_buffer.clear()
         self.post_process_frame.grid_remove()
-        self.cancel_requested = False
         self.is_paused = False
-        self.pause_event.set()
         self.pause_resume_button.configure(text="Pause")
         self.cancel_button.configure(state="normal", text="Cancel")
         self.process_button.grid_remove()
         self.pause_resume_button.grid(row=0, column=0, columnspan=2, padx=(0, 5), sticky="ew")
         self.cancel_button.grid(row=0, column=2, columnspan=1, padx=(5, 0), sticky="ew")
-        params = {key: var.get() for key, var in self.paths.items()}
-        params.update({key: var.get() for key, var in self.options.items()})
+        params = self._collect_params()
         if not all([params['video_path'], params['logo_path'], params['subtitle_path'], params['output_path']]):
             self._log_message("Lỗi: Vui lòng điền đầy đủ các đường dẫn file.", "ERROR")
             self._reset_ui_to_idle()
             return
         self.progress_bar.set(0)
         self.time_info_label.configure(text="00:00:00 / 00:00:00")
-        self.processing_thread = threading.Thread(target=run_processing_logic,
-                                                  args=(params, self.status_callback, self.pause_event,
-                                                        lambda: self.cancel_requested))
-        self.processing_thread.start()
+        self.current_job = self.job_queue.submit(params)
         self.check_thread()
 
     def check_thread(self):
-        if self.processing_thread and self.processing_thread.is_alive():
+        if self.current_job and self.current_job.status not in FINISHED_STATUSES:
             self.after(100, self.check_thread)
         else:
             self._reset_ui_to_idle()
@@ -336,9 +360,8 @@ class VideoApp(ctk.CTk):
             print(f"Lỗi khi lưu cài đặt: {e}")
 
     def on_closing(self):
-        self.cancel_requested = True
-        if self.processing_thread and self.processing_thread.is_alive():
-            self.processing_thread.join(timeout=1)
+        self.job_queue.shutdown()
+        self.log_buffer.close()
         self.save_settings()
         self.destroy()
 
@@ -0,0 +1,79 @@
+# app_paths.py
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+
+APP_DIR_NAME = "SubtitleMerger"
+
+
+def get_app_data_dir() -> str:
+    if sys.platform == "win32" and os.getenv('APPDATA'):
+        base_path = os.getenv('APPDATA')
+    else:
+        base_path = os.getenv('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser("~"), ".config")
+    app_data_path = os.path.join(base_path, APP_DIR_NAME)
+    os.makedirs(app_data_path, exist_ok=True)
+    return app_data_path
+
+
+def get_cache_dir(name: str) -> str:
+    if sys.platform == "win32" and (os.getenv('LOCALAPPDATA') or os.getenv('APPDATA')):
+        base_path = os.path.join(os.getenv('LOCALAPPDATA') or os.getenv('APPDATA'), APP_DIR_NAME, "cache")
+    else:
+        base_path = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser("~"), ".cache"),
+                                 APP_DIR_NAME)
+    cache_path = os.path.join(base_path, name)
+    os.makedirs(cache_path, exist_ok=True)
+    return cache_path
+
+
+def get_temp_path(path: str, suffix: str = ".tmp") -> str:
+    # Tên riêng theo tiến trình và luồng để các job chạy song song không ghi đè file tạm của nhau
+    return f"{path}.{os.getpid()}.{threading.get_ident()}{suffix}"
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', encoding: str | None = 'utf-8', fsync: bool = False):
+    """Ghi vào file tạm cạnh path rồi os.replace, người đọc không bao giờ thấy file ghi dở."""
+    temp_path = get_temp_path(path)
+    try:
+        with open(temp_path, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _get_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def evict_lru(directory: str, max_entries: int, predicate=None) -> list[str]:
+    """Giữ tối đa max_entries mục (file hoặc thư mục) dùng gần nhất theo mtime; predicate(name) chọn mục được tính.
+
+    Nơi dùng lại một mục cần os.utime nó để mục đó không bị xóa trước.
+    """
+    entries = [os.path.join(directory, name) for name in os.listdir(directory) if predicate is None or predicate(name)]
+    if len(entries) <= max_entries:
+        return []
+    entries.sort(key=_get_mtime)
+    removed = []
+    for path in entries[:len(entries) - max_entries]:
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError:
+            continue
+        removed.append(path)
+    return removed
@@ -0,0 +1,147 @@
+# ass_events.py
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+
+ASS_TIME_PATTERN = re.compile(r"^(\d+):(\d{1,2}):(\d{1,2})(?:[.:](\d{1,3}))?$")
+OVERRIDE_TAG_PATTERN = re.compile(r"\{[^}]*\}")
+DEFAULT_EVENT_FORMAT = ["Layer", "Start", "End", "Style", "Name", "MarginL", "MarginR", "MarginV", "Effect", "Text"]
+# Các khóa [Script Info] libass dùng khi dựng (Kerning bật tắt kerning, Language chọn quy tắc shaping)
+RENDER_SCRIPT_INFO_KEYS = ("playresx", "playresy", "layoutresx", "layoutresy", "wrapstyle", "scaledborderandshadow",
+                           "ycbcr matrix", "kerning", "language")
+RENDER_HEADER_SECTIONS = ("[v4+ styles]", "[v4 styles]", "[fonts]", "[graphics]")
+DEFAULT_STYLE_FORMAT = ["Name", "Fontname", "Fontsize", "PrimaryColour", "SecondaryColour", "OutlineColour",
+                        "BackColour", "Bold", "Italic", "Underline", "StrikeOut", "ScaleX", "ScaleY", "Spacing",
+                        "Angle", "BorderStyle", "Outline", "Shadow", "Alignment", "MarginL", "MarginR", "MarginV",
+                        "Encoding"]
+
+
+@dataclass(frozen=True)
+class AssEvent:
+    start: float
+    end: float
+    style: str
+    name: str
+    text: str
+    raw: str = field(default="", compare=False)
+
+    def is_visible(self) -> bool:
+        return self.end > self.start and OVERRIDE_TAG_PATTERN.sub("", self.text).replace("\\N", "").strip() != ""
+
+
+def parse_ass_time(value: str) -> float:
+    match = ASS_TIME_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Thời gian ASS không hợp lệ: {value}")
+    hours, minutes, seconds = map(int, match.groups()[:3])
+    fraction = match.group(4) or "0"
+    return hours * 3600 + minutes * 60 + seconds + int(fraction) / (10 ** len(fraction))
+
+
+def read_ass_lines(subtitle_path: str) -> list[str]:
+    with open(subtitle_path, 'r', encoding='utf-8-sig', errors='ignore') as f:
+        return f.read().splitlines()
+
+
+def parse_events(lines) -> list[AssEvent]:
+    events = []
+    section = ""
+    event_format = DEFAULT_EVENT_FORMAT
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            section = stripped.lower()
+            continue
+        if section != "[events]":
+            continue
+        key, _, value = stripped.partition(":")
+        if key == "Format":
+            event_format = [field.strip() for field in value.split(",")]
+        elif key == "Dialogue":
+            fields = [field.strip() for field in value.split(",", len(event_format) - 1)]
+            if len(fields) < len(event_format):
+                continue
+            record = dict(zip(event_format, fields))
+            try:
+                start = parse_ass_time(record["Start"])
+                end = parse_ass_time(record["End"])
+            except (KeyError, ValueError):
+                continue
+            events.append(AssEvent(start, end, record.get("Style", ""), record.get("Name", ""), record.get("Text", ""),
+                                   stripped))
+    return events
+
+
+def parse_styles(lines) -> dict[str, dict]:
+    styles = {}
+    section = ""
+    style_format = DEFAULT_STYLE_FORMAT
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            section = stripped.lower()
+            continue
+        if section not in ("[v4+ styles]", "[v4 styles]"):
+            continue
+        key, _, value = stripped.partition(":")
+        if key == "Format":
+            style_format = [field.strip() for field in value.split(",")]
+        elif key == "Style":
+            record = dict(zip(style_format, (field.strip() for field in value.split(","))))
+            if record.get("Name"):
+                styles[record["Name"]] = record
+    return styles
+
+
+def get_render_header_lines(lines) -> list[str]:
+    # Chỉ lấy phần header ảnh hưởng tới cách libass vẽ mọi dòng; [Aegisub Project Garbage] và các khóa như
+    # Scroll Position bị Aegisub ghi lại ở mỗi lần lưu nên không được tính vào
+    header = []
+    section = ""
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            section = stripped.lower()
+            continue
+        if not stripped or stripped.startswith(";"):
+            continue
+        if section == "[script info]":
+            if stripped.partition(":")[0].strip().lower() in RENDER_SCRIPT_INFO_KEYS:
+                header.append(stripped)
+        elif section in RENDER_HEADER_SECTIONS:
+            header.append(f"{section}{stripped}")
+    return header
+
+
+def load_events(subtitle_path: str) -> list[AssEvent]:
+    return parse_events(read_ass_lines(subtitle_path))
+
+
+def merge_ranges(ranges, gap: float = 0.0) -> list[tuple[float, float]]:
+    merged = []
+    for start, end in sorted(r for r in ranges if r[1] > r[0]):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def get_active_ranges(events) -> list[tuple[float, float]]:
+    return merge_ranges((event.start, event.end) for event in events if event.is_visible())
+
+
+def widen_to_keyframes(ranges, keyframe_times, duration: float) -> list[tuple[float, float]]:
+    keyframes = sorted(keyframe_times) or [0.0]
+    widened = []
+    for start, end in ranges:
+        start_index = bisect_right(keyframes, start) - 1
+        end_index = bisect_left(keyframes, end)
+        widened_start = keyframes[start_index] if start_index >= 0 else 0.0
+        widened_end = keyframes[end_index] if end_index < len(keyframes) else duration
+        widened.append((max(0.0, widened_start), min(duration, widened_end)))
+    return merge_ranges(widened)
+
+
+def overlaps_any(ranges, start: float, end: float, tolerance: float = 0.001) -> bool:
+    return any(start < range_end - tolerance and end > range_start + tolerance for range_start, range_end in ranges)
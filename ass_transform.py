@@ -0,0 +1,213 @@
+# ass_transform.py
+import hashlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from app_paths import atomic_write, evict_lru, get_cache_dir
+from ass_events import DEFAULT_EVENT_FORMAT
+from render_journal import hash_file
+
+TRANSFORM_VERSION = 1
+DEFAULT_SPEAKER_NAMES = ("LILY", "HAEWON", "KYUJIN", "SULLYOON", "BAE", "JIWOO")
+ACTOR_STYLE_NAME = "ActorStyle"
+SUBTITLE_CACHE_MAX_ENTRIES = 200
+DEFAULT_OUTPUT_SUFFIX = ".speakers"
+
+
+@dataclass
+class TransformResult:
+    source: str
+    output: str = ""
+    speakers: dict = field(default_factory=dict)
+    actor_lines: int = 0
+    kept_actor_lines: int = 0
+    added_style: bool = False
+    error: str = ""
+
+
+def parse_speaker_names(value) -> list[str]:
+    # Nhận danh sách, chuỗi phân tách bằng dấu phẩy hoặc đường dẫn tới file mỗi dòng một tên
+    if not value:
+        return list(DEFAULT_SPEAKER_NAMES)
+    if isinstance(value, str):
+        if os.path.isfile(value):
+            with open(value, 'r', encoding='utf-8-sig') as f:
+                value = [line for line in f.read().splitlines() if not line.strip().startswith("#")]
+        else:
+            value = value.split(",")
+    names = [name.strip() for name in value if name.strip()]
+    if not names:
+        raise ValueError("Danh sách tên người nói đang trống.")
+    return names
+
+
+def build_speaker_pattern(names) -> re.Pattern:
+    # Một biểu thức duy nhất cho mọi tên; tên dài đứng trước để "BAE" không nuốt mất "BAEK"
+    alternatives = "|".join(re.escape(name) for name in sorted(set(names), key=len, reverse=True))
+    return re.compile(rf"^(?P<tags>(?:\{{[^}}]*\}})*)(?P<name>{alternatives})\s*:\s*", re.IGNORECASE)
+
+
+def _build_actor_style(style_format, styles: dict, style_name: str) -> str:
+    # Chưa có style cho dòng tên thì sao từ Default để dòng tên trông giống phần còn lại của phụ đề
+    base = styles.get("Default") or next(iter(styles.values()), None)
+    if base is None:
+        return ""
+    record = dict(zip(style_format, base))
+    record["Name"] = style_name
+    return "Style: " + ",".join(record.get(key, "0") for key in style_format)
+
+
+def transform_lines(lines, pattern: re.Pattern, result: TransformResult, style_name: str = ACTOR_STYLE_NAME):
+    """Tách tên người nói ở đầu câu sang cột Name và chèn ngay sau mỗi câu một dòng tên dùng style_name.
+
+    Đọc và sinh từng dòng nên không cần nạp cả file; chạy lại trên file đã xử lý không sinh thêm dòng tên.
+    result.actor_lines chỉ đếm dòng tên mới chèn, dòng tên đã có sẵn được đếm vào result.kept_actor_lines.
+    """
+    section = ""
+    style_format = None
+    styles = {}
+    event_format = DEFAULT_EVENT_FORMAT
+    pending_actor_line = None
+    for line in lines:
+        if pending_actor_line is not None:
+            actor_line, pending_actor_line = pending_actor_line, None
+            if line == actor_line:
+                # Dòng tên do lần chạy trước sinh ra
+                result.kept_actor_lines += 1
+                yield line
+                continue
+            result.actor_lines += 1
+            yield actor_line
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            if section in ("[v4+ styles]", "[v4 styles]") and style_name not in styles and style_format:
+                style_line = _build_actor_style(style_format, styles, style_name)
+                if style_line:
+                    result.added_style = True
+                    yield style_line
+            section = stripped.lower()
+            yield line
+            continue
+        key, _, value = line.partition(":")
+        key = key.strip()
+        if section in ("[v4+ styles]", "[v4 styles]"):
+            if key == "Format":
+                style_format = [item.strip() for item in value.split(",")]
+            elif key == "Style":
+                fields = [item.strip() for item in value.split(",")]
+                styles[fields[0]] = fields
+            yield line
+            continue
+        if section != "[events]" or key not in ("Format", "Dialogue"):
+            yield line
+            continue
+        if key == "Format":
+            event_format = [item.strip() for item in value.split(",")]
+            yield line
+            continue
+        fields = value.split(",", len(event_format) - 1)
+        if len(fields) < len(event_format):
+            yield line
+            continue
+        record = dict(zip(event_format, range(len(fields))))
+        name_index, text_index, style_index = record.get("Name"), record.get("Text"), record.get("Style")
+        if name_index is None or text_index is None or style_index is None:
+            yield line
+            continue
+        match = pattern.match(fields[text_index])
+        if match:
+            speaker = match.group("name").upper()
+            fields[name_index] = speaker
+            fields[text_index] = match.group("tags") + fields[text_index][match.end():]
+            result.speakers[speaker] = result.speakers.get(speaker, 0) + 1
+        output_line = f"{line.partition(':')[0]}:{','.join(fields)}"
+        yield output_line
+        speaker = fields[name_index].strip()
+        if speaker and fields[style_index].strip() != style_name:
+            fields[name_index] = ""
+            fields[style_index] = style_name
+            fields[text_index] = speaker
+            # Chỉ chèn khi biết dòng tiếp theo không phải chính dòng tên này
+            pending_actor_line = f"{line.partition(':')[0]}:{','.join(fields)}"
+    if pending_actor_line is not None:
+        result.actor_lines += 1
+        yield pending_actor_line
+
+
+def transform_file(source_path: str, output_path: str, names=None, style_name: str = ACTOR_STYLE_NAME) -> TransformResult:
+    result = TransformResult(source=source_path, output=output_path)
+    pattern = build_speaker_pattern(parse_speaker_names(names))
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(source_path, 'r', encoding='utf-8-sig', errors='ignore') as source, \
+            atomic_write(output_path, encoding='utf-8-sig') as target:
+        for line in transform_lines((line.rstrip("\r\n") for line in source), pattern, result, style_name):
+            target.write(line + "\n")
+    return result
+
+
+def _transform_file_worker(task) -> TransformResult:
+    source_path, output_path, names, style_name = task
+    try:
+        return transform_file(source_path, output_path, names, style_name)
+    except (OSError, ValueError) as e:
+        return TransformResult(source=source_path, output=output_path, error=str(e))
+
+
+def find_subtitle_files(paths, skip_suffix: str = DEFAULT_OUTPUT_SUFFIX) -> list[str]:
+    # Bỏ qua các file do lần chạy trước sinh ra cạnh file gốc
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if name.lower().endswith(".ass") and not name.lower().endswith(f"{skip_suffix}.ass"))
+        else:
+            files.append(path)
+    return files
+
+
+def get_output_path(source_path: str, output_dir: str | None = None, base_dir: str | None = None,
+                    suffix: str = DEFAULT_OUTPUT_SUFFIX) -> str:
+    if output_dir:
+        relative = os.path.relpath(source_path, base_dir) if base_dir else os.path.basename(source_path)
+        return os.path.join(output_dir, relative)
+    root, extension = os.path.splitext(source_path)
+    return f"{root}{suffix}{extension}"
+
+
+def transform_files(pairs, names=None, style_name: str = ACTOR_STYLE_NAME, workers: int | None = None,
+                    on_result=None) -> list[TransformResult]:
+    """Xử lý song song nhiều file; pairs là danh sách (nguồn, đích). Lỗi của từng file nằm trong result.error."""
+    names = parse_speaker_names(names)
+    tasks = [(source_path, output_path, names, style_name) for source_path, output_path in pairs]
+    results = []
+    if len(tasks) <= 1 or workers == 1:
+        for task in tasks:
+            results.append(_transform_file_worker(task))
+            if on_result:
+                on_result(results[-1])
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_transform_file_worker, tasks, chunksize=max(1, len(tasks) // 32)):
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+def prepare_speaker_subtitle(source_path: str, names=None, style_name: str = ACTOR_STYLE_NAME,
+                             cache_dir: str | None = None) -> tuple[str, TransformResult | None]:
+    # Tên file theo nội dung phụ đề và cấu hình nên chạy lại job (resume, cache kết quả) thấy cùng một file
+    names = parse_speaker_names(names)
+    cache_dir = cache_dir or get_cache_dir("subtitles")
+    key = hashlib.sha1("\n".join([str(TRANSFORM_VERSION), hash_file(source_path), style_name, *names])
+                       .encode('utf-8')).hexdigest()
+    output_path = os.path.join(cache_dir, f"{key}.ass")
+    if os.path.exists(output_path):
+        os.utime(output_path)
+        return output_path, None
+    result = transform_file(source_path, output_path, names, style_name)
+    evict_lru(cache_dir, SUBTITLE_CACHE_MAX_ENTRIES, lambda name: name.endswith(".ass"))
+    return output_path, result
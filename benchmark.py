@@ -0,0 +1,298 @@
+# benchmark.py
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from ass_events import DEFAULT_EVENT_FORMAT
+from processor import get_ffmpeg_path, run_processing_logic
+from progress import ProgressEvent
+
+try:
+    import resource
+except ImportError:  # Windows: không đo được CPU/RSS của tiến trình con bằng thư viện chuẩn
+    resource = None
+
+BENCHMARK_VERSION = 1
+DEFAULT_RESOLUTIONS = "640x360,1280x720"
+DEFAULT_DURATIONS = "30"
+DEFAULT_FPS = 25
+DEFAULT_EVENTS_PER_MINUTE = 20
+DEFAULT_SUBTITLE_COVERAGE = 0.8
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+# subtitle: phụ đề sinh riêng cho cấu hình; smart render chỉ có lợi khi logo hiện ngắn và phụ đề thưa
+DEFAULT_CONFIGS = [
+    {'name': "x264", 'params': {}},
+    {'name': "x264-2threads", 'params': {'threads': 2}},
+    {'name': "x264-1500k", 'params': {'bitrate': "1500"}},
+    {'name': "segmented-2", 'params': {'parallel_segments': 2}},
+    {'name': "smart-render", 'params': {'smart_render': True, 'logo_start': "0", 'logo_end': "4"},
+     'subtitle': {'events_per_minute': 3, 'coverage': 0.15}},
+    {'name': "multi-output", 'params': {'outputs': [{'path': "{output}.720.mp4", 'height': 720},
+                                                    {'path': "{output}.360.mp4", 'height': 360, 'bitrate': 800}]}},
+]
+BASE_PARAMS = {'logo_width': "110", 'margin_top': "10", 'margin_right': "10", 'bitrate': "3000", 'codec': "libx264"}
+
+
+def _run_generator(command):
+    result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+    if result.returncode != 0:
+        raise RuntimeError(f"Không thể tạo dữ liệu benchmark: {result.stderr.strip().splitlines()[-1:]}")
+
+
+def generate_video(path: str, ffmpeg_executable: str, width: int, height: int, duration: float, fps: int):
+    # GOP 2 giây cố định để các chế độ cắt theo keyframe có kết quả ổn định giữa các lần chạy
+    _run_generator([ffmpeg_executable, '-y', '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={fps}",
+                    '-f', 'lavfi', '-i', "sine=frequency=440:sample_rate=48000", '-t', f"{duration}",
+                    '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(fps * 2), '-pix_fmt', 'yuv420p',
+                    '-c:a', 'aac', '-b:a', '128k', path])
+
+
+def generate_logo(path: str, ffmpeg_executable: str):
+    _run_generator([ffmpeg_executable, '-y', '-f', 'lavfi', '-i', "color=c=red@0.8:size=200x80,format=rgba",
+                    '-frames:v', '1', path])
+
+
+def _format_ass_time(seconds: float) -> str:
+    centiseconds = int(round(seconds * 100))
+    return (f"{centiseconds // 360000}:{centiseconds // 6000 % 60:02}:{centiseconds // 100 % 60:02}."
+            f"{centiseconds % 100:02}")
+
+
+def generate_subtitle(path: str, duration: float, events_per_minute: int, styled: bool,
+                      coverage: float = DEFAULT_SUBTITLE_COVERAGE):
+    # coverage: tỉ lệ thời lượng video có phụ đề
+    lines = ["[Script Info]", "ScriptType: v4.00+", "PlayResX: 1280", "PlayResY: 720", "",
+             "[V4+ Styles]",
+             "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, "
+             "Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+             "MarginL, MarginR, MarginV, Encoding",
+             "Style: Default,DejaVu Sans,48,&H00FFFFFF,&H000000FF,&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,3,1,2,"
+             "20,20,30,1",
+             "Style: Top,DejaVu Sans,40,&H0000FFFF,&H000000FF,&H00000000,&H64000000,1,0,0,0,100,100,0,0,1,3,1,8,"
+             "20,20,30,1",
+             "", "[Events]", f"Format: {', '.join(DEFAULT_EVENT_FORMAT)}"]
+    count = int(duration / 60 * events_per_minute)
+    step = duration / count if count else duration
+    for index in range(count):
+        start = index * step
+        end = start + step * coverage
+        text = f"Dòng phụ đề số {index + 1}\\Nkiểm tra tốc độ xử lý"
+        if styled:
+            text = f"{{\\fad(150,150)\\bord4\\blur2\\c&H{(index * 2654435761) % 0xFFFFFF:06X}&}}{text}"
+        style = "Top" if styled and index % 3 == 0 else "Default"
+        lines.append(f"Dialogue: 0,{_format_ass_time(start)},{_format_ass_time(end)},{style},,0,0,0,,{text}")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def prepare_inputs(work_dir: str, ffmpeg_executable: str, resolutions, durations, fps: int,
+                   events_per_minute: int, styled: bool) -> list[dict]:
+    os.makedirs(work_dir, exist_ok=True)
+    logo_path = os.path.join(work_dir, "logo.png")
+    if not os.path.exists(logo_path):
+        generate_logo(logo_path, ffmpeg_executable)
+    inputs = []
+    for width, height in resolutions:
+        for duration in durations:
+            name = f"{width}x{height}-{duration:g}s"
+            video_path = os.path.join(work_dir, f"{name}.mp4")
+            if not os.path.exists(video_path):
+                print(f"Đang tạo video mẫu {name}...", flush=True)
+                generate_video(video_path, ffmpeg_executable, width, height, duration, fps)
+            subtitle_name = f"{duration:g}s-{events_per_minute}epm{'-styled' if styled else ''}.ass"
+            subtitle_path = os.path.join(work_dir, subtitle_name)
+            generate_subtitle(subtitle_path, duration, events_per_minute, styled)
+            inputs.append({'name': name, 'video_path': video_path, 'logo_path': logo_path,
+                           'subtitle_path': subtitle_path, 'duration': duration,
+                           'events_per_minute': events_per_minute, 'styled': styled})
+    return inputs
+
+
+def _expand_outputs(params: dict, output_path: str) -> dict:
+    if params.get('outputs'):
+        params['outputs'] = [{**profile, 'path': profile['path'].replace("{output}", output_path)}
+                             for profile in params['outputs']]
+    return params
+
+
+def run_worker(params: dict) -> int:
+    # Chạy trong tiến trình con riêng để số liệu CPU/RSS chỉ tính cho đúng một cấu hình
+    result = {'completed': False, 'fps': 0.0, 'error': ""}
+
+    def status_callback(message):
+        # Sự kiện tiến trình cuối cùng là bản tổng kết với fps trung bình của cả job
+        if isinstance(message, ProgressEvent):
+            result['fps'] = message.fps
+        elif message.startswith("Lỗi:"):
+            result['error'] = message
+
+    pause_event = threading.Event()
+    pause_event.set()
+    result['completed'] = run_processing_logic(params, status_callback, pause_event, lambda: False)
+    print(json.dumps(result))
+    return 0 if result['completed'] else 1
+
+
+def _get_max_rss_mb(usage) -> float:
+    # ru_maxrss tính bằng KB trên Linux nhưng bằng byte trên macOS
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_case(case_input: dict, config: dict, work_dir: str, ffmpeg_executable: str) -> dict:
+    output_path = os.path.join(work_dir, "out", f"{case_input['name']}-{config['name']}.mp4")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    params = dict(BASE_PARAMS)
+    params.update({key: case_input[key] for key in ('video_path', 'logo_path', 'subtitle_path')})
+    params['output_path'] = output_path
+    subtitle_options = config.get('subtitle')
+    if subtitle_options:
+        params['subtitle_path'] = os.path.join(work_dir, f"{case_input['duration']:g}s-{config['name']}.ass")
+        generate_subtitle(params['subtitle_path'], case_input['duration'],
+                          subtitle_options.get('events_per_minute', case_input['events_per_minute']),
+                          case_input['styled'], subtitle_options.get('coverage', DEFAULT_SUBTITLE_COVERAGE))
+    params.update(json.loads(json.dumps(config.get('params', {}))))
+    params = _expand_outputs(params, output_path)
+
+    environment = dict(os.environ, SUBTITLE_MERGER_FFMPEG=ffmpeg_executable)
+    started_at = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "_worker", json.dumps(params)],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=environment, text=True)
+    stdout = process.stdout.read()
+    if resource is not None:
+        # wait4 trả về tài nguyên của tiến trình worker cộng với các tiến trình ffmpeg nó đã chờ
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+        peak_rss_mb = _get_max_rss_mb(usage)
+    else:
+        process.wait()
+        cpu_seconds = peak_rss_mb = None
+    wall_time = time.perf_counter() - started_at
+
+    try:
+        worker_result = json.loads(stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        worker_result = {'completed': False, 'fps': 0.0, 'error': "Worker không trả về kết quả."}
+    return {'input': case_input['name'], 'config': config['name'], 'completed': worker_result['completed'],
+            'error': worker_result['error'], 'media_duration': case_input['duration'],
+            'wall_time': round(wall_time, 3), 'realtime_factor': round(case_input['duration'] / wall_time, 3),
+            'average_fps': round(worker_result['fps'], 1),
+            'cpu_seconds': round(cpu_seconds, 3) if cpu_seconds is not None else None,
+            'cpu_utilization': round(cpu_seconds / wall_time, 3) if cpu_seconds is not None else None,
+            'peak_rss_mb': round(peak_rss_mb, 1) if peak_rss_mb is not None else None}
+
+
+def _median_run(runs: list[dict]) -> dict:
+    completed = [run for run in runs if run['completed']] or runs
+    result = dict(sorted(completed, key=lambda run: run['wall_time'])[len(completed) // 2])
+    result['wall_times'] = [run['wall_time'] for run in runs]
+    result['wall_time_stdev'] = round(statistics.pstdev(result['wall_times']), 3)
+    return result
+
+
+def compare_with_baseline(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    baseline_cases = {(case['input'], case['config']): case for case in baseline.get('cases', [])}
+    regressions = []
+    print("\nINPUT            CONFIG           WALL      BASELINE  DELTA")
+    for case in results:
+        previous = baseline_cases.get((case['input'], case['config']))
+        if not previous or not previous['completed'] or not case['completed']:
+            print(f"{case['input']:<16} {case['config']:<16} {case['wall_time']:<9.2f} {'-':<9} -")
+            continue
+        delta = (case['wall_time'] - previous['wall_time']) / previous['wall_time']
+        marker = ""
+        if delta > threshold:
+            marker = "  CHẬM HƠN"
+            regressions.append(f"{case['input']} / {case['config']}: {delta:+.1%}")
+        print(f"{case['input']:<16} {case['config']:<16} {case['wall_time']:<9.2f} {previous['wall_time']:<9.2f} "
+              f"{delta:+.1%}{marker}")
+    return regressions
+
+
+def _parse_resolutions(value: str):
+    resolutions = []
+    for item in value.split(","):
+        width, _, height = item.strip().partition("x")
+        resolutions.append((int(width), int(height)))
+    return resolutions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmark", description="Đo hiệu năng chèn logo và phụ đề trên dữ liệu tổng hợp.")
+    parser.add_argument("--work-dir", default="benchmark_data", help="Thư mục chứa dữ liệu mẫu và file đầu ra.")
+    parser.add_argument("--ffmpeg", default=None, help="Đường dẫn ffmpeg (mặc định giống ứng dụng).")
+    parser.add_argument("--resolutions", default=DEFAULT_RESOLUTIONS, help="Ví dụ: 640x360,1920x1080")
+    parser.add_argument("--durations", default=DEFAULT_DURATIONS, help="Độ dài video mẫu (giây), ví dụ: 30,120")
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS)
+    parser.add_argument("--events-per-minute", type=int, default=DEFAULT_EVENTS_PER_MINUTE)
+    parser.add_argument("--styled", action="store_true", help="Thêm tag định dạng (màu, viền, blur, fade) vào phụ đề.")
+    parser.add_argument("--configs", default=None, help="File JSON danh sách cấu hình {name, params}.")
+    parser.add_argument("--only", default=None, help="Chỉ chạy các cấu hình có tên trong danh sách, cách nhau bởi dấu phẩy.")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần chạy mỗi cấu hình, lấy kết quả trung vị.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="File kết quả cũ để so sánh.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Ngưỡng chậm hơn (tỉ lệ) để coi là hồi quy.")
+    return parser
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["_worker"]:
+        return run_worker(json.loads(argv[1]))
+
+    args = build_parser().parse_args(argv)
+    ffmpeg_executable = os.path.abspath(args.ffmpeg) if args.ffmpeg else get_ffmpeg_path()
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+    if args.only:
+        names = {name.strip() for name in args.only.split(",")}
+        configs = [config for config in configs if config['name'] in names]
+
+    inputs = prepare_inputs(os.path.abspath(args.work_dir), ffmpeg_executable, _parse_resolutions(args.resolutions),
+                            [float(value) for value in args.durations.split(",")], args.fps,
+                            args.events_per_minute, args.styled)
+    results = []
+    for case_input in inputs:
+        for config in configs:
+            runs = []
+            for _ in range(max(1, args.repeat)):
+                runs.append(run_case(case_input, config, os.path.abspath(args.work_dir), ffmpeg_executable))
+            case = _median_run(runs)
+            results.append(case)
+            status = "OK" if case['completed'] else f"LỖI {case['error']}"
+            print(f"{case['input']:<16} {case['config']:<16} {case['wall_time']:>7.2f}s "
+                  f"{case['realtime_factor']:>6.2f}x  CPU {case['cpu_utilization'] or 0:>5.2f}  "
+                  f"RSS {case['peak_rss_mb'] or 0:>7.1f} MB  {status}", flush=True)
+
+    report = {'version': BENCHMARK_VERSION, 'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+              'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                          'cpu_count': os.cpu_count()},
+              'settings': {'resolutions': args.resolutions, 'durations': args.durations, 'fps': args.fps,
+                           'events_per_minute': args.events_per_minute, 'styled': args.styled,
+                           'repeat': args.repeat},
+              'cases': results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Đã ghi kết quả vào {args.output}")
+
+    exit_code = 0 if all(case['completed'] for case in results) else 1
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f), args.threshold)
+        if regressions:
+            print("Hồi quy hiệu năng:\n  " + "\n  ".join(regressions))
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# cli.py
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+from app_paths import get_app_data_dir
+from distributed import DEFAULT_PORT, Coordinator, RenderWorker, parse_path_map, serve_coordinator
+from ass_transform import (ACTOR_STYLE_NAME, find_subtitle_files, get_output_path, parse_speaker_names,
+                           transform_files)
+from job_queue import DEFAULT_OPTIONS, FINISHED_STATUSES, JobQueue, load_manifest
+from preview import render_preview
+from render_cache import get_render_cache_dir, list_entries, prune
+from processor import format_time
+from progress import ProgressEvent, SegmentEvent
+
+PROGRESS_PRINT_STEP = 10
+
+
+def get_default_state_path() -> str:
+    return os.path.join(get_app_data_dir(), "queue_state.json")
+
+
+def make_console_callback():
+    last_printed = {}
+
+    def status_callback(job, message):
+        if isinstance(message, ProgressEvent):
+            step = message.percentage // PROGRESS_PRINT_STEP
+            if step <= last_printed.get(job.job_id, -1):
+                return
+            last_printed[job.job_id] = step
+            eta = f", ETA {format_time(message.eta)}" if message.eta else ""
+            print(f"[{job.job_id}] {message.percentage}% {format_time(message.out_time)} / "
+                  f"{format_time(message.total_duration)} ({message.fps:.0f} fps, {message.speed:.2f}x{eta})",
+                  flush=True)
+        elif isinstance(message, SegmentEvent):
+            print(f"[{job.job_id}] {message.describe()}", flush=True)
+        else:
+            print(f"[{job.job_id}] {message}", flush=True)
+
+    return status_callback
+
+
+def print_summary(summary, summary_path=None):
+    print("\nJOB       STATUS     WALL      MEDIA     SPEED   FPS     OUTPUT")
+    for row in summary:
+        print(f"{row['job_id']:<9} {row['status']:<10} {format_time(row['wall_time']):<9} "
+              f"{format_time(row['media_duration']):<9} {row['realtime_factor']:<7.2f} {row['average_fps']:<7.1f} "
+              f"{row['output']}")
+    total_wall = sum(row['wall_time'] for row in summary)
+    total_media = sum(row['media_duration'] for row in summary)
+    print(f"Tổng: {len(summary)} job, {format_time(total_media)} video, {format_time(total_wall)} xử lý.")
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+def submit_manifest(job_queue: JobQueue, manifest_path: str) -> bool:
+    # Đọc hết manifest trước khi thêm để một dòng sai không để lại nửa số job trong hàng đợi
+    try:
+        manifest = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"Lỗi: Không đọc được manifest: {e}")
+        return False
+    for params in manifest:
+        job = job_queue.submit(params)
+        print(f"[{job.job_id}] Đã thêm: {params.get('video_path', '')} -> {params.get('output_path', '')}")
+    return True
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_queue(job_queue: JobQueue, summary_path=None) -> int:
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    started_at = time.time()
+    job_queue.start()
+    try:
+        job_queue.wait()
+    except KeyboardInterrupt:
+        print("Đang dừng, các job đang chạy sẽ được tiếp tục ở lần chạy sau...", flush=True)
+        job_queue.shutdown(requeue_running=True)
+        return 130
+    job_queue.shutdown()
+    summary = job_queue.summary(current_run=True)
+    print_summary(summary, summary_path)
+    print(f"Thời gian thực tế: {format_time(time.time() - started_at)}")
+    return 0 if all(row['status'] == "done" for row in summary) else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="subtitle-merger", description="Chèn logo và phụ đề hàng loạt không cần giao diện.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_queue_arguments(subparser):
+        subparser.add_argument("--state", default=None, help="File lưu trạng thái hàng đợi (mặc định trong thư mục ứng dụng).")
+        subparser.add_argument("--workers", type=int, default=1, help="Số tiến trình ffmpeg chạy đồng thời.")
+        subparser.add_argument("--threads", type=int, default=0, help="Giới hạn số luồng encoder cho mỗi job (0 = tự động).")
+        subparser.add_argument("--summary", default=None, help="Ghi bảng tổng kết ra file JSON.")
+        subparser.add_argument("--metrics-dir", default=None, help="Thư mục ghi số liệu từng job (JSON-lines).")
+        subparser.add_argument("--metrics-textfile", default=None,
+                               help="File .prom cho Prometheus node_exporter textfile collector.")
+        subparser.add_argument("--render-cache", action="store_true",
+                               help="Dùng lại kết quả đã dựng khi video, logo, phụ đề và tùy chọn không đổi.")
+        subparser.add_argument("--render-cache-dir", default=None)
+        subparser.add_argument("--segment-hook", default=None,
+                               help="Lệnh chạy mỗi khi một đoạn của đầu ra dạng luồng ghi xong "
+                                    "(biến môi trường SEGMENT_PATH, SEGMENT_INDEX, SEGMENT_KIND...).")
+
+    run_parser = subparsers.add_parser("run", help="Thêm các job trong manifest (JSON/CSV) vào hàng đợi và chạy.")
+    run_parser.add_argument("manifest")
+    add_queue_arguments(run_parser)
+
+    resume_parser = subparsers.add_parser("resume", help="Chạy tiếp các job còn dang dở trong hàng đợi.")
+    add_queue_arguments(resume_parser)
+
+    status_parser = subparsers.add_parser("status", help="Xem trạng thái hàng đợi.")
+    status_parser.add_argument("--state", default=None)
+
+    prune_parser = subparsers.add_parser("prune", help="Xóa các job đã kết thúc khỏi file trạng thái hàng đợi.")
+    prune_parser.add_argument("--state", default=None,
+                              help="File trạng thái (mặc định hàng đợi cục bộ; dùng được cho file của coordinator).")
+    prune_parser.add_argument("--status", action="append", choices=FINISHED_STATUSES, default=None,
+                              help="Chỉ xóa job có trạng thái này (lặp lại được, mặc định mọi job đã kết thúc).")
+    prune_parser.add_argument("--older-than", type=float, default=None, help="Chỉ xóa job kết thúc quá số ngày này.")
+
+    preview_parser = subparsers.add_parser("preview", help="Dựng ảnh hoặc clip ngắn để kiểm tra logo và phụ đề.")
+    preview_parser.add_argument("video_path")
+    preview_parser.add_argument("logo_path")
+    preview_parser.add_argument("subtitle_path")
+    preview_parser.add_argument("--at", default="0", help="Thời điểm xem trước (giây hoặc hh:mm:ss).")
+    preview_parser.add_argument("--clip", type=float, default=0.0, help="Độ dài clip (giây), 0 = một ảnh tĩnh.")
+    for key, value in DEFAULT_OPTIONS.items():
+        preview_parser.add_argument(f"--{key.replace('_', '-')}", dest=key, default=value)
+
+    cache_parser = subparsers.add_parser("cache", help="Xem hoặc dọn cache kết quả dựng.")
+    cache_parser.add_argument("action", choices=["list", "prune"])
+    cache_parser.add_argument("--dir", default=None, help="Thư mục cache (mặc định trong thư mục cache ứng dụng).")
+    cache_parser.add_argument("--max-size", type=float, default=None, help="Giữ tổng dung lượng dưới mức này (GB).")
+    cache_parser.add_argument("--older-than", type=float, default=None, help="Xóa entry không dùng quá số ngày này.")
+    cache_parser.add_argument("--all", action="store_true", help="Xóa toàn bộ cache.")
+
+    speakers_parser = subparsers.add_parser("speakers", help="Tách tên người nói và chèn dòng tên cho các file ASS.")
+    speakers_parser.add_argument("paths", nargs="+", help="File .ass hoặc thư mục chứa file .ass.")
+    speakers_parser.add_argument("--names", default=None,
+                                 help="Danh sách tên, phân tách bằng dấu phẩy, hoặc file mỗi dòng một tên.")
+    speakers_parser.add_argument("--style", default=ACTOR_STYLE_NAME, help="Style của dòng tên người nói.")
+    speakers_parser.add_argument("--output-dir", default=None,
+                                 help="Thư mục ghi kết quả (mặc định ghi file .speakers.ass cạnh file gốc).")
+    speakers_parser.add_argument("--in-place", action="store_true", help="Ghi đè lên file gốc.")
+    speakers_parser.add_argument("--workers", type=int, default=None, help="Số tiến trình xử lý song song.")
+
+    coordinator_parser = subparsers.add_parser("coordinator", help="Giữ hàng đợi và giao job cho các worker qua HTTP.")
+    coordinator_parser.add_argument("manifest", nargs="?", default=None)
+    coordinator_parser.add_argument("--state", default=None)
+    coordinator_parser.add_argument("--bind", default="127.0.0.1", help="Địa chỉ lắng nghe (0.0.0.0 cho mọi máy).")
+    coordinator_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    coordinator_parser.add_argument("--token", default=os.getenv('SUBTITLE_MERGER_TOKEN'),
+                                    help="Mã bí mật worker phải gửi kèm (mặc định lấy từ SUBTITLE_MERGER_TOKEN).")
+    coordinator_parser.add_argument("--lease-timeout", type=float, default=30.0,
+                                    help="Số giây không có heartbeat thì coi worker đã chết.")
+    coordinator_parser.add_argument("--max-attempts", type=int, default=3)
+    coordinator_parser.add_argument("--serve-forever", action="store_true",
+                                    help="Không thoát khi hàng đợi trống, chờ job mới gửi qua POST /jobs.")
+    coordinator_parser.add_argument("--summary", default=None)
+
+    worker_parser = subparsers.add_parser("worker", help="Nhận job từ coordinator và xử lý trên máy này.")
+    worker_parser.add_argument("url", help="Địa chỉ coordinator, ví dụ http://192.168.1.10:8765")
+    worker_parser.add_argument("--count", type=int, default=1, help="Số worker chạy song song trên máy này.")
+    worker_parser.add_argument("--work-dir", default=None, help="Thư mục lưu file đầu vào tải về và kết quả tạm.")
+    worker_parser.add_argument("--map", action="append", default=[], metavar="REMOTE=LOCAL",
+                               help="Thư mục dùng chung: đường dẫn trên coordinator = đường dẫn trên máy này.")
+    worker_parser.add_argument("--token", default=os.getenv('SUBTITLE_MERGER_TOKEN'))
+    worker_parser.add_argument("--threads", type=int, default=0, help="Giới hạn số luồng encoder cho mỗi job.")
+    worker_parser.add_argument("--metrics-dir", default=None)
+    worker_parser.add_argument("--metrics-textfile", default=None)
+    return parser
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+
+def run_cache_command(args) -> int:
+    cache_dir = get_render_cache_dir({'render_cache_dir': args.dir})
+    if args.action == "list":
+        entries = list_entries(cache_dir)
+        print("KEY           SIZE        LAST USED            OUTPUT")
+        for entry in entries:
+            last_used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.last_used))
+            state = "" if entry.intact else " (hỏng)"
+            print(f"{entry.key[:12]:<13} {format_size(entry.size):<11} {last_used:<20} {', '.join(entry.outputs)}{state}")
+        print(f"Tổng: {len(entries)} entry, {format_size(sum(entry.size for entry in entries))} tại {cache_dir}")
+        return 0
+    if not (args.all or args.max_size is not None or args.older_than is not None):
+        print("Cần chỉ định --max-size, --older-than hoặc --all.")
+        return 2
+    removed = prune(cache_dir, max_bytes=0 if args.all else (
+        int(args.max_size * 1024 ** 3) if args.max_size is not None else None),
+        older_than=args.older_than * 86400 if args.older_than is not None else None)
+    print(f"Đã xóa {len(removed)} entry, giải phóng {format_size(sum(entry.size for entry in removed))}.")
+    return 0
+
+
+def run_speakers_command(args) -> int:
+    pairs = []
+    for path in args.paths:
+        base_dir = path if os.path.isdir(path) else None
+        for source_path in find_subtitle_files([path]):
+            output_path = source_path if args.in_place else get_output_path(source_path, args.output_dir, base_dir)
+            pairs.append((source_path, output_path))
+    if not pairs:
+        print("Không tìm thấy file .ass nào.")
+        return 1
+    started_at = time.time()
+
+    def print_result(result):
+        if result.error:
+            print(f"Lỗi: {result.source}: {result.error}", flush=True)
+            return
+        speakers = ", ".join(f"{name} {count}" for name, count in sorted(result.speakers.items()))
+        print(f"{result.output}: {result.actor_lines} dòng tên mới, {result.kept_actor_lines} giữ nguyên "
+              f"({speakers or 'không tách thêm'})", flush=True)
+
+    results = transform_files(pairs, parse_speaker_names(args.names), args.style, args.workers, print_result)
+    failed = sum(1 for result in results if result.error)
+    print(f"Tổng: {len(results)} file, {failed} lỗi, {time.time() - started_at:.2f} giây.")
+    return 1 if failed else 0
+
+
+def run_coordinator_command(args) -> int:
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    state_path = args.state or os.path.join(get_app_data_dir(), "coordinator_state.json")
+    coordinator = Coordinator(state_path=state_path, status_callback=make_console_callback(),
+                              lease_timeout=args.lease_timeout, max_attempts=args.max_attempts)
+    if args.manifest and not submit_manifest(coordinator, args.manifest):
+        return 2
+    server = serve_coordinator(coordinator, args.bind, args.port, args.token)
+    print(f"Coordinator đang chạy tại http://{args.bind}:{server.server_address[1]}", flush=True)
+    started_at = time.time()
+    try:
+        while args.serve_forever:
+            time.sleep(1)
+        coordinator.wait()
+    except KeyboardInterrupt:
+        print("Đang dừng, các job đang chạy sẽ được giao lại ở lần chạy sau...", flush=True)
+        coordinator.shutdown(requeue_running=True)
+        server.shutdown()
+        return 130
+    coordinator.shutdown()
+    server.shutdown()
+    summary = coordinator.summary(current_run=True)
+    print_summary(summary, args.summary)
+    print(f"Thời gian thực tế: {format_time(time.time() - started_at)}")
+    return 0 if all(row['status'] == "done" for row in summary) else 1
+
+
+def run_worker_command(args) -> int:
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    path_map = parse_path_map(args.map)
+    job_defaults = {key: value for key, value in (('metrics_dir', args.metrics_dir),
+                                                  ('metrics_textfile', args.metrics_textfile),
+                                                  ('threads', args.threads)) if value}
+    console_callback = make_console_callback()
+    stop_event = threading.Event()
+    threads = []
+    for _ in range(max(1, args.count)):
+        worker = RenderWorker(args.url, work_dir=args.work_dir, path_map=path_map, token=args.token,
+                              job_defaults=job_defaults)
+        label = SimpleNamespace(job_id=worker.worker_id)
+        worker.status_callback = lambda message, label=label: console_callback(label, message)
+        thread = threading.Thread(target=worker.run, args=(stop_event,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    print(f"Đã chạy {len(threads)} worker, nhận job từ {args.url}", flush=True)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print("Đang dừng, job đang chạy sẽ được trả về coordinator...", flush=True)
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+    return 0
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "cache":
+        return run_cache_command(args)
+    if args.command == "speakers":
+        return run_speakers_command(args)
+    if args.command == "coordinator":
+        return run_coordinator_command(args)
+    if args.command == "worker":
+        return run_worker_command(args)
+    if args.command == "preview":
+        params = {key: value for key, value in vars(args).items() if key not in ("command", "at", "clip")}
+        print(render_preview(params, args.at, args.clip, lambda message: print(message, flush=True)))
+        return 0
+
+    state_path = args.state or get_default_state_path()
+    if args.command == "status":
+        print_summary(JobQueue(state_path=state_path).summary())
+        return 0
+    if args.command == "prune":
+        removed = JobQueue(state_path=state_path).prune(
+            tuple(args.status or FINISHED_STATUSES),
+            older_than=args.older_than * 86400 if args.older_than is not None else None)
+        print(f"Đã xóa {len(removed)} job khỏi {state_path}.")
+        return 0
+
+    job_defaults = {key: value for key, value in (('metrics_dir', args.metrics_dir),
+                                                  ('metrics_textfile', args.metrics_textfile),
+                                                  ('render_cache', args.render_cache),
+                                                  ('render_cache_dir', args.render_cache_dir),
+                                                  ('segment_hook', args.segment_hook)) if value}
+    job_queue = JobQueue(max_workers=args.workers, threads_per_job=args.threads, state_path=state_path,
+                         status_callback=make_console_callback(), job_defaults=job_defaults)
+    if args.command == "run" and not submit_manifest(job_queue, args.manifest):
+        return 2
+    return run_queue(job_queue, args.summary)
+
+
+if __name__ == "__main__":
+    # Bản đóng gói cần freeze_support để tiến trình con của ProcessPoolExecutor không chạy lại main
+    multiprocessing.freeze_support()
+    sys.exit(main())
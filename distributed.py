@@ -0,0 +1,648 @@
+# distributed.py
+import http.server
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from dataclasses import asdict, dataclass, field
+
+from app_paths import evict_lru, get_cache_dir
+from job_queue import STATUS_CANCELLED, STATUS_DONE, STATUS_FAILED, STATUS_PENDING, \
+    STATUS_RUNNING, JobControl, JobQueue
+from processor import parse_output_profiles, run_processing_logic
+from progress import ProgressEvent, SegmentEvent
+from render_cache import hash_file_sampled
+from render_journal import get_parts_dir
+from stream_output import get_stream_files, parse_stream_options
+
+DEFAULT_PORT = 8765
+DEFAULT_LEASE_TIMEOUT = 30.0
+DEFAULT_HEARTBEAT_INTERVAL = 2.0
+DEFAULT_POLL_INTERVAL = 3.0
+DEFAULT_MAX_ATTEMPTS = 3
+REQUEST_TIMEOUT = 30
+LOCALITY_WINDOW = 20
+INPUT_CACHE_MAX_ENTRIES = 100
+INPUT_KEYS = ('video_path', 'logo_path', 'subtitle_path')
+TOKEN_HEADER = "X-Subtitle-Merger-Token"
+
+
+@dataclass
+class Lease:
+    lease_id: str
+    job_id: str
+    worker_id: str
+    same_host: bool
+    expires_at: float
+    inputs: dict = field(default_factory=dict)
+    uploads: dict = field(default_factory=dict)
+    outputs_local: bool = False
+    cancel_requested: bool = False
+    paused: bool = False
+
+
+def _is_shared(path: str, shared_prefixes) -> bool:
+    path = os.path.abspath(path)
+    return any(path == prefix or path.startswith(prefix.rstrip("/\\") + os.sep) for prefix in shared_prefixes)
+
+
+def _get_output_paths(params) -> list[str]:
+    return [profile['path'] for profile in params.get('outputs') or []] or [params.get('output_path', "")]
+
+
+def get_staging_dir(output_path: str, lease_id: str) -> str:
+    # Worker ghi thẳng vào thư mục đầu ra dùng chung thì ghi vào thư mục tạm cạnh file đích, cùng ổ đĩa nên bước
+    # đổi tên cuối cùng không phải sao chép
+    return os.path.join(os.path.dirname(os.path.abspath(output_path)), f".{lease_id[:12]}.part")
+
+
+def get_output_files(params) -> list[str]:
+    profiles = parse_output_profiles(params)
+    if profiles:
+        return [profile['path'] for profile in profiles]
+    stream_format, _ = parse_stream_options(params)
+    if stream_format:
+        return get_stream_files(stream_format, params['output_path'])
+    return [params['output_path']]
+
+
+class Coordinator(JobQueue):
+    """Hàng đợi không tự chạy job mà cho các worker thuê qua HTTP.
+
+    Worker phải gửi heartbeat trước khi hết hạn thuê; quá hạn thì job được đưa lại hàng đợi cho worker khác
+    (tối đa max_attempts lần). Job được ưu tiên giao cho worker đã có sẵn file đầu vào (cùng máy, thư mục dùng chung
+    hoặc cache của worker) để không phải sao chép lại.
+    """
+
+    def __init__(self, state_path: str | None = None, status_callback=None,
+                 lease_timeout: float = DEFAULT_LEASE_TIMEOUT, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        super().__init__(state_path=state_path, status_callback=status_callback)
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.host_name = socket.gethostname()
+        self.leases = {}
+        self.workers = {}
+        self._monitor_stop = threading.Event()
+        self._monitor = None
+
+    def start(self):
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._monitor_leases, daemon=True)
+            self._monitor.start()
+
+    def shutdown(self, requeue_running: bool = False):
+        self._monitor_stop.set()
+        with self._lock:
+            for lease in list(self.leases.values()):
+                lease.cancel_requested = True
+                self._release(lease, STATUS_PENDING if requeue_running else STATUS_CANCELLED,
+                              "" if requeue_running else "Đã hủy bỏ bởi người dùng.")
+
+    def pause(self, job_id: str):
+        lease = self._find_lease(job_id)
+        if lease:
+            lease.paused = True
+
+    def resume(self, job_id: str):
+        lease = self._find_lease(job_id)
+        if lease:
+            lease.paused = False
+
+    def cancel(self, job_id: str):
+        with self._lock:
+            lease = self._find_lease(job_id)
+            if lease:
+                lease.cancel_requested = True
+            else:
+                super().cancel(job_id)
+
+    def _find_lease(self, job_id: str) -> Lease | None:
+        with self._lock:
+            return next((lease for lease in self.leases.values() if lease.job_id == job_id), None)
+
+    def _describe_inputs(self, job, same_host: bool, shared_prefixes) -> dict:
+        inputs = {}
+        for key in INPUT_KEYS:
+            path = os.path.abspath(job.params[key])
+            local = same_host or _is_shared(path, shared_prefixes)
+            inputs[key] = {'path': path, 'size': os.path.getsize(path), 'local': local,
+                           'hash': None if local else hash_file_sampled(path)}
+        return inputs
+
+    def _pick_job(self, same_host: bool, shared_prefixes, cached) -> tuple:
+        pending = sorted((job for job in self.jobs.values() if job.status == STATUS_PENDING),
+                         key=lambda j: j.submitted_at)
+        best, best_inputs, best_score = None, None, -1
+        # Chỉ xét các job đầu hàng đợi để job cũ không bị bỏ đói và không phải băm quá nhiều file
+        for job in pending[:LOCALITY_WINDOW]:
+            try:
+                inputs = self._describe_inputs(job, same_host, shared_prefixes)
+            except (OSError, KeyError) as e:
+                job.status = STATUS_FAILED
+                job.error = f"Lỗi: Không đọc được file đầu vào ({e})."
+                job.finished_at = time.time()
+                self._notify(job, job.error)
+                continue
+            score = sum(info['size'] for info in inputs.values() if info['local'] or info['hash'] in cached)
+            if score > best_score:
+                best, best_inputs, best_score = job, inputs, score
+            if same_host:
+                break
+        return best, best_inputs
+
+    def lease(self, request: dict) -> dict | None:
+        worker_id = str(request.get('worker_id') or uuid.uuid4().hex[:8])
+        same_host = request.get('host') == self.host_name
+        shared_prefixes = [prefix for prefix in request.get('shared') or [] if prefix]
+        with self._lock:
+            self.workers[worker_id] = {'host': request.get('host', ""), 'last_seen': time.time(), 'job_id': None}
+            job, inputs = self._pick_job(same_host, shared_prefixes, set(request.get('cached') or []))
+            if job is None:
+                self._save_state()
+                return None
+            outputs_local = same_host or all(_is_shared(os.path.dirname(os.path.abspath(path)), shared_prefixes)
+                                             for path in _get_output_paths(job.params))
+            lease = Lease(uuid.uuid4().hex, job.job_id, worker_id, same_host,
+                          time.monotonic() + self.lease_timeout, inputs, outputs_local=outputs_local)
+            self.leases[lease.lease_id] = lease
+            self.workers[worker_id]['job_id'] = job.job_id
+            job.status = STATUS_RUNNING
+            job.attempts += 1
+            job.started_at = time.time()
+            job.finished_at = None
+            job.media_duration = 0.0
+            job.error = ""
+            self._save_state()
+        self._notify(job, f"Đã giao cho worker {worker_id} ({request.get('host', '?')}).")
+        return {'lease_id': lease.lease_id, 'job_id': job.job_id, 'params': job.params, 'inputs': inputs,
+                'outputs_local': lease.outputs_local, 'lease_timeout': self.lease_timeout}
+
+    def _get_lease(self, lease_id: str) -> Lease | None:
+        with self._lock:
+            lease = self.leases.get(lease_id)
+            if lease:
+                lease.expires_at = time.monotonic() + self.lease_timeout
+                if lease.worker_id in self.workers:
+                    self.workers[lease.worker_id]['last_seen'] = time.time()
+            return lease
+
+    def _apply_report(self, job, payload: dict):
+        if payload.get('progress'):
+            event = ProgressEvent(**payload['progress'])
+            job.media_duration = max(job.media_duration, event.total_duration)
+            job.average_fps = event.fps
+            self._notify(job, event)
+        for message in payload.get('messages') or []:
+            if message.startswith("Lỗi:"):
+                job.error = message
+            self._notify(job, message)
+
+    def heartbeat(self, lease_id: str, payload: dict) -> dict | None:
+        lease = self._get_lease(lease_id)
+        if lease is None:
+            return None
+        self._apply_report(self.jobs[lease.job_id], payload)
+        return {'cancel': lease.cancel_requested, 'pause': lease.paused}
+
+    def open_input(self, lease_id: str, key: str):
+        lease = self._get_lease(lease_id)
+        if lease is None or key not in lease.inputs:
+            return None
+        return open(lease.inputs[key]['path'], 'rb')
+
+    def _get_upload_target(self, job, name: str) -> str | None:
+        # Chỉ nhận tên file nằm cạnh một file đầu ra của job (kể cả các đoạn HLS/DASH cùng tên gốc)
+        if not name or name != os.path.basename(name) or name.startswith("."):
+            return None
+        for path in _get_output_paths(job.params):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            # Đoạn HLS/DASH có dạng <tên gốc>_00001.m4s hoặc <tên gốc>-stream0-00001.m4s; "ep10" không được khớp "ep1"
+            if name == os.path.basename(path) or (name.startswith(stem) and name[len(stem):len(stem) + 1] in "_-."
+                                                  and len(name) > len(stem)):
+                return os.path.join(os.path.dirname(os.path.abspath(path)), name)
+        return None
+
+    def receive_upload(self, lease_id: str, name: str, stream, length: int) -> bool:
+        lease = self._get_lease(lease_id)
+        if lease is None:
+            return False
+        target = self._get_upload_target(self.jobs[lease.job_id], name)
+        if target is None:
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{lease_id[:8]}.upload"
+        with open(temp_path, 'wb') as f:
+            remaining = length
+            while remaining > 0:
+                block = stream.read(min(remaining, 1024 * 1024))
+                if not block:
+                    break
+                f.write(block)
+                remaining -= len(block)
+                # File lớn có thể tải lâu hơn thời hạn thuê
+                self._get_lease(lease_id)
+        if remaining > 0:
+            os.remove(temp_path)
+            return False
+        with self._lock:
+            lease.uploads[target] = temp_path
+        return True
+
+    def complete(self, lease_id: str, payload: dict) -> bool:
+        lease = self._get_lease(lease_id)
+        if lease is None:
+            return False
+        job = self.jobs[lease.job_id]
+        self._apply_report(job, payload)
+        status = payload.get('status')
+        error = payload.get('error') or job.error
+        with self._lock:
+            if lease.lease_id not in self.leases:
+                return False
+            if status == STATUS_DONE:
+                # Coordinator tự đổi tên file vào chỗ đích: job chỉ được đánh dấu xong khi kết quả đã nằm ở đó
+                try:
+                    self._commit_outputs(lease, job)
+                except OSError as e:
+                    status = STATUS_FAILED
+                    error = f"Lỗi: Không chuyển được kết quả vào thư mục đích ({e})."
+                    self._notify(job, error)
+            elif status not in (STATUS_FAILED, STATUS_CANCELLED, STATUS_PENDING):
+                status = STATUS_FAILED
+            self._release(lease, status, error)
+        return True
+
+    def _commit_outputs(self, lease: Lease, job):
+        for target, temp_path in list(lease.uploads.items()):
+            os.replace(temp_path, target)
+            del lease.uploads[target]
+        if not lease.outputs_local:
+            return
+        for staging_dir in sorted({get_staging_dir(path, lease.lease_id) for path in _get_output_paths(job.params)}):
+            for name in os.listdir(staging_dir):
+                source = os.path.join(staging_dir, name)
+                if os.path.isfile(source):
+                    os.replace(source, os.path.join(os.path.dirname(staging_dir), name))
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _release(self, lease: Lease, status: str, error: str = ""):
+        for temp_path in lease.uploads.values():
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        self.leases.pop(lease.lease_id, None)
+        if lease.worker_id in self.workers:
+            self.workers[lease.worker_id]['job_id'] = None
+        job = self.jobs.get(lease.job_id)
+        if job is None or job.status != STATUS_RUNNING:
+            return
+        job.status = status
+        job.error = error if status != STATUS_DONE else ""
+        job.finished_at = None if status == STATUS_PENDING else time.time()
+        if status == STATUS_PENDING:
+            job.started_at = None
+        self._save_state()
+
+    def _monitor_leases(self):
+        while not self._monitor_stop.wait(1.0):
+            now = time.monotonic()
+            with self._lock:
+                expired = [lease for lease in self.leases.values() if lease.expires_at < now]
+                for lease in expired:
+                    job = self.jobs[lease.job_id]
+                    if job.attempts >= self.max_attempts:
+                        self._release(lease, STATUS_FAILED,
+                                      f"Lỗi: Worker {lease.worker_id} mất kết nối, đã thử {job.attempts} lần.")
+                        message = job.error
+                    else:
+                        self._release(lease, STATUS_PENDING)
+                        message = f"Cảnh báo: Worker {lease.worker_id} mất kết nối, đưa job về hàng đợi."
+                    self._notify(job, message)
+
+    def status(self) -> dict:
+        with self._lock:
+            workers = [{'worker_id': worker_id, **info} for worker_id, info in sorted(self.workers.items())]
+        return {'jobs': self.summary(), 'workers': workers}
+
+
+class CoordinatorHandler(http.server.BaseHTTPRequestHandler):
+    server_version = "SubtitleMerger"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _authorized(self) -> bool:
+        token = self.server.token
+        if token and self.headers.get(TOKEN_HEADER) != token:
+            self._send_json(403, {'error': "Sai token."})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        coordinator = self.server.coordinator
+        parts = urllib.parse.urlparse(self.path).path.strip("/").split("/")
+        if parts == ["status"]:
+            self._send_json(200, coordinator.status())
+        elif len(parts) == 3 and parts[0] == "files":
+            source = coordinator.open_input(parts[1], parts[2])
+            if source is None:
+                self._send_json(404, {'error': "Không có file."})
+                return
+            with source:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(os.fstat(source.fileno()).st_size))
+                self.end_headers()
+                shutil.copyfileobj(source, self.wfile, 1024 * 1024)
+        else:
+            self._send_json(404, {'error': "Không có đường dẫn này."})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        coordinator = self.server.coordinator
+        parts = urllib.parse.urlparse(self.path).path.strip("/").split("/")
+        payload = self._read_json()
+        if parts == ["lease"]:
+            lease = coordinator.lease(payload)
+            self._send_json(200 if lease else 204, lease)
+        elif parts == ["jobs"]:
+            job = coordinator.submit(payload)
+            self._send_json(200, {'job_id': job.job_id})
+        elif len(parts) == 2 and parts[0] in ("heartbeat", "complete"):
+            if parts[0] == "heartbeat":
+                response = coordinator.heartbeat(parts[1], payload)
+            else:
+                response = {} if coordinator.complete(parts[1], payload) else None
+            self._send_json(200 if response is not None else 410, response)
+        else:
+            self._send_json(404, {'error': "Không có đường dẫn này."})
+
+    def do_PUT(self):
+        if not self._authorized():
+            return
+        parts = urllib.parse.urlparse(self.path).path.strip("/").split("/")
+        length = int(self.headers.get('Content-Length') or 0)
+        if len(parts) == 3 and parts[0] == "results":
+            name = urllib.parse.unquote(parts[2])
+            if self.server.coordinator.receive_upload(parts[1], name, self.rfile, length):
+                self._send_json(200, {})
+                return
+        # Đọc hết phần thân còn lại để kết nối keep-alive không bị lệch
+        self.rfile.read(length)
+        self._send_json(410, {'error': "Lượt thuê không còn hiệu lực hoặc tên file không hợp lệ."})
+
+
+def serve_coordinator(coordinator: Coordinator, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                      token: str | None = None) -> http.server.ThreadingHTTPServer:
+    server = http.server.ThreadingHTTPServer((host, port), CoordinatorHandler)
+    server.daemon_threads = True
+    server.coordinator = coordinator
+    server.token = token
+    coordinator.start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_path_map(entries) -> list[tuple[str, str]]:
+    # "đường_dẫn_trên_coordinator=đường_dẫn_trên_worker" cho thư mục dùng chung (NFS, SMB...)
+    path_map = []
+    for entry in entries or []:
+        remote, separator, local = entry.partition("=")
+        if not separator or not remote or not local:
+            raise ValueError(f"Ánh xạ thư mục không hợp lệ: {entry} (cần dạng REMOTE=LOCAL).")
+        path_map.append((remote.rstrip("/\\"), local.rstrip("/\\")))
+    return path_map
+
+
+def map_path(path: str, path_map) -> str | None:
+    for remote, local in path_map:
+        if path == remote or path.startswith(remote + "/") or path.startswith(remote + "\\"):
+            return local + path[len(remote):].replace("/", os.sep).replace("\\", os.sep)
+    return None
+
+
+class RenderWorker:
+    """Thuê job từ coordinator, chạy run_processing_logic tại chỗ và gửi tiến trình, kết quả về."""
+
+    def __init__(self, url: str, worker_id: str | None = None, work_dir: str | None = None, path_map=(),
+                 token: str | None = None, job_defaults: dict | None = None, status_callback=None,
+                 heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.url = url.rstrip("/")
+        self.host_name = socket.gethostname()
+        self.worker_id = worker_id or f"{self.host_name}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+        self.work_dir = work_dir or get_cache_dir("worker")
+        self.input_dir = os.path.join(self.work_dir, "inputs")
+        self.path_map = list(path_map)
+        self.token = token
+        self.job_defaults = job_defaults or {}
+        self.status_callback = status_callback or (lambda message: None)
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        os.makedirs(self.input_dir, exist_ok=True)
+
+    def _request(self, method: str, path: str, payload=None, data=None, length: int | None = None):
+        headers = {TOKEN_HEADER: self.token} if self.token else {}
+        if payload is not None:
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if length is not None:
+            headers['Content-Length'] = str(length)
+        request = urllib.request.Request(f"{self.url}{path}", data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                body = response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 410:
+                return None
+            raise
+        return json.loads(body) if body else None
+
+    def run(self, stop_event: threading.Event):
+        connected = True
+        while not stop_event.is_set():
+            try:
+                lease = self._request('POST', "/lease", {
+                    'worker_id': self.worker_id, 'host': self.host_name,
+                    'shared': [remote for remote, _ in self.path_map],
+                    'cached': [os.path.splitext(name)[0] for name in os.listdir(self.input_dir)]})
+            except (OSError, ValueError) as e:
+                # Chỉ báo một lần cho tới khi kết nối lại được
+                if connected:
+                    self.status_callback(f"Cảnh báo: Không kết nối được coordinator ({e}).")
+                connected = False
+                lease = False
+            else:
+                connected = True
+            if lease:
+                self._run_lease(lease, stop_event)
+            else:
+                stop_event.wait(self.poll_interval)
+
+    def _resolve_input(self, lease: dict, key: str, info: dict) -> str:
+        if info['local']:
+            path = map_path(info['path'], self.path_map) or info['path']
+            if os.path.exists(path) and os.path.getsize(path) == info['size']:
+                return path
+        # Tên file theo mã băm nên cùng một file được dùng lại cho các job sau, kể cả job khác tên
+        cached_path = os.path.join(self.input_dir, f"{info['hash'] or uuid.uuid4().hex}"
+                                                   f"{os.path.splitext(info['path'])[1]}")
+        if info['hash'] and os.path.exists(cached_path):
+            os.utime(cached_path)
+            return cached_path
+        self.status_callback(f"Đang tải {os.path.basename(info['path'])} từ coordinator...")
+        temp_path = f"{cached_path}.{threading.get_ident()}.partial"
+        request = urllib.request.Request(f"{self.url}/files/{lease['lease_id']}/{key}",
+                                         headers={TOKEN_HEADER: self.token} if self.token else {})
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response, open(temp_path, 'wb') as f:
+                shutil.copyfileobj(response, f, 1024 * 1024)
+            if info['hash'] and hash_file_sampled(temp_path) != info['hash']:
+                raise ValueError(f"File {os.path.basename(info['path'])} tải về không khớp mã băm.")
+            os.replace(temp_path, cached_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        evict_lru(self.input_dir, INPUT_CACHE_MAX_ENTRIES, lambda name: not name.endswith(".partial"))
+        return cached_path
+
+    def _prepare_params(self, lease: dict) -> tuple[dict, list[str]]:
+        """Trả về params để chạy tại chỗ và danh sách thư mục tạm chứa các file đầu ra.
+
+        Đầu ra luôn được ghi vào thư mục tạm riêng của lượt thuê, coordinator chỉ chuyển vào chỗ đích khi nhận báo
+        hoàn tất: nếu lượt thuê bị thu hồi và job đã giao cho worker khác, worker cũ chỉ xóa file tạm của mình chứ
+        không đụng tới file đích mà worker mới đang ghi.
+        """
+        params = {**self.job_defaults, **lease['params'], 'job_id': lease['job_id']}
+        for key, info in lease['inputs'].items():
+            params[key] = self._resolve_input(lease, key, info)
+        staging = []
+
+        def stage(path: str) -> str:
+            if lease['outputs_local']:
+                staging_dir = get_staging_dir(map_path(path, self.path_map) or path, lease['lease_id'])
+            else:
+                staging_dir = os.path.join(self.work_dir, "outputs", lease['lease_id'][:12])
+            os.makedirs(staging_dir, exist_ok=True)
+            if staging_dir not in staging:
+                staging.append(staging_dir)
+            return os.path.join(staging_dir, os.path.basename(path))
+
+        if params.get('resumable') or params.get('incremental'):
+            # Đoạn đã mã hóa và nhật ký phải sống qua các lượt thuê: đặt theo file đích (hoặc theo job nếu đầu ra
+            # không dùng chung), không đặt trong thư mục tạm bị xóa sau mỗi lượt
+            final_path = map_path(params['output_path'], self.path_map) or params['output_path']
+            if not lease['outputs_local']:
+                final_path = os.path.join(self.work_dir, "jobs", lease['job_id'], os.path.basename(final_path))
+            params['parts_dir'] = get_parts_dir(final_path)
+        params['output_path'] = stage(params['output_path'])
+        params['outputs'] = [{**profile, 'path': stage(profile['path'])} for profile in params.get('outputs') or []]
+        if lease['outputs_local'] and params.get('fonts_dir'):
+            params['fonts_dir'] = map_path(params['fonts_dir'], self.path_map) or params['fonts_dir']
+        else:
+            # Font chỉ có trên máy coordinator thì bỏ qua
+            params.pop('fonts_dir', None)
+        return params, staging
+
+    def _run_lease(self, lease: dict, stop_event: threading.Event):
+        lease_id = lease['lease_id']
+        control = JobControl()
+        pending = {'progress': None, 'messages': []}
+        pending_lock = threading.Lock()
+        done = threading.Event()
+
+        def status_callback(message):
+            with pending_lock:
+                if isinstance(message, ProgressEvent):
+                    pending['progress'] = asdict(message)
+                else:
+                    pending['messages'].append(message.describe() if isinstance(message, SegmentEvent) else message)
+            self.status_callback(message)
+
+        def take_report() -> dict:
+            with pending_lock:
+                report = {'progress': pending['progress'], 'messages': pending['messages']}
+                pending['progress'], pending['messages'] = None, []
+            return report
+
+        def send_heartbeats():
+            while not done.wait(self.heartbeat_interval):
+                try:
+                    response = self._request('POST', f"/heartbeat/{lease_id}", take_report())
+                except (OSError, ValueError):
+                    continue
+                if response is None or response.get('cancel') or stop_event.is_set():
+                    # Coordinator đã thu hồi job (quá hạn hoặc bị hủy)
+                    control.cancel_requested = True
+                    control.pause_event.set()
+                elif response.get('pause'):
+                    control.pause_event.clear()
+                else:
+                    control.pause_event.set()
+
+        heartbeat_thread = threading.Thread(target=send_heartbeats, daemon=True)
+        heartbeat_thread.start()
+        staging = []
+        error = ""
+        completed = False
+        try:
+            params, staging = self._prepare_params(lease)
+            completed = run_processing_logic(params, status_callback, control.pause_event,
+                                             lambda: control.cancel_requested or stop_event.is_set())
+            if completed and not lease['outputs_local']:
+                self._upload_outputs(lease_id, params)
+        except Exception as e:
+            completed = False
+            error = f"Lỗi: {e}"
+            status_callback(error)
+        finally:
+            done.set()
+            heartbeat_thread.join()
+        status = STATUS_DONE if completed else (STATUS_CANCELLED if control.cancel_requested else STATUS_FAILED)
+        if stop_event.is_set() and not completed:
+            # Worker đang tắt: trả job về hàng đợi cho worker khác
+            status = STATUS_PENDING
+        try:
+            accepted = self._request('POST', f"/complete/{lease_id}",
+                                     {**take_report(), 'status': status, 'error': error}) is not None
+        except (OSError, ValueError) as e:
+            self.status_callback(f"Cảnh báo: Không báo được kết quả cho coordinator ({e}).")
+            accepted = False
+        if status == STATUS_DONE and not accepted:
+            self.status_callback("Cảnh báo: Coordinator đã thu hồi job, bỏ kết quả của lượt này.")
+        # Coordinator đã chuyển kết quả vào chỗ đích khi nhận báo hoàn tất, phần còn lại chỉ là file tạm
+        for staging_dir in staging:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _upload_outputs(self, lease_id: str, params: dict):
+        for path in get_output_files(params):
+            name = os.path.basename(path)
+            self.status_callback(f"Đang tải {name} lên coordinator...")
+            with open(path, 'rb') as f:
+                response = self._request('PUT', f"/results/{lease_id}/{urllib.parse.quote(name)}", data=f,
+                                         length=os.fstat(f.fileno()).st_size)
+            if response is None:
+                raise RuntimeError("Coordinator không nhận kết quả (lượt thuê đã hết hạn).")
+
@@ -0,0 +1,7 @@
+# ffmpeg_tools.py
+import subprocess
+import sys
+
+
+def get_creation_flags() -> int:
+    return subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
@@ -0,0 +1,280 @@
+# font_resolver.py
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import sys
+import threading
+from dataclasses import dataclass, field
+
+from app_paths import atomic_write, evict_lru, get_cache_dir
+from ass_events import OVERRIDE_TAG_PATTERN, parse_events, parse_styles, read_ass_lines
+from render_journal import hash_file
+
+FONT_INDEX_VERSION = 1
+FONT_INDEX_FILE_NAME = "index.json"
+FONT_SET_MAX_ENTRIES = 50
+FONT_FILE_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc")
+FONT_NAME_IDS = (1, 4, 6, 16)  # family, full name, PostScript name, typographic family
+FONT_OVERRIDE_PATTERN = re.compile(r"\\fn([^\\}]*)")
+STYLE_RESET_PATTERN = re.compile(r"\\r([^\\}]+)")
+# Tên file nhúng theo kiểu Aegisub: <tên gốc>_<B|I><mã bảng mã>.ttf
+EMBEDDED_FONT_SUFFIX_PATTERN = re.compile(r"_[BI]*\d*$")
+COMPLETE_MARKER = ".complete"
+
+_index_lock = threading.Lock()
+
+
+@dataclass
+class FontPreflight:
+    fonts_dir: str | None = None
+    resolved: dict = field(default_factory=dict)
+    missing: list = field(default_factory=list)
+
+
+def get_system_font_dirs() -> list[str]:
+    home = os.path.expanduser("~")
+    if sys.platform == "win32":
+        dirs = [os.path.join(os.getenv('WINDIR', "C:\\Windows"), "Fonts")]
+        if os.getenv('LOCALAPPDATA'):
+            dirs.append(os.path.join(os.getenv('LOCALAPPDATA'), "Microsoft", "Windows", "Fonts"))
+    elif sys.platform == "darwin":
+        dirs = ["/System/Library/Fonts", "/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+    else:
+        data_home = os.getenv('XDG_DATA_HOME') or os.path.join(home, ".local", "share")
+        dirs = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.join(data_home, "fonts"),
+                os.path.join(home, ".fonts")]
+    return [path for path in dirs if os.path.isdir(path)]
+
+
+def normalize_font_name(name: str) -> str:
+    # Tiền tố @ trong ASS chỉ đánh dấu chữ dọc, vẫn dùng cùng file font
+    return name.strip().lstrip("@").strip().lower()
+
+
+def collect_font_names(lines) -> dict[str, str]:
+    # Trả về tên đã chuẩn hóa -> tên như viết trong file phụ đề
+    styles = parse_styles(lines)
+    events = parse_events(lines)
+    used_styles = {event.style for event in events}
+    fonts = set()
+    for event in events:
+        for block in OVERRIDE_TAG_PATTERN.findall(event.text):
+            fonts.update(FONT_OVERRIDE_PATTERN.findall(block))
+            used_styles.update(name.strip() for name in STYLE_RESET_PATTERN.findall(block))
+    for style_name in used_styles:
+        # libass dùng style Default khi event trỏ tới style không tồn tại
+        style = styles.get(style_name) or styles.get("Default") or {}
+        if style.get("Fontname"):
+            fonts.add(style["Fontname"])
+    return {normalize_font_name(name): name.strip().lstrip("@") for name in sorted(fonts) if normalize_font_name(name)}
+
+
+def _decode_name(platform_id: int, raw: bytes) -> str:
+    if platform_id in (0, 3):
+        return raw.decode('utf-16-be', errors='ignore')
+    return raw.decode('mac_roman', errors='ignore')
+
+
+def _read_face_names(data: bytes, offset: int) -> set[str]:
+    num_tables = struct.unpack_from(">H", data, offset + 4)[0]
+    for index in range(num_tables):
+        tag, _, table_offset, _ = struct.unpack_from(">4sIII", data, offset + 12 + index * 16)
+        if tag != b"name":
+            continue
+        _, count, string_offset = struct.unpack_from(">HHH", data, table_offset)
+        names = set()
+        for record_index in range(count):
+            platform_id, _, _, name_id, length, name_offset = struct.unpack_from(
+                ">HHHHHH", data, table_offset + 6 + record_index * 12)
+            if name_id in FONT_NAME_IDS:
+                start = table_offset + string_offset + name_offset
+                name = normalize_font_name(_decode_name(platform_id, data[start:start + length]))
+                if name:
+                    names.add(name)
+        return names
+    return set()
+
+
+def read_font_names(font_path: str) -> list[str]:
+    with open(font_path, 'rb') as f:
+        return parse_font_names(f.read())
+
+
+def parse_font_names(data: bytes) -> list[str]:
+    try:
+        if data[:4] == b"ttcf":
+            face_count = struct.unpack_from(">I", data, 8)[0]
+            offsets = struct.unpack_from(f">{face_count}I", data, 12)
+        else:
+            offsets = (0,)
+        names = set()
+        for offset in offsets:
+            names |= _read_face_names(data, offset)
+    except struct.error:
+        return []
+    return sorted(names)
+
+
+def decode_embedded_font(encoded: str) -> bytes:
+    # uuencode của ASS: mỗi ký tự mang 6 bit (mã ASCII - 33), nhóm 4 ký tự thành 3 byte, nhóm cuối có thể thiếu
+    data = bytearray()
+    for start in range(0, len(encoded), 4):
+        group = [ord(char) - 33 for char in encoded[start:start + 4]]
+        if len(group) < 2:
+            break
+        value = 0
+        for bits in group + [0] * (4 - len(group)):
+            value = (value << 6) | (bits & 0x3F)
+        data += value.to_bytes(3, 'big')[:len(group) - 1]
+    return bytes(data)
+
+
+def collect_embedded_font_names(lines) -> set[str]:
+    # Font nhúng trong [Fonts] được libass nạp thẳng từ file phụ đề nên không tính là thiếu
+    embedded = {}
+    current = None
+    section = ""
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            section = stripped.lower()
+            current = None
+            continue
+        if section != "[fonts]" or not stripped:
+            continue
+        key, separator, value = stripped.partition(":")
+        if separator and key.strip().lower() == "fontname":
+            current = value.strip()
+            embedded[current] = []
+        elif current is not None:
+            embedded[current].append(stripped)
+    names = set()
+    for file_name, encoded_lines in embedded.items():
+        face_names = parse_font_names(decode_embedded_font("".join(encoded_lines)))
+        if not face_names:
+            # Không đọc được bảng name thì đoán họ font theo tên file
+            stem = EMBEDDED_FONT_SUFFIX_PATTERN.sub("", os.path.splitext(file_name)[0])
+            face_names = [normalize_font_name(stem)]
+        names.update(name for name in face_names if name)
+    return names
+
+
+def _load_font_index(index_path: str) -> dict:
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return index.get('fonts', {}) if index.get('version') == FONT_INDEX_VERSION else {}
+
+
+def _save_font_index(index_path: str, fonts: dict):
+    with atomic_write(index_path) as f:
+        json.dump({'version': FONT_INDEX_VERSION, 'fonts': fonts}, f, ensure_ascii=False)
+
+
+def build_font_index(font_dirs, cache_dir: str) -> dict:
+    # Chỉ đọc bảng name của file mới hoặc đã thay đổi; các file còn lại lấy từ chỉ mục đã lưu
+    index_path = os.path.join(cache_dir, FONT_INDEX_FILE_NAME)
+    with _index_lock:
+        cached = _load_font_index(index_path)
+        fonts = {}
+        for font_dir in font_dirs:
+            for root, _, files in os.walk(font_dir):
+                for name in files:
+                    if not name.lower().endswith(FONT_FILE_EXTENSIONS):
+                        continue
+                    path = os.path.abspath(os.path.join(root, name))
+                    try:
+                        stat = os.stat(path)
+                        entry = cached.get(path)
+                        if not entry or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                     'names': read_font_names(path)}
+                    except OSError:
+                        continue
+                    fonts[path] = entry
+        if fonts != cached:
+            _save_font_index(index_path, fonts)
+    return fonts
+
+
+def get_font_digests(font_paths, index: dict, cache_dir: str) -> dict[str, str]:
+    # Mã băm nội dung được lưu cùng chỉ mục để không phải đọc lại các file font lớn ở mỗi job
+    digests = {}
+    changed = False
+    for path in font_paths:
+        entry = index[path]
+        if not entry.get('sha1'):
+            entry['sha1'] = hash_file(path)
+            changed = True
+        digests[path] = entry['sha1']
+    if changed:
+        with _index_lock:
+            _save_font_index(os.path.join(cache_dir, FONT_INDEX_FILE_NAME), index)
+    return digests
+
+
+def stage_font_set(hashes: dict[str, str], cache_dir: str, max_entries: int = FONT_SET_MAX_ENTRIES) -> str:
+    # Thư mục font được định danh theo nội dung các file, job dùng cùng bộ font sẽ dùng lại thư mục cũ
+    set_key = hashlib.sha1("\n".join(sorted(set(hashes.values()))).encode('utf-8')).hexdigest()
+    sets_dir = os.path.join(cache_dir, "sets")
+    os.makedirs(sets_dir, exist_ok=True)
+    set_dir = os.path.join(sets_dir, set_key)
+    if os.path.exists(os.path.join(set_dir, COMPLETE_MARKER)):
+        os.utime(set_dir)
+        return set_dir
+
+    temp_dir = os.path.join(sets_dir, f".{set_key}.{os.getpid()}.{threading.get_ident()}")
+    os.makedirs(temp_dir, exist_ok=True)
+    for path, digest in hashes.items():
+        target = os.path.join(temp_dir, f"{digest}{os.path.splitext(path)[1].lower()}")
+        if os.path.exists(target):
+            continue
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target)
+    open(os.path.join(temp_dir, COMPLETE_MARKER), 'w').close()
+    try:
+        os.replace(temp_dir, set_dir)
+    except OSError:
+        # Một job khác vừa tạo xong cùng bộ font
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    # Thư mục bắt đầu bằng "." là bộ font đang được dựng dở
+    evict_lru(sets_dir, max_entries, lambda name: not name.startswith("."))
+    return set_dir
+
+
+def prepare_fonts(subtitle_path: str, extra_font_dirs=(), cache_dir: str | None = None) -> FontPreflight:
+    cache_dir = cache_dir or get_cache_dir("fonts")
+    os.makedirs(cache_dir, exist_ok=True)
+    lines = read_ass_lines(subtitle_path)
+    requested = collect_font_names(lines)
+    if not requested:
+        return FontPreflight()
+    embedded = collect_embedded_font_names(lines)
+
+    # Thư mục fonts đặt cạnh file phụ đề được ưu tiên giống cách các bản phát hành fansub đóng gói
+    font_dirs = [*extra_font_dirs, os.path.join(os.path.dirname(os.path.abspath(subtitle_path)), "fonts")]
+    font_dirs = [path for path in font_dirs if path and os.path.isdir(path)]
+    index = build_font_index(font_dirs + get_system_font_dirs(), cache_dir)
+    by_name = {}
+    for path, entry in index.items():
+        for name in entry['names']:
+            by_name.setdefault(name, []).append(path)
+
+    preflight = FontPreflight()
+    for name, display_name in sorted(requested.items()):
+        # Lấy mọi file cùng họ (thường, đậm, nghiêng) để libass tự chọn biến thể
+        if name in by_name:
+            preflight.resolved[display_name] = sorted(by_name[name])
+        elif name not in embedded:
+            preflight.missing.append(display_name)
+    font_paths = sorted({path for paths in preflight.resolved.values() for path in paths})
+    if font_paths:
+        preflight.fonts_dir = stage_font_set(get_font_digests(font_paths, index, cache_dir), cache_dir)
+    return preflight
@@ -0,0 +1,173 @@
+# job_metrics.py
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from app_paths import atomic_write
+
+METRICS_PREFIX = "subtitle_merger"
+PROGRESS_SAMPLE_INTERVAL = 1.0
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+class MetricsRegistry:
+    """Tổng hợp số liệu của mọi job trong tiến trình và ghi ra file .prom cho textfile collector."""
+
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, help_text: str = "", **labels):
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+            self._help.setdefault(name, (help_text, "counter"))
+
+    def set(self, name: str, value: float, help_text: str = "", **labels):
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+            self._help.setdefault(name, (help_text, "gauge"))
+
+    def observe(self, name: str, value: float, help_text: str = "", **labels):
+        # Summary không có quantile: chỉ xuất <name>_sum và <name>_count trong cùng một họ metric
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self._lock:
+            total, count = self._summaries.get(key, (0.0, 0))
+            self._summaries[key] = (total + value, count + 1)
+            self._help.setdefault(name, (help_text, "summary"))
+
+    def render(self) -> str:
+        with self._lock:
+            values = {**self._counters, **self._gauges}
+            for (name, labels), (total, count) in self._summaries.items():
+                values[(f"{name}_sum", labels)] = total
+                values[(f"{name}_count", labels)] = count
+            help_entries = dict(self._help)
+        lines = []
+        for name in sorted(help_entries):
+            help_text, metric_type = help_entries[name]
+            full_name = f"{METRICS_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text or name}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            sample_names = (f"{name}_sum", f"{name}_count") if metric_type == "summary" else (name,)
+            for (metric_name, labels), value in sorted(values.items()):
+                if metric_name in sample_names:
+                    lines.append(f"{METRICS_PREFIX}_{metric_name}{_format_labels(dict(labels))} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        # textfile collector có thể đọc bất kỳ lúc nào nên phải ghi ra file tạm rồi đổi tên
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with atomic_write(path) as f:
+            f.write(self.render())
+
+
+registry = MetricsRegistry()
+
+
+class JobMetrics:
+    def __init__(self, job_id: str | None = None, metrics_dir: str | None = None, textfile_path: str | None = None):
+        self.job_id = job_id or uuid.uuid4().hex[:8]
+        self.textfile_path = textfile_path
+        self.started_at = time.monotonic()
+        self.stages = {}
+        self.ffmpeg_runs = 0
+        self.retries = 0
+        self._last_progress_at = None
+        self._lock = threading.Lock()
+        self._file = None
+        if metrics_dir:
+            os.makedirs(metrics_dir, exist_ok=True)
+            self._file = open(os.path.join(metrics_dir, f"{self.job_id}.jsonl"), 'a', encoding='utf-8')
+
+    def _write(self, record_type: str, **fields):
+        if self._file is None:
+            return
+        record = {'type': record_type, 'job_id': self.job_id, 'time': round(time.time(), 3),
+                  'elapsed': round(time.monotonic() - self.started_at, 3), **fields}
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    @contextmanager
+    def stage(self, name: str):
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started_at
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + duration
+            self._write("stage", stage=name, duration=round(duration, 3))
+
+    def record_progress(self, event):
+        now = time.monotonic()
+        if self._last_progress_at is not None and now - self._last_progress_at < PROGRESS_SAMPLE_INTERVAL:
+            return
+        self._last_progress_at = now
+        self._write("progress", out_time=round(event.out_time, 3), frame=event.frame, fps=round(event.fps, 2),
+                    speed=round(event.speed, 3), bitrate_kbps=round(event.bitrate_kbps, 1))
+
+    def record_ffmpeg_exit(self, returncode: int | None, wall_time: float, startup_time: float | None,
+                           stop_reason: str | None):
+        with self._lock:
+            self.ffmpeg_runs += 1
+        self._write("ffmpeg", returncode=returncode, wall_time=round(wall_time, 3),
+                    startup_time=round(startup_time, 3) if startup_time is not None else None,
+                    stop_reason=stop_reason)
+        registry.inc("ffmpeg_exits_total", help_text="Số tiến trình ffmpeg đã kết thúc theo mã thoát.",
+                     code=returncode if returncode is not None else "none", reason=stop_reason or "exit")
+        if startup_time is not None:
+            registry.observe("ffmpeg_startup_seconds", startup_time,
+                             help_text="Thời gian từ lúc chạy ffmpeg tới khối tiến trình đầu tiên.")
+
+    def record_retry(self, attempt: int, reason: str):
+        with self._lock:
+            self.retries += 1
+        self._write("retry", attempt=attempt, reason=reason)
+        registry.inc("ffmpeg_retries_total", help_text="Số lần chạy lại ffmpeg do không tiến triển.")
+
+    def finish(self, status: str, media_duration: float = 0.0, summary=None, error: str = ""):
+        wall_time = time.monotonic() - self.started_at
+        self._write("job", status=status, wall_time=round(wall_time, 3), media_duration=round(media_duration, 3),
+                    average_fps=round(summary.fps, 2) if summary else None,
+                    speed=round(summary.speed, 3) if summary else None, stages={
+                        name: round(duration, 3) for name, duration in self.stages.items()},
+                    ffmpeg_runs=self.ffmpeg_runs, retries=self.retries, error=error)
+        registry.inc("jobs_total", help_text="Số job đã kết thúc theo trạng thái.", status=status)
+        registry.inc("job_wall_seconds_total", wall_time, help_text="Tổng thời gian xử lý các job.")
+        for name, duration in self.stages.items():
+            registry.inc("stage_seconds_total", duration, help_text="Tổng thời gian theo từng giai đoạn.",
+                         stage=name)
+        if status == "done":
+            registry.inc("media_seconds_total", media_duration, help_text="Tổng thời lượng video đã xử lý xong.")
+            if summary:
+                registry.set("last_job_speed", summary.speed,
+                             help_text="Tốc độ so với thời gian thực của job hoàn thành gần nhất.")
+                registry.set("last_job_fps", summary.fps, help_text="FPS trung bình của job hoàn thành gần nhất.")
+        registry.set("last_job_finished_timestamp_seconds", time.time(),
+                     help_text="Thời điểm job gần nhất kết thúc.")
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self.textfile_path:
+            try:
+                registry.write_textfile(self.textfile_path)
+            except OSError as e:
+                print(f"Lỗi khi ghi file metrics: {e}")
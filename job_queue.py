@@ -0,0 +1,244 @@
+# job_queue.py
+import csv
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from app_paths import atomic_write
+from processor import normalize_params, run_processing_logic
+from progress import ProgressEvent
+
+DEFAULT_OPTIONS = {'logo_width': "110", 'margin_top': "10", 'margin_right': "10", 'bitrate': "3000",
+                   'codec': "libx264"}
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+
+@dataclass
+class Job:
+    params: dict
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    status: str = STATUS_PENDING
+    attempts: int = 0
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    media_duration: float = 0.0
+    average_fps: float = 0.0
+    error: str = ""
+
+    @property
+    def wall_time(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def realtime_factor(self) -> float:
+        return self.media_duration / self.wall_time if self.wall_time > 0 else 0.0
+
+
+class JobControl:
+    def __init__(self):
+        self.pause_event = threading.Event()
+        self.pause_event.set()
+        self.cancel_requested = False
+
+
+class JobQueue:
+    def __init__(self, max_workers: int = 1, threads_per_job: int = 0, state_path: str | None = None,
+                 status_callback=None, job_defaults: dict | None = None):
+        self.max_workers = max(1, max_workers)
+        self.threads_per_job = max(0, threads_per_job)
+        self.state_path = state_path
+        self.status_callback = status_callback
+        # job_defaults áp dụng lúc chạy, không lưu vào trạng thái (ví dụ thư mục metrics của máy đang chạy)
+        self.job_defaults = job_defaults or {}
+        self.jobs = {}
+        # Job được thêm hoặc chạy tiếp trong lần chạy này; tổng kết và mã thoát chỉ tính các job này
+        self.run_job_ids = set()
+        self._controls = {}
+        self._lock = threading.RLock()
+        self._executor = None
+        self._stopping = False
+        if state_path and os.path.exists(state_path):
+            self._load_state()
+
+    def _load_state(self):
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        for record in state.get('jobs', []):
+            job = Job(**record)
+            if job.status == STATUS_RUNNING:
+                # Tiến trình trước bị dừng giữa chừng: đưa job về hàng đợi để chạy lại
+                job.status = STATUS_PENDING
+                job.started_at = None
+            if job.status == STATUS_PENDING:
+                self.run_job_ids.add(job.job_id)
+            self.jobs[job.job_id] = job
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            state = {'jobs': [asdict(job) for job in self.jobs.values()]}
+            with atomic_write(self.state_path) as f:
+                json.dump(state, f, indent=2, ensure_ascii=False)
+
+    def _notify(self, job: Job, message):
+        if self.status_callback:
+            self.status_callback(job, message)
+
+    def submit(self, params: dict) -> Job:
+        job_params = dict(DEFAULT_OPTIONS)
+        job_params.update({key: value for key, value in params.items() if value not in (None, "")})
+        if self.threads_per_job and not job_params.get('threads'):
+            job_params['threads'] = self.threads_per_job
+        job = Job(params=job_params)
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self.run_job_ids.add(job.job_id)
+            self._save_state()
+            if self._executor:
+                self._executor.submit(self._run_job, job.job_id)
+        return job
+
+    def start(self):
+        with self._lock:
+            if self._executor:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+            for job in sorted(self.jobs.values(), key=lambda j: j.submitted_at):
+                if job.status == STATUS_PENDING:
+                    self._executor.submit(self._run_job, job.job_id)
+
+    def wait(self):
+        while True:
+            with self._lock:
+                if all(job.status in FINISHED_STATUSES for job in self.jobs.values()):
+                    return
+            time.sleep(0.2)
+
+    def shutdown(self, requeue_running: bool = False):
+        with self._lock:
+            # requeue_running: job đang chạy được trả về hàng đợi để lần khởi động sau chạy tiếp
+            self._stopping = requeue_running
+            for job_id in list(self._controls):
+                self.cancel(job_id)
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def pause(self, job_id: str):
+        control = self._controls.get(job_id)
+        if control:
+            control.pause_event.clear()
+
+    def resume(self, job_id: str):
+        control = self._controls.get(job_id)
+        if control:
+            control.pause_event.set()
+
+    def cancel(self, job_id: str):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            control = self._controls.get(job_id)
+            if control:
+                control.cancel_requested = True
+                control.pause_event.set()
+            elif job and job.status == STATUS_PENDING:
+                job.status = STATUS_CANCELLED
+                self._save_state()
+
+    def _run_job(self, job_id: str):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != STATUS_PENDING:
+                return
+            control = JobControl()
+            self._controls[job_id] = control
+            job.status = STATUS_RUNNING
+            job.attempts += 1
+            job.started_at = time.time()
+            job.finished_at = None
+            job.media_duration = 0.0
+            job.error = ""
+            self._save_state()
+
+        def status_callback(message):
+            if isinstance(message, ProgressEvent):
+                job.media_duration = max(job.media_duration, message.total_duration)
+                job.average_fps = message.fps
+            elif isinstance(message, str) and message.startswith("Lỗi:"):
+                job.error = message
+            self._notify(job, message)
+
+        try:
+            run_params = {**self.job_defaults, **job.params, 'job_id': job.job_id}
+            completed = run_processing_logic(run_params, status_callback, control.pause_event,
+                                             lambda: control.cancel_requested)
+        except Exception as e:
+            completed = False
+            job.error = f"Lỗi: {e}"
+        with self._lock:
+            job.finished_at = time.time()
+            if completed:
+                job.status = STATUS_DONE
+            elif control.cancel_requested and self._stopping:
+                job.status = STATUS_PENDING
+            elif control.cancel_requested:
+                job.status = STATUS_CANCELLED
+            else:
+                job.status = STATUS_FAILED
+            self._controls.pop(job_id, None)
+            self._save_state()
+
+    def prune(self, statuses=FINISHED_STATUSES, older_than: float | None = None) -> list[Job]:
+        """Xóa khỏi trạng thái các job đã kết thúc (theo statuses), older_than tính bằng giây kể từ lúc kết thúc."""
+        now = time.time()
+        with self._lock:
+            removed = [job for job in self.jobs.values() if job.status in statuses and job.status in FINISHED_STATUSES
+                       and (older_than is None or now - (job.finished_at or job.submitted_at) >= older_than)]
+            for job in removed:
+                del self.jobs[job.job_id]
+                self.run_job_ids.discard(job.job_id)
+            if removed:
+                self._save_state()
+        return removed
+
+    def summary(self, current_run: bool = False) -> list[dict]:
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if not current_run or job.job_id in self.run_job_ids]
+            return [{'job_id': job.job_id, 'status': job.status, 'output': job.params.get('output_path', ""),
+                     'attempts': job.attempts, 'wall_time': round(job.wall_time, 2),
+                     'media_duration': round(job.media_duration, 2),
+                     'realtime_factor': round(job.realtime_factor, 2), 'average_fps': round(job.average_fps, 1),
+                     'error': job.error}
+                    for job in sorted(jobs, key=lambda j: j.submitted_at)]
+
+
+def load_manifest(manifest_path: str) -> list[dict]:
+    if manifest_path.lower().endswith(".csv"):
+        with open(manifest_path, newline='', encoding='utf-8-sig') as f:
+            rows = [{key.strip(): value.strip() for key, value in row.items() if key} for row in csv.DictReader(f)]
+        manifest = []
+        for line_number, row in enumerate(rows, start=2):
+            try:
+                manifest.append(normalize_params(row))
+            except ValueError as e:
+                raise ValueError(f"{manifest_path}, dòng {line_number}: {e}")
+        return manifest
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        return manifest
+    defaults = manifest.get('defaults', {})
+    return [{**defaults, **job} for job in manifest.get('jobs', [])]
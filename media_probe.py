@@ -0,0 +1,173 @@
+# media_probe.py
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+from dataclasses import asdict, dataclass, field
+
+from app_paths import atomic_write, evict_lru, get_cache_dir
+from ffmpeg_tools import get_creation_flags
+from supervisor import FFmpegTimeoutError
+
+PROBE_CACHE_VERSION = 2
+PROBE_CACHE_MAX_ENTRIES = 500
+DURATION_PATTERN = re.compile(r"Duration: (\d+):(\d{2}):(\d{2})\.(\d+)")
+STREAM_PATTERN = re.compile(r"Stream #0:(\d+)[^:]*: (Video|Audio|Subtitle|Data|Attachment): (\w+)(.*)")
+RESOLUTION_PATTERN = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+FPS_PATTERN = re.compile(r"([\d.]+)(k?) fps")
+SAMPLE_RATE_PATTERN = re.compile(r"(\d+) Hz, ([^,]+)")
+
+
+@dataclass
+class MediaInfo:
+    duration: float
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    video_codec: str = ""
+    # None: chưa quét keyframe (xem probe_keyframes)
+    keyframes: list | None = None
+    streams: list = field(default_factory=list)
+
+    @property
+    def has_audio(self) -> bool:
+        return any(stream['type'] == "audio" for stream in self.streams)
+
+
+def _parse_streams(log_output: str) -> list[dict]:
+    streams = []
+    for match in STREAM_PATTERN.finditer(log_output):
+        index, stream_type, codec, details = match.groups()
+        stream = {'index': int(index), 'type': stream_type.lower(), 'codec': codec}
+        if stream_type == "Video":
+            resolution_match = RESOLUTION_PATTERN.search(details)
+            if resolution_match:
+                stream['width'], stream['height'] = map(int, resolution_match.groups())
+            fps_match = FPS_PATTERN.search(details)
+            if fps_match:
+                stream['fps'] = float(fps_match.group(1)) * (1000 if fps_match.group(2) else 1)
+        elif stream_type == "Audio":
+            sample_rate_match = SAMPLE_RATE_PATTERN.search(details)
+            if sample_rate_match:
+                stream['sample_rate'] = int(sample_rate_match.group(1))
+                stream['channels'] = sample_rate_match.group(2).strip()
+        streams.append(stream)
+    return streams
+
+
+def _parse_keyframes(packet_output: str) -> list[float]:
+    # framecrc: "stream, dts, pts, duration, size, hash[, F=flags]"; packet keyframe không có cờ F=
+    time_base = None
+    keyframes = []
+    for line in packet_output.splitlines():
+        if line.startswith("#tb 0:"):
+            numerator, denominator = line.split(":", 1)[1].strip().split("/")
+            time_base = int(numerator) / int(denominator)
+        elif line and not line.startswith("#") and time_base and "F=" not in line:
+            fields = [value.strip() for value in line.split(",")]
+            try:
+                keyframes.append(int(fields[2]) * time_base)
+            except (IndexError, ValueError):
+                continue
+    return sorted(set(keyframes))
+
+
+def _run_ffmpeg_probe(command: list[str], deadline: float | None, action: str) -> subprocess.CompletedProcess:
+    # deadline (time.monotonic) là hạn của cả job; file hỏng hoặc ổ mạng treo không được giữ job quá hạn đó
+    timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+    try:
+        result = subprocess.run(
+            command, capture_output=True, text=True, encoding='utf-8', errors='ignore',
+            creationflags=get_creation_flags(), timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        raise FFmpegTimeoutError(f"Job vượt quá thời gian cho phép khi {action}.")
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
+        raise RuntimeError(f"Không thể {action}: {last_line}")
+    return result
+
+
+def run_probe(video_path: str, ffmpeg_executable: str, deadline: float | None = None) -> MediaInfo:
+    # Chỉ đọc phần đầu file (-frames:v 0): thời lượng và stream lấy từ log của ffmpeg, keyframe quét riêng khi cần
+    command = [ffmpeg_executable, '-hide_banner', '-i', video_path, '-map', '0:v:0', '-c', 'copy',
+               '-frames:v', '0', '-f', 'null', '-']
+    result = _run_ffmpeg_probe(command, deadline, "đọc thông tin video")
+
+    input_log = result.stderr.split("Stream mapping:", 1)[0]
+    streams = _parse_streams(input_log)
+    duration = 0.0
+    duration_match = DURATION_PATTERN.search(input_log)
+    if duration_match:
+        hours, minutes, seconds, fraction = duration_match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(fraction) / (10 ** len(fraction))
+    if duration <= 0:
+        raise ValueError("Không thể xác định thời lượng video.")
+
+    video_stream = next((stream for stream in streams if stream['type'] == "video"), {})
+    return MediaInfo(duration=duration, width=video_stream.get('width', 0), height=video_stream.get('height', 0),
+                     fps=video_stream.get('fps', 0.0), video_codec=video_stream.get('codec', ""), streams=streams)
+
+
+def scan_keyframes(video_path: str, ffmpeg_executable: str, deadline: float | None = None) -> list[float]:
+    # stdout liệt kê mọi packet video (không giải mã) nên phải đọc hết file
+    command = [ffmpeg_executable, '-hide_banner', '-i', video_path, '-map', '0:v:0', '-c', 'copy',
+               '-f', 'framecrc', '-']
+    result = _run_ffmpeg_probe(command, deadline, "quét keyframe của video")
+    return _parse_keyframes(result.stdout)
+
+
+def get_probe_cache_key(video_path: str) -> str:
+    stat = os.stat(video_path)
+    identity = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+def _load_cached_info(cache_path: str) -> MediaInfo | None:
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('version') == PROBE_CACHE_VERSION:
+            os.utime(cache_path)
+            return MediaInfo(**cached['info'])
+    except (OSError, json.JSONDecodeError, TypeError, KeyError):
+        pass
+    return None
+
+
+def _store_cached_info(cache_path: str, video_path: str, info: MediaInfo, max_entries: int):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with atomic_write(cache_path) as f:
+            json.dump({'version': PROBE_CACHE_VERSION, 'path': os.path.abspath(video_path), 'info': asdict(info)}, f)
+        evict_lru(os.path.dirname(cache_path), max_entries, lambda name: name.endswith(".json"))
+    except OSError:
+        pass
+
+
+def probe_media(video_path: str, ffmpeg_executable: str, cache_dir: str | None = None,
+                max_entries: int = PROBE_CACHE_MAX_ENTRIES, deadline: float | None = None) -> MediaInfo:
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Không tìm thấy {video_path}.")
+    cache_path = os.path.join(cache_dir or get_cache_dir("probe"), f"{get_probe_cache_key(video_path)}.json")
+    info = _load_cached_info(cache_path)
+    if info is None:
+        info = run_probe(video_path, ffmpeg_executable, deadline)
+        _store_cached_info(cache_path, video_path, info, max_entries)
+    return info
+
+
+def probe_keyframes(video_path: str, info: MediaInfo, ffmpeg_executable: str, cache_dir: str | None = None,
+                    max_entries: int = PROBE_CACHE_MAX_ENTRIES, deadline: float | None = None) -> list[float]:
+    """Điền info.keyframes (quét một lần rồi lưu cùng mục cache của probe_media) và trả về danh sách đó."""
+    if info.keyframes is None:
+        cache_path = os.path.join(cache_dir or get_cache_dir("probe"), f"{get_probe_cache_key(video_path)}.json")
+        cached = _load_cached_info(cache_path)
+        if cached is not None and cached.keyframes is not None:
+            info.keyframes = cached.keyframes
+        else:
+            info.keyframes = scan_keyframes(video_path, ffmpeg_executable, deadline)
+            _store_cached_info(cache_path, video_path, info, max_entries)
+    return info.keyframes
@@ -0,0 +1,93 @@
+# preview.py
+import os
+import threading
+
+from app_paths import evict_lru, get_cache_dir, get_temp_path
+from media_probe import probe_media
+from processor import (build_filter_complex, get_ffmpeg_path, parse_logo_window, parse_options, parse_timestamp,
+                       run_ffmpeg, run_font_preflight, run_speaker_preprocess)
+from render_journal import compute_render_hash, get_file_identity, hash_file
+
+PREVIEW_CACHE_MAX_ENTRIES = 100
+DEFAULT_PREVIEW_CLIP_SECONDS = 3.0
+SPEAKER_KEYS = ('speaker_lines', 'speaker_names', 'actor_style')
+
+
+def get_font_dirs_identity(params) -> list:
+    # Chỉ tính thư mục font người dùng chỉ định và thư mục fonts cạnh phụ đề; font hệ thống ít khi đổi giữa hai lần
+    # xem trước nên không quét lại
+    identity = []
+    for font_dir in (params.get('fonts_dir'),
+                     os.path.join(os.path.dirname(os.path.abspath(params['subtitle_path'])), "fonts")):
+        if font_dir and os.path.isdir(font_dir):
+            identity.append(sorted(get_file_identity(os.path.join(font_dir, name)) for name in os.listdir(font_dir)))
+    return identity
+
+
+def build_preview_command(params, ffmpeg_executable: str, timestamp: float, clip_seconds: float, options,
+                          logo_window, fonts_dir, output_path: str) -> list[str]:
+    logo_width, margin_top, margin_right, _ = options
+    # -ss đặt trước -i: ffmpeg nhảy tới keyframe gần nhất thay vì giải mã từ đầu, khung đầu ra bắt đầu từ 0
+    # nên phụ đề và logo được dời theo timestamp giống như khi xử lý theo đoạn
+    filter_complex_string = build_filter_complex(params['subtitle_path'], logo_width, margin_top, margin_right,
+                                                 time_offset=timestamp, logo_window=logo_window, fonts_dir=fonts_dir)
+    command = [ffmpeg_executable, '-y', '-ss', f"{timestamp:.3f}", '-i', params['video_path'],
+               '-i', params['logo_path'], '-filter_complex', filter_complex_string]
+    if clip_seconds > 0:
+        command += ['-map', '0:a?', '-t', f"{clip_seconds:.3f}", '-c:v', 'libx264', '-preset', 'ultrafast',
+                    '-crf', '23', '-c:a', 'aac', '-f', 'mp4']
+    else:
+        command += ['-frames:v', '1', '-f', 'image2', '-c:v', 'png']
+    command.append(output_path)
+    return command
+
+
+def render_preview(params, timestamp, clip_seconds: float = 0.0, status_callback=None,
+                   cancel_requested_getter=None, cache_dir: str | None = None) -> str | None:
+    """Dựng ảnh tĩnh (clip_seconds = 0) hoặc đoạn clip ngắn tại timestamp, trả về đường dẫn file trong cache."""
+    status_callback = status_callback or (lambda message: None)
+    cancel_requested_getter = cancel_requested_getter or (lambda: False)
+    options = parse_options(params)
+    timestamp = parse_timestamp(timestamp)
+    ffmpeg_executable = get_ffmpeg_path()
+    if not os.path.exists(ffmpeg_executable):
+        raise FileNotFoundError(f"Không tìm thấy {ffmpeg_executable}.")
+    for key in ('video_path', 'logo_path', 'subtitle_path'):
+        if not os.path.exists(params[key]):
+            raise FileNotFoundError(f"Không tìm thấy {params[key]}.")
+
+    media_info = probe_media(params['video_path'], ffmpeg_executable)
+    if timestamp >= media_info.duration:
+        raise ValueError("Thời điểm xem trước vượt quá thời lượng video.")
+    clip_seconds = max(0.0, min(float(clip_seconds), media_info.duration - timestamp))
+    logo_window = parse_logo_window(params, media_info.duration)
+
+    # Khóa tính từ đầu vào gốc để bản đã dựng được trả về trước khi tách tên người nói và kiểm tra font
+    cache_dir = cache_dir or get_cache_dir("preview")
+    preview_key = compute_render_hash(
+        get_file_identity(params['video_path']), hash_file(params['logo_path']), hash_file(params['subtitle_path']),
+        [params.get(key) for key in SPEAKER_KEYS], get_font_dirs_identity(params), list(options), logo_window,
+        round(timestamp, 3), round(clip_seconds, 3))
+    preview_path = os.path.join(cache_dir, f"{preview_key}.{'mp4' if clip_seconds > 0 else 'png'}")
+    if os.path.exists(preview_path):
+        os.utime(preview_path)
+        return preview_path
+
+    params = run_speaker_preprocess(params, status_callback)
+    fonts_dir = run_font_preflight(params, status_callback)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = get_temp_path(preview_path, ".partial")
+    command = build_preview_command(params, ffmpeg_executable, timestamp, clip_seconds, options, logo_window,
+                                    fonts_dir, temp_path)
+    pause_event = threading.Event()
+    pause_event.set()
+    try:
+        if not run_ffmpeg(command, pause_event, cancel_requested_getter):
+            return None
+        os.replace(temp_path, preview_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    evict_lru(cache_dir, PREVIEW_CACHE_MAX_ENTRIES, lambda name: not name.endswith(".partial"))
+    return preview_path
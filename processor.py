@@ -1,9 +1,42 @@
 # processor.py
-import subprocess
 import sys
 import os
-import re
+import csv
+import shutil
+import tempfile
+import threading
 import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from media_probe import MediaInfo, probe_keyframes, probe_media
+from progress import DEFAULT_PROGRESS_INTERVAL, ProgressEvent, ProgressReporter, ProgressSample
+from job_metrics import JobMetrics
+from supervisor import (DEFAULT_STALL_RETRIES, DEFAULT_STALL_TIMEOUT, FFmpegError, FFmpegStalledError,
+                        FFmpegSupervisor, SupervisorLimits)
+import render_cache
+from render_cache import get_render_cache_dir, hash_file_sampled
+from render_journal import (apply_chunk_signatures, compute_render_hash, get_chunk_signatures, get_file_identity,
+                            get_parts_dir, hash_file, load_journal, save_journal)
+from font_resolver import prepare_fonts
+from ass_transform import ACTOR_STYLE_NAME, prepare_speaker_subtitle
+from stream_output import (SegmentWatcher, build_stream_output_args, parse_stream_options, remove_stream_files,
+                           run_segment_hook)
+from ass_events import get_active_ranges, load_events, merge_ranges, overlaps_any, read_ass_lines, widen_to_keyframes
+
+SEGMENTS_PER_WORKER = 2
+RESUMABLE_CHUNK_SECONDS = 60
+FFMPEG_PATH_ENV = "SUBTITLE_MERGER_FFMPEG"
+FLAG_OPTIONS = ("smart_render", "resumable", "incremental", "render_cache", "speaker_lines", "strict_fonts")
+# Đoạn gốc và đoạn mã hóa lại mang SPS/PPS (HEVC thêm VPS) khác nhau. Demuxer concat chỉ tự chèn lại tham số này
+# vào trước mỗi keyframe với H.264 (h264_mp4toannexb), nên smart render chỉ hỗ trợ H.264
+SMART_RENDER_CODEC_FAMILIES = ("h264",)
+# avc3: MP4 cho phép SPS/PPS nằm trong luồng, trình phát phải đọc lại tham số khi chúng đổi giữa các đoạn
+IN_BAND_HEADER_TAG = "avc3"
+INTEGER_OPTIONS = ("parallel_segments", "threads", "stall_retries")
+TRUE_VALUES = ("1", "true", "yes", "y", "on", "có")
+FALSE_VALUES = ("", "0", "false", "no", "n", "off", "không")
 
 def escape_path_for_ffmpeg_filter(path: str) -> str:
     if sys.platform == "win32":
@@ -11,110 +44,821 @@ def escape_path_for_ffmpeg_filter(path: str) -> str:
         path = path.replace(':', '\\:')
     return path
 
-def get_video_duration(video_path: str, ffmpeg_executable: str) -> tuple[float, str]:
-    command = [ffmpeg_executable, "-i", video_path]
-    try:
-        result = subprocess.run(
-            command, capture_output=True, text=True, encoding='utf-8', errors='ignore',
-            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-        )
-        output = result.stderr
-        match = re.search(r"Duration: (\d{2}):(\d{2}):(\d{2})\.(\d{2})", output)
-        if match:
-            hours, minutes, seconds, hundredths = map(int, match.groups())
-            total_seconds = float(hours * 3600 + minutes * 60 + seconds + hundredths / 100)
-            total_duration_str = f"{hours:02}:{minutes:02}:{seconds:02}"
-            return total_seconds, total_duration_str
-    except Exception:
-        pass
-    return 0.0, "00:00:00"
-
 def format_time(seconds: float) -> str:
     hours = int(seconds // 3600)
     minutes = int((seconds % 3600) // 60)
     seconds_int = int(seconds % 60)
     return f"{hours:02}:{minutes:02}:{seconds_int:02}"
 
+def parse_options(params) -> tuple[int, int, int, int]:
+    try:
+        logo_width = int(params['logo_width'])
+        margin_top = int(params['margin_top'])
+        margin_right = int(params['margin_right'])
+        bitrate_val = int(params['bitrate'])
+        if not all(x > 0 for x in [logo_width, bitrate_val]): raise ValueError("Logo Width và Bitrate phải là số dương.")
+        if not all(x >= 0 for x in [margin_top, margin_right]): raise ValueError("Margin Top và Margin Right không được là số âm.")
+    except (ValueError, KeyError):
+        raise ValueError("Các giá trị tùy chọn phải là số nguyên hợp lệ.")
+    return logo_width, margin_top, margin_right, bitrate_val
+
+def parse_flag(value) -> bool:
+    if not isinstance(value, str):
+        return bool(value)
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"Giá trị bật/tắt không hợp lệ: {value}")
+
+def normalize_params(params) -> dict:
+    # Manifest CSV chỉ có chuỗi: "false" hay "0" vẫn là chuỗi khác rỗng nên phải đổi kiểu trước khi dùng làm cờ
+    params = dict(params)
+    for key in FLAG_OPTIONS:
+        if key in params:
+            try:
+                params[key] = parse_flag(params[key])
+            except ValueError:
+                raise ValueError(f"Giá trị bật/tắt của {key} không hợp lệ: {params[key]}")
+    for key in INTEGER_OPTIONS:
+        if isinstance(params.get(key), str):
+            value = params[key].strip()
+            try:
+                params[key] = int(value) if value else None
+            except ValueError:
+                raise ValueError(f"{key} phải là số nguyên hợp lệ: {value}")
+    return params
+
+def build_filter_complex(subtitle_path: str, logo_width: int, margin_top: int, margin_right: int,
+                         time_offset: float = 0.0, logo_window=None, fonts_dir: str | None = None) -> str:
+    subtitles_filter = f"subtitles='{escape_path_for_ffmpeg_filter(subtitle_path)}'"
+    if fonts_dir:
+        subtitles_filter += f":fontsdir='{escape_path_for_ffmpeg_filter(fonts_dir)}'"
+    overlay_filter = f"overlay=W-w-{margin_right}:{margin_top}"
+    if logo_window is not None:
+        overlay_filter += f":enable='between(t,{logo_window[0]:.3f},{logo_window[1]:.3f})'"
+    if time_offset > 0:
+        # Đoạn cắt bắt đầu từ 0, dời PTS về thời điểm gốc để logo/phụ đề khớp rồi đưa lại về 0
+        return (f"[0:v]setpts=PTS+{time_offset:.6f}/TB[base];[1:v]scale={logo_width}:-1[logo];"
+                f"[base][logo]{overlay_filter}[video_with_logo];"
+                f"[video_with_logo]{subtitles_filter},setpts=PTS-STARTPTS")
+    return (f"[1:v]scale={logo_width}:-1[logo];[0:v][logo]{overlay_filter}[video_with_logo];"
+            f"[video_with_logo]{subtitles_filter}")
+
+def parse_timestamp(value) -> float:
+    parts = str(value).strip().split(":")
+    if not 1 <= len(parts) <= 3:
+        raise ValueError(f"Thời điểm không hợp lệ: {value}")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"Thời điểm không hợp lệ: {value}")
+    return seconds
+
+def parse_logo_window(params, total_duration_seconds: float):
+    logo_start = str(params.get('logo_start') or "").strip()
+    logo_end = str(params.get('logo_end') or "").strip()
+    if not logo_start and not logo_end:
+        return None
+    start = parse_timestamp(logo_start) if logo_start else 0.0
+    end = parse_timestamp(logo_end) if logo_end else total_duration_seconds
+    if end <= start:
+        raise ValueError("Thời điểm kết thúc logo phải lớn hơn thời điểm bắt đầu.")
+    return start, min(end, total_duration_seconds)
+
+def build_encoder_args(codec: str, bitrate_val: int, threads: int = 0) -> list[str]:
+    args = ['-c:v', codec, '-b:v', f'{bitrate_val}k', '-maxrate', f'{bitrate_val}k', '-bufsize', f'{bitrate_val * 2}k']
+    if threads > 0:
+        args += ['-threads', str(threads)]
+    return args
+
+def get_thread_limit(params) -> int:
+    try:
+        return max(0, int(params.get('threads') or 0))
+    except (TypeError, ValueError):
+        raise ValueError("Số luồng (threads) phải là số nguyên hợp lệ.")
+
+def get_threads_per_worker(params, worker_count: int) -> int:
+    # Chia giới hạn luồng (hoặc số CPU) cho các tiến trình ffmpeg chạy song song
+    return max(1, (get_thread_limit(params) or os.cpu_count() or 1) // max(1, worker_count))
+
+def run_ffmpeg(command, pause_event, cancel_requested_getter, on_progress=None, on_log=None,
+               limits: SupervisorLimits | None = None) -> bool:
+    limits = limits or SupervisorLimits()
+    attempt = 0
+    while True:
+        supervisor = FFmpegSupervisor(command, pause_event, cancel_requested_getter, on_progress, on_log,
+                                      stall_timeout=limits.stall_timeout, deadline=limits.deadline,
+                                      on_exit=limits.on_exit)
+        try:
+            return supervisor.run()
+        except FFmpegStalledError as e:
+            attempt += 1
+            if attempt > limits.stall_retries:
+                raise
+            if limits.on_retry:
+                limits.on_retry(attempt, e)
+
+def _report_cancelled(output_path, status_callback):
+    try:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+            status_callback("Đã hủy bỏ và xóa file output.")
+        else:
+            status_callback("Đã hủy bỏ bởi người dùng.")
+    except OSError as e:
+        status_callback(f"Đã hủy, nhưng không thể xóa file: {e}")
+
+def _escape_concat_path(path: str) -> str:
+    return path.replace("\\", "/").replace("'", "'\\''")
+
+def pick_keyframe_boundaries(target_times, keyframe_times) -> list[float]:
+    boundaries = set()
+    for target in target_times:
+        index = bisect_left(keyframe_times, target)
+        candidates = keyframe_times[max(0, index - 1):index + 1]
+        if candidates:
+            boundaries.add(min(candidates, key=lambda t: abs(t - target)))
+    return sorted(t for t in boundaries if t > 0)
+
+def split_at_keyframes(video_path, boundaries, keyframe_times, total_duration_seconds, work_dir,
+                       ffmpeg_executable, pause_event, cancel_requested_getter, limits=None):
+    # boundaries phải là keyframe; segment muxer cắt tại keyframe đầu tiên sau mốc yêu cầu,
+    # nên yêu cầu cắt ở giữa keyframe trước đó và keyframe cần cắt
+    split_times = []
+    for boundary in boundaries:
+        index = bisect_left(keyframe_times, boundary)
+        previous_keyframe = keyframe_times[index - 1] if index > 0 else 0.0
+        split_times.append((previous_keyframe + boundary) / 2)
+    list_path = os.path.join(work_dir, "source_segments.csv")
+    command = [ffmpeg_executable, '-y', '-i', video_path, '-map', '0:v:0', '-c', 'copy', '-f', 'segment',
+               '-segment_list', list_path, '-segment_list_type', 'csv', '-reset_timestamps', '1']
+    if split_times:
+        command += ['-segment_times', ",".join(f"{t:.6f}" for t in split_times)]
+    else:
+        # Không có điểm cắt: segment muxer mặc định cắt mỗi 2 giây nên phải chỉ định rõ một đoạn duy nhất
+        command += ['-segment_time', f"{total_duration_seconds + 1:.6f}"]
+    command.append(os.path.join(work_dir, "source_%04d.mp4"))
+    try:
+        if not run_ffmpeg(command, pause_event, cancel_requested_getter, limits=limits):
+            return None
+    except (FFmpegError, FFmpegStalledError) as e:
+        raise RuntimeError(f"Không thể chia video: {e}")
+    with open(list_path, newline='', encoding='utf-8') as f:
+        segment_files = [row[0] for row in csv.reader(f) if row]
+    if len(segment_files) != len(boundaries) + 1:
+        raise RuntimeError("Không thể chia video đúng tại các keyframe đã chọn.")
+    starts = [0.0] + list(boundaries)
+    ends = list(boundaries) + [total_duration_seconds]
+    return [(os.path.join(work_dir, name), start, end) for name, start, end in zip(segment_files, starts, ends)]
+
+def concat_segments(segment_paths, video_path, output_path, work_dir, ffmpeg_executable,
+                    pause_event, cancel_requested_getter, limits=None, in_band_headers: bool = False):
+    # in_band_headers: các đoạn có SPS/PPS khác nhau (smart render), avcC ở đầu file chỉ là của đoạn đầu tiên nên
+    # giữ tham số trong luồng trước mỗi keyframe và đánh dấu avc3 để trình phát dùng đúng tham số cho từng đoạn
+    list_path = os.path.join(work_dir, "concat.txt")
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            f.write(f"file '{_escape_concat_path(os.path.abspath(path))}'\n")
+    command = [ffmpeg_executable, '-y', '-f', 'concat', '-safe', '0']
+    if in_band_headers:
+        command += ['-auto_convert', '1']
+    command += ['-i', list_path, '-i', video_path, '-map', '0:v', '-map', '1:a?', '-c:v', 'copy']
+    if in_band_headers:
+        command += ['-tag:v', IN_BAND_HEADER_TAG]
+    command.append(output_path)
+    try:
+        return run_ffmpeg(command, pause_event, cancel_requested_getter, limits=limits)
+    except (FFmpegError, FFmpegStalledError) as e:
+        raise RuntimeError(f"Không thể ghép các đoạn: {e}")
+
+def encode_segments(jobs, worker_count, reporter, pause_event, cancel_requested_getter, on_log=None,
+                    on_segment_done=None, limits=None):
+    # jobs: danh sách (command, offset_seconds) đã dựng sẵn cho từng đoạn
+    abort_event = threading.Event()
+
+    def should_stop():
+        return abort_event.is_set() or cancel_requested_getter()
+
+    def encode_one(index):
+        command, _ = jobs[index]
+        if should_stop():
+            return False
+        try:
+            completed = run_ffmpeg(command, pause_event, should_stop,
+                                   lambda sample: reporter.update(index, sample), on_log, limits)
+        except (FFmpegError, FFmpegStalledError) as e:
+            abort_event.set()
+            raise RuntimeError(f"Đoạn {index + 1}/{len(jobs)}: {e}")
+        if completed and on_segment_done:
+            on_segment_done(index)
+        return completed
+
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        futures = [executor.submit(encode_one, i) for i in range(len(jobs))]
+        completed = True
+        for future in futures:
+            completed = future.result() and completed
+    return completed and not cancel_requested_getter()
+
+def build_supervisor_limits(params, status_callback, metrics: JobMetrics | None = None) -> SupervisorLimits:
+    def on_retry(attempt, error):
+        if metrics:
+            metrics.record_retry(attempt, str(error))
+        status_callback(f"Cảnh báo: {error} Đang thử lại lần {attempt}...")
+
+    try:
+        # stall_timeout = 0 tắt việc phát hiện treo; chỉ dùng mặc định khi không khai báo
+        stall_timeout = float(params.get('stall_timeout') if params.get('stall_timeout') not in (None, "")
+                              else DEFAULT_STALL_TIMEOUT)
+        stall_retries = int(params.get('stall_retries') if params.get('stall_retries') not in (None, "")
+                            else DEFAULT_STALL_RETRIES)
+        timeout = float(params.get('timeout') or 0)
+    except (TypeError, ValueError):
+        raise ValueError("Giới hạn thời gian (stall_timeout, stall_retries, timeout) phải là số.")
+    # timeout tính cho cả job, kể cả các lần thử lại và các bước chia/ghép đoạn
+    deadline = time.monotonic() + timeout if timeout > 0 else None
+    return SupervisorLimits(stall_timeout=stall_timeout, stall_retries=max(0, stall_retries), deadline=deadline,
+                            on_retry=on_retry, on_exit=metrics.record_ffmpeg_exit if metrics else None)
+
+def run_speaker_preprocess(params, status_callback) -> dict:
+    # Trả về bản sao params trỏ tới phụ đề đã tách tên người nói, file gốc không bị sửa
+    if not params.get('speaker_lines'):
+        return params
+    status_callback("Đang tách tên người nói trong phụ đề...")
+    subtitle_path, result = prepare_speaker_subtitle(params['subtitle_path'], params.get('speaker_names'),
+                                                     params.get('actor_style') or ACTOR_STYLE_NAME)
+    if result and not (result.actor_lines or result.kept_actor_lines):
+        status_callback("Cảnh báo: Không tìm thấy dòng nào có tên người nói.")
+    return {**params, 'subtitle_path': subtitle_path, 'source_subtitle_path': params['subtitle_path']}
+
+def run_font_preflight(params, status_callback) -> str | None:
+    status_callback("Đang kiểm tra font trong phụ đề...")
+    font_dirs = [params.get('fonts_dir')]
+    if params.get('source_subtitle_path'):
+        font_dirs.append(os.path.join(os.path.dirname(os.path.abspath(params['source_subtitle_path'])), "fonts"))
+    try:
+        preflight = prepare_fonts(params['subtitle_path'], font_dirs)
+    except OSError as e:
+        status_callback(f"Cảnh báo: Không thể chuẩn bị font, libass sẽ tự tìm font hệ thống ({e}).")
+        return None
+    if preflight.missing:
+        missing = ", ".join(preflight.missing)
+        if params.get('strict_fonts'):
+            raise ValueError(f"Không tìm thấy font: {missing}.")
+        status_callback(f"Cảnh báo: Không tìm thấy font: {missing}. Phụ đề sẽ hiển thị bằng font thay thế.")
+    return preflight.fonts_dir
+
+def get_codec_family(codec: str) -> str:
+    if codec in ("libx264", "h264") or codec.startswith("h264_"):
+        return "h264"
+    if codec in ("libx265", "hevc") or codec.startswith("hevc_"):
+        return "hevc"
+    return codec
+
+def get_smart_render_issue(codec: str, media_info: MediaInfo) -> str | None:
+    family = get_codec_family(codec)
+    if family not in SMART_RENDER_CODEC_FAMILIES:
+        return f"chỉ hỗ trợ codec H.264 (đầu ra đang là {codec})"
+    if family != get_codec_family(media_info.video_codec):
+        return f"codec đầu ra phải cùng loại với video gốc ({media_info.video_codec or 'không rõ'})"
+    return None
+
+@dataclass
+class JobContext:
+    params: dict
+    options: tuple
+    ffmpeg_executable: str
+    media_info: MediaInfo
+    status_callback: Callable
+    pause_event: threading.Event
+    cancel_requested_getter: Callable
+    progress_interval: float = DEFAULT_PROGRESS_INTERVAL
+    on_log: Callable | None = None
+    limits: SupervisorLimits | None = None
+    fonts_dir: str | None = None
+    metrics: JobMetrics = field(default_factory=JobMetrics)
+
+    def make_reporter(self, total_duration: float) -> ProgressReporter:
+        return ProgressReporter(total_duration, self.status_callback, self.progress_interval)
+
+    def get_keyframes(self) -> list[float]:
+        # Quét keyframe phải đọc hết video nên chỉ chạy khi chế độ chia đoạn thật sự cần
+        with self.metrics.stage("probe"):
+            return probe_keyframes(self.params['video_path'], self.media_info, self.ffmpeg_executable,
+                                   deadline=self.limits.deadline if self.limits else None)
+
+def build_segment_command(context: JobContext, source_path: str, start: float, output_path: str,
+                          threads: int) -> list[str]:
+    # Đoạn đã được cắt sẵn bắt đầu từ 0; start dùng để dời logo/phụ đề về đúng thời điểm gốc
+    params = context.params
+    logo_width, margin_top, margin_right, bitrate_val = context.options
+    filter_complex_string = build_filter_complex(params['subtitle_path'], logo_width, margin_top, margin_right,
+                                                 time_offset=start,
+                                                 logo_window=parse_logo_window(params, context.media_info.duration),
+                                                 fonts_dir=context.fonts_dir)
+    return [context.ffmpeg_executable, '-y', '-i', source_path, '-i', params['logo_path'],
+            '-filter_complex', filter_complex_string, *build_encoder_args(params['codec'], bitrate_val, threads),
+            '-an', '-f', 'mp4', output_path]
+
+def _run_smart_render(context: JobContext, work_dir: str):
+    params = context.params
+    media_info = context.media_info
+    total_duration_seconds = media_info.duration
+    worker_count = max(1, int(params.get('parallel_segments') or 1))
+    threads_per_worker = get_threads_per_worker(params, worker_count)
+
+    ranges = get_active_ranges(load_events(params['subtitle_path']))
+    logo_window = parse_logo_window(params, total_duration_seconds)
+    ranges = merge_ranges(ranges + [logo_window or (0.0, total_duration_seconds)])
+    if logo_window is None:
+        context.status_callback("Cảnh báo: Logo hiển thị suốt video nên toàn bộ video vẫn phải mã hóa lại. "
+                                "Hãy đặt khoảng thời gian hiển thị logo để dùng smart render hiệu quả.")
+
+    keyframes = context.get_keyframes()
+    burn_ranges = widen_to_keyframes(ranges, keyframes, total_duration_seconds)
+    boundaries = sorted({t for burn_range in burn_ranges for t in burn_range if 0 < t < total_duration_seconds})
+
+    context.status_callback(f"3/4: Đang chia video tại {len(boundaries)} keyframe...")
+    with context.metrics.stage("split"):
+        segments = split_at_keyframes(params['video_path'], boundaries, keyframes, total_duration_seconds, work_dir,
+                                      context.ffmpeg_executable, context.pause_event,
+                                      context.cancel_requested_getter, context.limits)
+    if segments is None:
+        return None
+
+    jobs = []
+    piece_paths = []
+    for index, (source_path, start, end) in enumerate(segments):
+        if not overlaps_any(burn_ranges, start, end):
+            piece_paths.append(source_path)
+            continue
+        encoded_path = os.path.join(work_dir, f"encoded_{index:04d}.mp4")
+        jobs.append((build_segment_command(context, source_path, start, encoded_path, threads_per_worker), start))
+        piece_paths.append(encoded_path)
+
+    encode_seconds = sum(end - start for _, start, end in segments if overlaps_any(burn_ranges, start, end))
+    context.status_callback(f"3/4: Mã hóa lại {len(jobs)}/{len(segments)} đoạn "
+                            f"({format_time(encode_seconds)} / {format_time(total_duration_seconds)}), "
+                            f"sao chép nguyên phần còn lại...")
+    reporter = context.make_reporter(encode_seconds)
+    reporter.start()
+    with context.metrics.stage("encode"):
+        if jobs and not encode_segments(jobs, worker_count, reporter, context.pause_event,
+                                        context.cancel_requested_getter, context.on_log, limits=context.limits):
+            return None
+    return piece_paths, reporter
+
+def _run_segmented(context: JobContext, work_dir: str):
+    params = context.params
+    total_duration_seconds = context.media_info.duration
+    worker_count = int(params['parallel_segments'])
+    segment_count = max(1, worker_count * SEGMENTS_PER_WORKER)
+    threads_per_worker = get_threads_per_worker(params, worker_count)
+    keyframes = context.get_keyframes()
+    boundaries = pick_keyframe_boundaries(
+        [total_duration_seconds * i / segment_count for i in range(1, segment_count)], keyframes)
+
+    context.status_callback(f"3/4: Đang chia video tại các keyframe ({len(boundaries) + 1} đoạn)...")
+    with context.metrics.stage("split"):
+        segments = split_at_keyframes(params['video_path'], boundaries, keyframes, total_duration_seconds, work_dir,
+                                      context.ffmpeg_executable, context.pause_event,
+                                      context.cancel_requested_getter, context.limits)
+    if segments is None:
+        return None
+
+    jobs = []
+    encoded_paths = []
+    for index, (source_path, start, _) in enumerate(segments):
+        encoded_path = os.path.join(work_dir, f"encoded_{index:04d}.mp4")
+        jobs.append((build_segment_command(context, source_path, start, encoded_path, threads_per_worker), start))
+        encoded_paths.append(encoded_path)
+
+    context.status_callback(f"3/4: Đang xử lý song song {len(jobs)} đoạn với {worker_count} tiến trình...")
+    reporter = context.make_reporter(total_duration_seconds)
+    reporter.start()
+    with context.metrics.stage("encode"):
+        if not encode_segments(jobs, worker_count, reporter, context.pause_event,
+                               context.cancel_requested_getter, context.on_log, limits=context.limits):
+            return None
+    return encoded_paths, reporter
+
+def _build_chunk_layout(context: JobContext) -> list[dict]:
+    total_duration_seconds = context.media_info.duration
+    chunk_seconds = float(context.params.get('chunk_seconds') or RESUMABLE_CHUNK_SECONDS)
+    chunk_count = max(1, round(total_duration_seconds / chunk_seconds))
+    boundaries = pick_keyframe_boundaries(
+        [total_duration_seconds * i / chunk_count for i in range(1, chunk_count)], context.get_keyframes())
+    starts = [0.0] + boundaries
+    ends = boundaries + [total_duration_seconds]
+    return [{'start': start, 'end': end, 'file': f"chunk_{index:04d}.mp4", 'done': False}
+            for index, (start, end) in enumerate(zip(starts, ends))]
+
+def _get_resume_hash(context: JobContext) -> str:
+    # Nội dung phụ đề không nằm trong mã này mà được so theo từng đoạn qua get_chunk_signatures
+    params = context.params
+    return compute_render_hash(
+        get_file_identity(params['video_path']), hash_file(params['logo_path']), list(context.options),
+        params['codec'], parse_logo_window(params, context.media_info.duration),
+        params.get('chunk_seconds') or RESUMABLE_CHUNK_SECONDS,
+        os.path.basename(context.fonts_dir) if context.fonts_dir else None)
+
+def _run_resumable(context: JobContext, parts_dir: str):
+    params = context.params
+    total_duration_seconds = context.media_info.duration
+    worker_count = max(1, int(params.get('parallel_segments') or 1))
+    threads_per_worker = get_threads_per_worker(params, worker_count)
+
+    resume_hash = _get_resume_hash(context)
+    journal = load_journal(parts_dir)
+    if journal and journal.get('hash') == resume_hash:
+        done_count = sum(1 for chunk in journal['chunks'] if chunk['done'])
+        context.status_callback(f"2/4: Tìm thấy bản dở dang: {done_count}/{len(journal['chunks'])} đoạn đã hoàn tất, "
+                                f"tiếp tục từ đoạn còn lại...")
+    else:
+        if journal:
+            context.status_callback("Cảnh báo: Tham số đã thay đổi so với lần chạy trước, bắt đầu lại từ đầu.")
+        for name in os.listdir(parts_dir):
+            os.remove(os.path.join(parts_dir, name))
+        journal = {'hash': resume_hash, 'split_done': False, 'chunks': _build_chunk_layout(context), 'events': []}
+        save_journal(parts_dir, journal)
+    chunks = journal['chunks']
+    journal_lock = threading.Lock()
+
+    signatures, event_hashes = get_chunk_signatures(read_ass_lines(params['subtitle_path']), chunks)
+    changed, added, removed = apply_chunk_signatures(journal, signatures, event_hashes)
+    if changed:
+        context.status_callback(f"2/4: Phụ đề đã thay đổi (+{added}/-{removed} dòng), cần mã hóa lại "
+                                f"{len(changed)}/{len(chunks)} đoạn.")
+    save_journal(parts_dir, journal)
+
+    if not journal['split_done']:
+        boundaries = [chunk['start'] for chunk in chunks[1:]]
+        keyframes = context.get_keyframes()
+        context.status_callback(f"3/4: Đang chia video tại các keyframe ({len(chunks)} đoạn)...")
+        with context.metrics.stage("split"):
+            segments = split_at_keyframes(params['video_path'], boundaries, keyframes, total_duration_seconds,
+                                          parts_dir, context.ffmpeg_executable, context.pause_event,
+                                          context.cancel_requested_getter, context.limits)
+        if segments is None:
+            return None
+        for chunk, (source_path, _, _) in zip(chunks, segments):
+            chunk['source'] = os.path.basename(source_path)
+        journal['split_done'] = True
+        save_journal(parts_dir, journal)
+
+    reporter = context.make_reporter(total_duration_seconds)
+    reporter.start()
+    jobs = []
+    pending_chunks = []
+    for index, chunk in enumerate(chunks):
+        chunk_path = os.path.join(parts_dir, chunk['file'])
+        if chunk['done'] and os.path.exists(chunk_path):
+            reporter.update(f"done-{index}", ProgressSample(out_time=chunk['end'] - chunk['start'], finished=True))
+            continue
+        chunk['done'] = False
+        command = build_segment_command(context, os.path.join(parts_dir, chunk['source']), chunk['start'],
+                                        f"{chunk_path}.partial", threads_per_worker)
+        jobs.append((command, chunk['start']))
+        pending_chunks.append(chunk)
+
+    def on_chunk_done(job_index):
+        # Đoạn chỉ được ghi nhận sau khi file đã hoàn chỉnh, nên mất điện giữa chừng chỉ mất đoạn đang dở
+        chunk = pending_chunks[job_index]
+        chunk_path = os.path.join(parts_dir, chunk['file'])
+        os.replace(f"{chunk_path}.partial", chunk_path)
+        with journal_lock:
+            chunk['done'] = True
+            save_journal(parts_dir, journal)
+
+    if jobs:
+        context.status_callback(f"3/4: Đang xử lý {len(jobs)}/{len(chunks)} đoạn còn lại...")
+        with context.metrics.stage("encode"):
+            completed = encode_segments(jobs, worker_count, reporter, context.pause_event,
+                                        context.cancel_requested_getter, context.on_log, on_chunk_done, context.limits)
+        if not completed:
+            done_count = sum(1 for chunk in chunks if chunk['done'])
+            context.status_callback(f"Cảnh báo: Đã giữ lại {done_count}/{len(chunks)} đoạn hoàn tất, "
+                                    f"chạy lại với cùng tham số để tiếp tục.")
+            return None
+    return [os.path.join(parts_dir, chunk['file']) for chunk in chunks], reporter
+
+def _run_piecewise(context: JobContext, mode_runner, work_dir: str | None = None,
+                   keep_work_dir: bool = False, in_band_headers: bool = False) -> ProgressReporter | None:
+    # work_dir cố định (chế độ resumable) chỉ bị xóa khi đã ghép xong; chế độ incremental giữ lại để lần sau dùng tiếp
+    output_path = context.params['output_path']
+    persistent = work_dir is not None
+    if persistent:
+        os.makedirs(work_dir, exist_ok=True)
+    else:
+        work_dir = tempfile.mkdtemp(prefix=".segments-", dir=os.path.dirname(os.path.abspath(output_path)))
+    completed = False
+    try:
+        result = mode_runner(context, work_dir)
+        if result is None:
+            return None
+        piece_paths, reporter = result
+        context.status_callback("3/4: Đang ghép các đoạn...")
+        with context.metrics.stage("concat"):
+            if not concat_segments(piece_paths, context.params['video_path'], output_path, work_dir,
+                                   context.ffmpeg_executable, context.pause_event, context.cancel_requested_getter,
+                                   context.limits, in_band_headers):
+                return None
+        completed = True
+        return reporter
+    finally:
+        if (completed and not keep_work_dir) or not persistent:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def _run_single_pass(context: JobContext) -> ProgressReporter | None:
+    params = context.params
+    logo_width, margin_top, margin_right, bitrate_val = context.options
+    context.status_callback("2/4: Đang xây dựng lệnh FFmpeg...")
+    filter_complex_string = build_filter_complex(params['subtitle_path'], logo_width, margin_top, margin_right,
+                                                 logo_window=parse_logo_window(params, context.media_info.duration),
+                                                 fonts_dir=context.fonts_dir)
+    stream_format, segment_seconds = parse_stream_options(params)
+    command = [context.ffmpeg_executable, '-y', '-i', params['video_path'], '-i', params['logo_path'],
+               '-filter_complex', filter_complex_string,
+               *build_encoder_args(params['codec'], bitrate_val, get_thread_limit(params))]
+    watcher = None
+    if stream_format:
+        command += build_stream_output_args(stream_format, params['output_path'], segment_seconds)
+        remove_stream_files(stream_format, params['output_path'])
+        watcher = SegmentWatcher(stream_format, params['output_path'], _make_segment_callback(context))
+    else:
+        command.append(params['output_path'])
+
+    context.status_callback("3/4: Bắt đầu xử lý...")
+    reporter = context.make_reporter(context.media_info.duration)
+    completed = False
+    if watcher:
+        watcher.start()
+    try:
+        with context.metrics.stage("encode"):
+            completed = run_ffmpeg(command, context.pause_event, context.cancel_requested_getter,
+                                   lambda sample: reporter.update(0, sample), context.on_log, context.limits)
+    finally:
+        if watcher:
+            watcher.stop(finished=completed)
+    if not completed:
+        return None
+    if watcher:
+        context.status_callback(f"Đã ghi {watcher.count} phần của luồng {stream_format}.")
+    return reporter
+
+def _make_segment_callback(context: JobContext):
+    hook = context.params.get('segment_hook')
+
+    def on_segment(event):
+        context.status_callback(event)
+        if hook:
+            try:
+                run_segment_hook(hook, event)
+            except OSError as e:
+                context.status_callback(f"Cảnh báo: Không chạy được segment hook ({e}).")
+
+    return on_segment
+
+def parse_output_profiles(params) -> list[dict]:
+    profiles = []
+    for index, profile in enumerate(params.get('outputs') or []):
+        try:
+            path = profile['path']
+            bitrate_val = int(profile.get('bitrate') or params['bitrate'])
+            width = int(profile.get('width') or -2)
+            height = int(profile.get('height') or -2)
+        except (ValueError, KeyError, TypeError):
+            raise ValueError(f"Cấu hình đầu ra thứ {index + 1} không hợp lệ.")
+        if not path or bitrate_val <= 0:
+            raise ValueError(f"Cấu hình đầu ra thứ {index + 1} cần đường dẫn và bitrate dương.")
+        profiles.append({'path': path, 'codec': profile.get('codec') or params['codec'], 'bitrate': bitrate_val,
+                         'width': width, 'height': height})
+    return profiles
+
+def build_rendition_filter(filter_complex_string: str, profiles) -> tuple[str, list[str]]:
+    # Giải mã, chèn logo và vẽ phụ đề một lần rồi tách cho từng bản đầu ra
+    split_labels = "".join(f"[split{i}]" for i in range(len(profiles)))
+    parts = [f"{filter_complex_string}[burned]", f"[burned]split={len(profiles)}{split_labels}"]
+    output_labels = []
+    for i, profile in enumerate(profiles):
+        if profile['width'] == -2 and profile['height'] == -2:
+            output_labels.append(f"[split{i}]")
+        else:
+            parts.append(f"[split{i}]scale={profile['width']}:{profile['height']}[out{i}]")
+            output_labels.append(f"[out{i}]")
+    return ";".join(parts), output_labels
+
+def _run_multi_output(context: JobContext, profiles) -> ProgressReporter | None:
+    params = context.params
+    logo_width, margin_top, margin_right, _ = context.options
+    context.status_callback(f"2/4: Đang xây dựng lệnh FFmpeg cho {len(profiles)} bản đầu ra...")
+    filter_complex_string, output_labels = build_rendition_filter(
+        build_filter_complex(params['subtitle_path'], logo_width, margin_top, margin_right,
+                             logo_window=parse_logo_window(params, context.media_info.duration),
+                             fonts_dir=context.fonts_dir), profiles)
+    command = [context.ffmpeg_executable, '-y', '-i', params['video_path'], '-i', params['logo_path'],
+               '-filter_complex', filter_complex_string]
+    for profile, label in zip(profiles, output_labels):
+        command += ['-map', label, '-map', '0:a?', *build_encoder_args(profile['codec'], profile['bitrate'], get_thread_limit(params)),
+                    profile['path']]
+
+    context.status_callback("3/4: Bắt đầu xử lý...")
+    reporter = context.make_reporter(context.media_info.duration)
+    try:
+        with context.metrics.stage("encode"):
+            if not run_ffmpeg(command, context.pause_event, context.cancel_requested_getter,
+                              lambda sample: reporter.update(0, sample), context.on_log, context.limits):
+                return None
+    except (FFmpegError, FFmpegStalledError) as e:
+        for profile in profiles:
+            context.status_callback(f"Lỗi: {profile['path']} ({profile['codec']}, {profile['bitrate']}k) thất bại.")
+        raise e
+
+    failed = []
+    for profile in profiles:
+        if os.path.exists(profile['path']) and os.path.getsize(profile['path']) > 0:
+            context.status_callback(f"Đầu ra {profile['path']} ({profile['codec']}, {profile['bitrate']}k): OK.")
+        else:
+            failed.append(profile['path'])
+            context.status_callback(f"Lỗi: Đầu ra {profile['path']} không được tạo.")
+    if failed:
+        raise RuntimeError(f"{len(failed)}/{len(profiles)} bản đầu ra thất bại.")
+    return reporter
+
+def get_render_mode(params, profiles) -> str:
+    if profiles:
+        return "multi_output"
+    if params.get('smart_render'):
+        return "smart_render"
+    if (params.get('resumable') or params.get('incremental')
+            or int(params.get('parallel_segments') or 0) > 1):
+        return "segmented"
+    return "single_pass"
+
+def get_render_cache_key(context: JobContext, profiles) -> str:
+    # Đường dẫn được thay bằng tên cố định trong filter graph vì nội dung file đã nằm trong khóa qua mã băm;
+    # số luồng encoder không làm đổi kết quả nên không đưa vào khóa
+    params = context.params
+    logo_width, margin_top, margin_right, bitrate_val = context.options
+    filter_complex_string = build_filter_complex("subtitle.ass", logo_width, margin_top, margin_right,
+                                                 logo_window=parse_logo_window(params, context.media_info.duration),
+                                                 fonts_dir="fonts" if context.fonts_dir else None)
+    encoders = [[*build_encoder_args(profile['codec'], profile['bitrate']), profile['width'], profile['height'],
+                 os.path.splitext(profile['path'])[1].lower()] for profile in profiles]
+    encoders = encoders or [[*build_encoder_args(params['codec'], bitrate_val),
+                             os.path.splitext(params['output_path'])[1].lower()]]
+    return compute_render_hash(
+        render_cache.RENDER_CACHE_VERSION, hash_file_sampled(params['video_path']),
+        hash_file_sampled(params['logo_path']), hash_file_sampled(params['subtitle_path']),
+        os.path.basename(context.fonts_dir) if context.fonts_dir else None, filter_complex_string, encoders,
+        get_render_mode(params, profiles))
+
+def _store_render(params, cache_key, output_paths, status_callback):
+    try:
+        max_bytes = int(float(params.get('render_cache_max_gb') or 0) * 1024 ** 3) or None
+        render_cache.store(get_render_cache_dir(params), cache_key, output_paths,
+                           max_bytes or render_cache.DEFAULT_RENDER_CACHE_MAX_BYTES)
+    except (OSError, ValueError) as e:
+        status_callback(f"Cảnh báo: Không thể lưu kết quả vào cache: {e}")
+
+def _open_ffmpeg_log(params):
+    log_path = params.get('ffmpeg_log_path')
+    if not log_path:
+        return None, None
+    log_file = open(log_path, 'a', encoding='utf-8')
+    log_lock = threading.Lock()
+
+    def write_log(line):
+        with log_lock:
+            log_file.write(line + "\n")
+
+    return write_log, log_file
+
 def run_processing_logic(params, status_callback, pause_event, cancel_requested_getter):
-    process = None
     output_path = params.get('output_path', '')
+    log_file = None
+    media_duration = 0.0
+    summary = None
+    error = ""
+    metrics = None
+    job_status_callback = status_callback
+
+    def status_callback(message):
+        if isinstance(message, ProgressEvent) and metrics is not None:
+            metrics.record_progress(message)
+        job_status_callback(message)
+
     try:
-        try:
-            logo_width = int(params['logo_width'])
-            margin_top = int(params['margin_top'])
-            margin_right = int(params['margin_right'])
-            bitrate_val = int(params['bitrate'])
-            if not all(x > 0 for x in [logo_width, bitrate_val]): raise ValueError("Logo Width và Bitrate phải là số dương.")
-            if not all(x >= 0 for x in [margin_top, margin_right]): raise ValueError("Margin Top và Margin Right không được là số âm.")
-        except (ValueError, KeyError):
-            raise ValueError("Các giá trị tùy chọn phải là số nguyên hợp lệ.")
+        # Trong try: metrics_dir không ghi được cũng phải báo "Lỗi:" qua status_callback như mọi lỗi khác
+        metrics = JobMetrics(params.get('job_id'), params.get('metrics_dir'), params.get('metrics_textfile'))
+        params = normalize_params(params)
+        options = parse_options(params)
+        profiles = parse_output_profiles(params)
+        chunked = params.get('resumable') or params.get('incremental')
+        if profiles and (params.get('smart_render') or chunked or int(params.get('parallel_segments') or 0) > 1):
+            raise ValueError("Chế độ nhiều bản đầu ra không dùng chung được với smart render hoặc xử lý theo đoạn.")
+        if params.get('smart_render') and chunked:
+            raise ValueError("Chế độ smart render không dùng chung được với chế độ có thể tiếp tục.")
+        stream_format, _ = parse_stream_options(params)
+        if stream_format and get_render_mode(params, profiles) != "single_pass":
+            raise ValueError("Đầu ra dạng luồng chỉ dùng được với chế độ mã hóa một lượt.")
+        output_paths = [profile['path'] for profile in profiles] or [output_path]
 
         ffmpeg_executable = get_ffmpeg_path()
         if not os.path.exists(ffmpeg_executable):
             raise FileNotFoundError(f"Không tìm thấy {ffmpeg_executable}.")
 
-        video_path = params['video_path']
-        logo_path = params['logo_path']
-        subtitle_path = params['subtitle_path']
-        codec = params['codec']
-
+        limits = build_supervisor_limits(params, status_callback, metrics)
+        with metrics.stage("subtitle"):
+            params = run_speaker_preprocess(params, status_callback)
         status_callback("1/4: Đang lấy thông tin video...")
-        total_duration_seconds, total_duration_str = get_video_duration(video_path, ffmpeg_executable)
-        if total_duration_seconds <= 0:
-            raise ValueError("Không thể xác định thời lượng video.")
-        status_callback(f"TIME_INFO|00:00:00|{total_duration_str}")
-
-        status_callback("2/4: Đang xây dựng lệnh FFmpeg...")
-        time.sleep(0.1)
-
-        escaped_subtitle_path = escape_path_for_ffmpeg_filter(subtitle_path)
-        filter_complex_string = (f"[1:v]scale={logo_width}:-1[logo];[0:v][logo]overlay=W-w-{margin_right}:{margin_top}[video_with_logo];[video_with_logo]subtitles='{escaped_subtitle_path}'")
-        command = [ffmpeg_executable, '-y', '-i', video_path, '-i', logo_path, '-filter_complex', filter_complex_string, '-c:v', codec, '-b:v', f'{bitrate_val}k', '-maxrate', f'{bitrate_val}k', '-bufsize', f'{bitrate_val * 2}k', output_path]
-
-        status_callback("3/4: Bắt đầu xử lý...")
-
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-            universal_newlines=True, encoding='utf-8', errors='ignore',
-            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-        )
-        for line in process.stdout:
-            pause_event.wait()
-            if cancel_requested_getter():
-                status_callback("Đang hủy bỏ...")
-                process.terminate()
-                process.wait(timeout=5)
-                try:
-                    if os.path.exists(output_path):
-                        os.remove(output_path)
-                        status_callback("Đã hủy bỏ và xóa file output.")
-                    else:
-                        status_callback("Đã hủy bỏ bởi người dùng.")
-                except OSError as e:
-                    status_callback(f"Đã hủy, nhưng không thể xóa file: {e}")
-                return
-            time_match = re.search(r"time=(\d{2}):(\d{2}):(\d{2})\.(\d{2})", line)
-            if time_match:
-                hours, minutes, seconds, hundredths = map(int, time_match.groups())
-                current_time_seconds = float(hours * 3600 + minutes * 60 + seconds + hundredths / 100)
-                percentage = int((current_time_seconds / total_duration_seconds) * 100)
-                current_time_str = format_time(current_time_seconds)
-                status_callback(f"PROGRESS|{percentage}")
-                status_callback(f"TIME_INFO|{current_time_str}|{total_duration_str}")
-        process.wait()
-        if process.returncode == 0:
-            # --- THAY ĐỔI: Bỏ icon ---
-            status_callback(f"4/4: Hoàn thành! Video đã được lưu tại {output_path}")
-        elif not cancel_requested_getter():
-            raise RuntimeError(f"FFmpeg thoát với mã lỗi {process.returncode}.")
+        with metrics.stage("probe"):
+            media_info = probe_media(params['video_path'], ffmpeg_executable, deadline=limits.deadline)
+        media_duration = media_info.duration
+        with metrics.stage("fonts"):
+            fonts_dir = run_font_preflight(params, status_callback)
+        on_log, log_file = _open_ffmpeg_log(params)
+        context = JobContext(params, options, ffmpeg_executable, media_info, status_callback, pause_event,
+                             cancel_requested_getter,
+                             progress_interval=float(params.get('progress_interval') or DEFAULT_PROGRESS_INTERVAL),
+                             on_log=on_log, limits=limits,
+                             fonts_dir=fonts_dir, metrics=metrics)
+        context.make_reporter(media_info.duration).start()
+
+        cache_key = None
+        if params.get('render_cache') and not stream_format:
+            # Đầu ra dạng luồng gồm nhiều file do ffmpeg tự đặt tên nên không đưa vào cache
+            with metrics.stage("cache"):
+                cache_key = get_render_cache_key(context, profiles)
+                method = render_cache.lookup(get_render_cache_dir(params), cache_key, output_paths)
+            if method:
+                status_callback(f"2/4: Đã có bản dựng giống hệt trong cache, bỏ qua bước mã hóa "
+                                f"({'liên kết' if method == 'link' else 'sao chép'} file).")
+                summary = ProgressEvent(out_time=media_info.duration, total_duration=media_info.duration, eta=0.0)
+                status_callback(summary)
+                status_callback(f"4/4: Hoàn thành! Video đã được lưu tại {', '.join(output_paths)}")
+                return True
+        for path in output_paths:
+            render_cache.detach_output(path)
+
+        smart_render_issue = get_smart_render_issue(params['codec'], media_info) if params.get('smart_render') else None
+        if smart_render_issue:
+            status_callback(f"Cảnh báo: Bỏ qua smart render vì {smart_render_issue}; chuyển sang mã hóa toàn bộ video.")
+
+        if profiles:
+            reporter = _run_multi_output(context, profiles)
+        elif chunked:
+            # parts_dir: worker phân tán ghi đầu ra vào thư mục tạm nhưng nhật ký phải nằm cạnh file đích
+            reporter = _run_piecewise(context, _run_resumable, params.get('parts_dir') or get_parts_dir(output_path),
+                                      keep_work_dir=bool(params.get('incremental')))
+        elif params.get('smart_render') and not smart_render_issue:
+            status_callback("2/4: Đang phân tích phụ đề để xác định các đoạn cần mã hóa lại...")
+            reporter = _run_piecewise(context, _run_smart_render, in_band_headers=True)
+        elif int(params.get('parallel_segments') or 0) > 1:
+            status_callback("2/4: Đang chuẩn bị chế độ xử lý song song theo đoạn...")
+            reporter = _run_piecewise(context, _run_segmented)
+        else:
+            reporter = _run_single_pass(context)
+
+        if reporter is None:
+            status_callback("Đang hủy bỏ...")
+            for path in output_paths:
+                _report_cancelled(path, status_callback)
+            if stream_format:
+                remove_stream_files(stream_format, output_path)
+            return False
+        if cache_key:
+            with metrics.stage("cache"):
+                _store_render(params, cache_key, output_paths, status_callback)
+        summary = reporter.summary()
+        status_callback(summary)
+        status_callback(f"Tốc độ xử lý trung bình: {summary.fps:.1f} fps, {summary.speed:.2f}x thời gian thực.")
+        # --- THAY ĐỔI: Bỏ icon ---
+        status_callback(f"4/4: Hoàn thành! Video đã được lưu tại {', '.join(output_paths)}")
+        return True
     except Exception as e:
         # --- THAY ĐỔI: Bỏ icon ---
-        status_callback(f"Lỗi: {e}")
+        error = f"Lỗi: {e}"
+        status_callback(error)
+        return False
     finally:
-        if process and process.poll() is None:
-            process.terminate()
+        if log_file:
+            log_file.close()
+        if summary is not None:
+            job_status = "done"
+        elif cancel_requested_getter():
+            job_status = "cancelled"
+        else:
+            job_status = "failed"
+        if metrics is not None:
+            metrics.finish(job_status, media_duration, summary, error)
 
 def get_ffmpeg_path() -> str:
+    if os.getenv(FFMPEG_PATH_ENV):
+        return os.getenv(FFMPEG_PATH_ENV)
     if getattr(sys, 'frozen', False):
         application_path = sys._MEIPASS
     else:
@@ -0,0 +1,128 @@
+# progress.py
+import threading
+import time
+from dataclasses import dataclass
+
+DEFAULT_PROGRESS_INTERVAL = 0.5
+
+
+@dataclass
+class ProgressSample:
+    out_time: float = 0.0
+    frame: int = 0
+    fps: float = 0.0
+    speed: float = 0.0
+    bitrate_kbps: float = 0.0
+    finished: bool = False
+
+
+@dataclass
+class ProgressEvent:
+    out_time: float
+    total_duration: float
+    frame: int = 0
+    fps: float = 0.0
+    speed: float = 0.0
+    bitrate_kbps: float = 0.0
+    eta: float | None = None
+
+    @property
+    def percentage(self) -> int:
+        if self.total_duration <= 0:
+            return 0
+        return max(0, min(100, int(self.out_time / self.total_duration * 100)))
+
+
+@dataclass
+class SegmentEvent:
+    # Một phần của đầu ra dạng luồng đã ghi xong; với fMP4 là khoảng byte [offset, offset + size) trong path
+    path: str
+    index: int
+    kind: str = "segment"
+    offset: int = 0
+    size: int = 0
+    duration: float = 0.0
+
+    def describe(self) -> str:
+        name = "Phần khởi tạo" if self.kind == "init" else f"Đoạn {self.index}"
+        location = f"{self.path} @{self.offset}" if self.offset else self.path
+        return f"{name} đã sẵn sàng: {location} ({self.size} byte)"
+
+
+def _to_float(value: str, suffix: str = "") -> float:
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def parse_progress_block(fields: dict) -> ProgressSample:
+    # out_time_us có từ ffmpeg 4.x; out_time_ms ở bản cũ thực chất cũng là micro giây
+    out_time_us = fields.get('out_time_us') or fields.get('out_time_ms') or "0"
+    try:
+        out_time = max(0, int(out_time_us)) / 1_000_000
+    except ValueError:
+        out_time = 0.0
+    try:
+        frame = int(fields.get('frame', "0"))
+    except ValueError:
+        frame = 0
+    return ProgressSample(out_time=out_time, frame=frame, fps=_to_float(fields.get('fps', "0")),
+                          speed=_to_float(fields.get('speed', "0"), "x"),
+                          bitrate_kbps=_to_float(fields.get('bitrate', "0"), "kbits/s"),
+                          finished=fields.get('progress') == "end")
+
+
+class ProgressReporter:
+    def __init__(self, total_duration: float, status_callback, interval: float = DEFAULT_PROGRESS_INTERVAL):
+        self.total_duration = total_duration
+        self.status_callback = status_callback
+        self.interval = max(0.0, interval)
+        self.started_at = time.monotonic()
+        self._samples = {}
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, source, sample: ProgressSample):
+        with self._lock:
+            previous = self._samples.get(source)
+            if previous is not None and sample.out_time < previous.out_time:
+                # ffmpeg có thể báo out_time=N/A giữa chừng khi có nhiều đầu ra
+                sample.out_time = previous.out_time
+            self._samples[source] = sample
+            now = time.monotonic()
+            if now - self._last_emit < self.interval and not sample.finished:
+                return
+            self._last_emit = now
+            event = self._combine()
+        self.status_callback(event)
+
+    def start(self):
+        self.status_callback(ProgressEvent(out_time=0.0, total_duration=self.total_duration))
+
+    def summary(self) -> ProgressEvent:
+        with self._lock:
+            event = self._combine()
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        event.fps = event.frame / elapsed
+        event.speed = event.out_time / elapsed
+        event.eta = 0.0
+        return event
+
+    def _combine(self) -> ProgressEvent:
+        samples = list(self._samples.values())
+        active = [sample for sample in samples if not sample.finished] or samples
+        out_time = min(sum(sample.out_time for sample in samples), self.total_duration)
+        speed = sum(sample.speed for sample in active)
+        if speed <= 0 and out_time > 0:
+            speed = out_time / max(time.monotonic() - self.started_at, 1e-6)
+        weighted_bitrate = sum(sample.bitrate_kbps * sample.out_time for sample in samples)
+        eta = (self.total_duration - out_time) / speed if speed > 0 else None
+        return ProgressEvent(out_time=out_time, total_duration=self.total_duration,
+                             frame=sum(sample.frame for sample in samples),
+                             fps=sum(sample.fps for sample in active), speed=speed,
+                             bitrate_kbps=weighted_bitrate / out_time if out_time > 0 else 0.0,
+                             eta=eta)
@@ -0,0 +1,179 @@
+# render_cache.py
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+
+from app_paths import atomic_write, get_cache_dir
+
+RENDER_CACHE_VERSION = 1
+META_FILE_NAME = "meta.json"
+SAMPLE_SIZE = 1024 * 1024
+SAMPLE_COUNT = 8
+DEFAULT_RENDER_CACHE_MAX_BYTES = 20 * 1024 ** 3
+
+_sampled_hashes = {}
+_sampled_hashes_lock = threading.Lock()
+_store_lock = threading.Lock()
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    path: str
+    files: list
+    size: int
+    created_at: float
+    last_used: float
+    outputs: list
+    intact: bool = True
+
+
+def hash_file_sampled(path: str, sample_size: int = SAMPLE_SIZE, sample_count: int = SAMPLE_COUNT) -> str:
+    """Băm nhanh file lớn: kích thước cộng các đoạn mẫu rải đều, file nhỏ thì băm toàn bộ."""
+    stat = os.stat(path)
+    identity = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _sampled_hashes_lock:
+        if identity in _sampled_hashes:
+            return _sampled_hashes[identity]
+    digest = hashlib.sha1(str(stat.st_size).encode('ascii'))
+    with open(path, 'rb') as f:
+        if stat.st_size <= sample_size * sample_count:
+            for block in iter(lambda: f.read(sample_size), b""):
+                digest.update(block)
+        else:
+            step = (stat.st_size - sample_size) // (sample_count - 1)
+            for index in range(sample_count):
+                f.seek(index * step)
+                digest.update(f.read(sample_size))
+    result = digest.hexdigest()
+    with _sampled_hashes_lock:
+        _sampled_hashes[identity] = result
+    return result
+
+
+def _read_meta(entry_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(entry_dir, META_FILE_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return meta if meta.get('version') == RENDER_CACHE_VERSION else None
+
+
+def _write_meta(entry_dir: str, meta: dict):
+    meta_path = os.path.join(entry_dir, META_FILE_NAME)
+    with atomic_write(meta_path) as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+
+
+def _link_or_copy(source: str, target: str) -> str:
+    try:
+        os.link(source, target)
+        return "link"
+    except OSError:
+        shutil.copy2(source, target)
+        return "copy"
+
+
+def _is_intact(entry_dir: str, meta: dict) -> bool:
+    # File trong cache có thể dùng chung inode với file đầu ra; nếu file đó bị ghi đè thì entry không còn hợp lệ
+    for record in meta['files']:
+        try:
+            stat = os.stat(os.path.join(entry_dir, record['name']))
+        except OSError:
+            return False
+        if stat.st_size != record['size'] or stat.st_mtime_ns != record['mtime_ns']:
+            return False
+    return True
+
+
+def lookup(cache_dir: str, key: str, output_paths) -> str | None:
+    """Đặt các file đầu ra từ cache nếu có; trả về cách đặt ("link"/"copy") hoặc None khi không có."""
+    entry_dir = os.path.join(cache_dir, key)
+    meta = _read_meta(entry_dir)
+    if meta is None or len(meta['files']) != len(output_paths):
+        return None
+    if not _is_intact(entry_dir, meta):
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+    method = "link"
+    for record, output_path in zip(meta['files'], output_paths):
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if _link_or_copy(os.path.join(entry_dir, record['name']), output_path) == "copy":
+            method = "copy"
+    meta['last_used'] = time.time()
+    _write_meta(entry_dir, meta)
+    return method
+
+
+def detach_output(output_path: str):
+    # File đầu ra lấy từ cache là hard link; ffmpeg -y ghi đè tại chỗ sẽ làm hỏng bản trong cache nên phải tách ra trước
+    try:
+        if os.stat(output_path).st_nlink > 1:
+            os.remove(output_path)
+    except FileNotFoundError:
+        pass
+
+
+def store(cache_dir: str, key: str, output_paths, max_bytes: int = DEFAULT_RENDER_CACHE_MAX_BYTES):
+    entry_dir = os.path.join(cache_dir, key)
+    temp_dir = os.path.join(cache_dir, f".{key}.{os.getpid()}.{threading.get_ident()}")
+    os.makedirs(temp_dir, exist_ok=True)
+    try:
+        files = []
+        for index, output_path in enumerate(output_paths):
+            name = f"{index}{os.path.splitext(output_path)[1]}"
+            _link_or_copy(output_path, os.path.join(temp_dir, name))
+            stat = os.stat(os.path.join(temp_dir, name))
+            files.append({'name': name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+        now = time.time()
+        _write_meta(temp_dir, {'version': RENDER_CACHE_VERSION, 'created_at': now, 'last_used': now,
+                               'files': files, 'outputs': [os.path.abspath(path) for path in output_paths]})
+        with _store_lock:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temp_dir, entry_dir)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    prune(cache_dir, max_bytes=max_bytes)
+
+
+def list_entries(cache_dir: str) -> list[CacheEntry]:
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        if name.startswith(".") or not os.path.isdir(entry_dir):
+            continue
+        meta = _read_meta(entry_dir)
+        if meta is None:
+            continue
+        entries.append(CacheEntry(key=name, path=entry_dir, files=[record['name'] for record in meta['files']],
+                                  size=sum(record['size'] for record in meta['files']),
+                                  created_at=meta['created_at'], last_used=meta['last_used'],
+                                  outputs=meta.get('outputs', []), intact=_is_intact(entry_dir, meta)))
+    return sorted(entries, key=lambda entry: entry.last_used, reverse=True)
+
+
+def prune(cache_dir: str, max_bytes: int | None = None, older_than: float | None = None) -> list[CacheEntry]:
+    """Xóa entry hỏng hoặc không dùng lâu hơn older_than giây, rồi xóa entry ít dùng nhất cho tới khi tổng dung lượng <= max_bytes."""
+    removed = []
+    total = 0
+    now = time.time()
+    for entry in list_entries(cache_dir):
+        expired = older_than is not None and now - entry.last_used > older_than
+        if expired or not entry.intact or (max_bytes is not None and total + entry.size > max_bytes):
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed.append(entry)
+        else:
+            total += entry.size
+    return removed
+
+
+def get_render_cache_dir(params) -> str:
+    return params.get('render_cache_dir') or get_cache_dir("renders")
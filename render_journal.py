@@ -0,0 +1,80 @@
+# render_journal.py
+import hashlib
+import json
+import os
+
+from app_paths import atomic_write
+from ass_events import get_render_header_lines, overlaps_any, parse_events
+
+JOURNAL_VERSION = 2
+JOURNAL_FILE_NAME = "journal.json"
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_file_identity(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def compute_render_hash(*parts) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_parts_dir(output_path: str) -> str:
+    output_path = os.path.abspath(output_path)
+    return os.path.join(os.path.dirname(output_path), f".{os.path.basename(output_path)}.parts")
+
+
+def load_journal(parts_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(parts_dir, JOURNAL_FILE_NAME), 'r', encoding='utf-8') as f:
+            journal = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return journal if journal.get('version') == JOURNAL_VERSION else None
+
+
+def save_journal(parts_dir: str, journal: dict):
+    journal['version'] = JOURNAL_VERSION
+    with atomic_write(os.path.join(parts_dir, JOURNAL_FILE_NAME), fsync=True) as f:
+        json.dump(journal, f, indent=2, ensure_ascii=False)
+
+
+def get_chunk_signatures(lines, chunks) -> tuple[list[str], list[str]]:
+    # Chữ ký của một đoạn gồm phần header ảnh hưởng tới việc vẽ và nguyên văn các dòng Dialogue chạm vào đoạn đó,
+    # nên sửa một dòng chỉ làm đổi chữ ký của (các) đoạn chứa dòng đó
+    header = get_render_header_lines(lines)
+    events = parse_events(lines)
+    signatures = [compute_render_hash(header, [event.raw for event in events
+                                               if overlaps_any([(chunk['start'], chunk['end'])], event.start,
+                                                               event.end, tolerance=0.0)])
+                  for chunk in chunks]
+    return signatures, [compute_render_hash(event.raw) for event in events]
+
+
+def apply_chunk_signatures(journal: dict, signatures, event_hashes) -> tuple[list[dict], int, int]:
+    """Đánh dấu chưa xong các đoạn đã mã hóa nhưng có chữ ký khác, rồi lưu chữ ký mới vào journal.
+
+    Trả về (các đoạn cần mã hóa lại, số dòng thêm, số dòng bớt so với lần trước).
+    """
+    chunks = journal['chunks']
+    changed = [chunk for chunk, signature in zip(chunks, signatures)
+               if chunk['done'] and chunk.get('signature') != signature]
+    previous_events, current_events = set(journal.get('events', [])), set(event_hashes)
+    for chunk in changed:
+        chunk['done'] = False
+    for chunk, signature in zip(chunks, signatures):
+        chunk['signature'] = signature
+    journal['events'] = list(event_hashes)
+    return changed, len(current_events - previous_events), len(previous_events - current_events)
@@ -0,0 +1,121 @@
+# status_events.py
+import datetime
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+from progress import ProgressEvent, SegmentEvent
+
+DEFAULT_LOG_BUFFER_LINES = 2000
+DEFAULT_PENDING_LOG_LINES = 5000
+LEVEL_INFO = "INFO"
+LEVEL_SUCCESS = "SUCCESS"
+LEVEL_WARNING = "WARNING"
+LEVEL_ERROR = "ERROR"
+
+
+@dataclass
+class LogEvent:
+    message: str
+    level: str = LEVEL_INFO
+    timestamp: datetime.datetime = field(default_factory=datetime.datetime.now)
+
+    def format(self) -> str:
+        return f"[{self.timestamp.strftime('%H:%M:%S')}] [{self.level}] {self.message}"
+
+
+def classify_message(message: str) -> str:
+    if "Hoàn thành!" in message:
+        return LEVEL_SUCCESS
+    if "Lỗi:" in message:
+        return LEVEL_ERROR
+    if "Cảnh báo:" in message or "Đã hủy bỏ" in message:
+        return LEVEL_WARNING
+    return LEVEL_INFO
+
+
+def to_event(message):
+    if isinstance(message, (ProgressEvent, LogEvent)):
+        return message
+    if isinstance(message, SegmentEvent):
+        return LogEvent(message.describe())
+    return LogEvent(str(message), classify_message(str(message)))
+
+
+class StatusPipeline:
+    """Gom sự kiện từ các luồng xử lý để giao diện lấy ra theo từng nhịp.
+
+    Tiến trình chỉ giữ giá trị mới nhất cho mỗi nguồn; log được xếp hàng có giới hạn,
+    số dòng bị bỏ khi hàng đợi đầy được báo lại ở lần lấy kế tiếp.
+    """
+
+    def __init__(self, max_pending_logs: int = DEFAULT_PENDING_LOG_LINES):
+        self._progress = {}
+        self._logs = deque(maxlen=max_pending_logs)
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def put(self, message, source=None):
+        event = to_event(message)
+        with self._lock:
+            if isinstance(event, ProgressEvent):
+                self._progress[source] = event
+                return
+            if len(self._logs) == self._logs.maxlen:
+                self._dropped += 1
+            self._logs.append(event)
+
+    def drain(self) -> tuple[dict, list[LogEvent]]:
+        with self._lock:
+            progress, self._progress = self._progress, {}
+            logs = list(self._logs)
+            self._logs.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            logs.insert(0, LogEvent(f"Cảnh báo: Đã bỏ qua {dropped} dòng log do cập nhật quá nhanh.", LEVEL_WARNING))
+        return progress, logs
+
+
+class LogBuffer:
+    """Bộ đệm vòng cho khung log; các dòng bị đẩy ra được ghi tiếp vào spill_path nếu có."""
+
+    def __init__(self, max_lines: int = DEFAULT_LOG_BUFFER_LINES, spill_path: str | None = None):
+        self.max_lines = max_lines
+        self.lines = deque(maxlen=max_lines)
+        self.spill_path = spill_path
+        self._spill_file = None
+
+    def get_visible(self, events) -> list:
+        # Lô lớn hơn bộ đệm chỉ hiển thị phần cuối, giống nội dung bộ đệm sau khi extend
+        events = list(events)
+        return events[max(0, len(events) - self.max_lines):]
+
+    def extend(self, events) -> int:
+        # Trả về số dòng đang hiển thị bị đẩy ra để giao diện xóa tương ứng; phần đầu của lô lớn hơn bộ đệm
+        # không bao giờ được hiển thị nên đi thẳng vào spill sau các dòng cũ
+        events = list(events)
+        visible = self.get_visible(events)
+        dropped = events[:len(events) - len(visible)]
+        evicted = [self.lines.popleft() for _ in range(max(0, len(self.lines) + len(visible) - self.max_lines))]
+        self.lines.extend(visible)
+        if (evicted or dropped) and self.spill_path:
+            self._spill(evicted + dropped)
+        return len(evicted)
+
+    def _spill(self, events):
+        try:
+            if self._spill_file is None:
+                self._spill_file = open(self.spill_path, 'w', encoding='utf-8')
+            self._spill_file.write("".join(f"{event.format()}\n" for event in events))
+            self._spill_file.flush()
+        except OSError as e:
+            print(f"Lỗi khi ghi log ra file: {e}")
+            self.spill_path = None
+
+    def clear(self):
+        self.lines.clear()
+
+    def close(self):
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
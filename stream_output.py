@@ -0,0 +1,214 @@
+# stream_output.py
+import glob
+import os
+import re
+import struct
+import subprocess
+import threading
+
+from ffmpeg_tools import get_creation_flags
+from progress import SegmentEvent
+
+STREAM_FORMATS = ("fmp4", "hls", "dash")
+DEFAULT_SEGMENT_SECONDS = 4.0
+STREAM_POLL_INTERVAL = 0.5
+FRAGMENTED_MOVFLAGS = "+frag_keyframe+empty_moov+default_base_moof"
+DASH_SEGMENT_PATTERN = re.compile(r"-stream(\d+)-(\d+)\.m4s$")
+
+
+def parse_stream_options(params) -> tuple[str | None, float]:
+    stream_format = (params.get('stream_format') or "").lower() or None
+    if stream_format and stream_format not in STREAM_FORMATS:
+        raise ValueError(f"Định dạng luồng không hợp lệ: {stream_format} (hỗ trợ {', '.join(STREAM_FORMATS)}).")
+    try:
+        segment_seconds = float(params.get('segment_seconds') or DEFAULT_SEGMENT_SECONDS)
+    except (TypeError, ValueError):
+        raise ValueError("Độ dài đoạn (segment_seconds) phải là số.")
+    if segment_seconds <= 0:
+        raise ValueError("Độ dài đoạn (segment_seconds) phải lớn hơn 0.")
+    return stream_format, segment_seconds
+
+
+def _get_stem(output_path: str) -> str:
+    return os.path.splitext(output_path)[0]
+
+
+def build_stream_output_args(stream_format: str, output_path: str, segment_seconds: float) -> list[str]:
+    # Ép keyframe đúng nhịp để mỗi đoạn/fragment bắt đầu bằng keyframe và có độ dài đều nhau
+    args = ['-force_key_frames', f"expr:gte(t,n_forced*{segment_seconds:g})"]
+    stem = _get_stem(output_path)
+    if stream_format == "fmp4":
+        args += ['-movflags', FRAGMENTED_MOVFLAGS, '-f', 'mp4']
+    elif stream_format == "hls":
+        # temp_file: ffmpeg ghi đoạn ra file tạm rồi mới đổi tên và thêm vào playlist
+        args += ['-f', 'hls', '-hls_time', f"{segment_seconds:g}", '-hls_playlist_type', 'event',
+                 '-hls_segment_type', 'fmp4', '-hls_flags', 'independent_segments+temp_file',
+                 '-hls_fmp4_init_filename', f"{os.path.basename(stem)}_init.mp4",
+                 '-hls_segment_filename', f"{stem}_%05d.m4s"]
+    else:
+        args += ['-f', 'dash', '-seg_duration', f"{segment_seconds:g}", '-use_template', '1', '-use_timeline', '1',
+                 '-init_seg_name', f"{os.path.basename(stem)}-init-stream$RepresentationID$.m4s",
+                 '-media_seg_name', f"{os.path.basename(stem)}-stream$RepresentationID$-$Number%05d$.m4s"]
+    return args + [output_path]
+
+
+def get_stream_files(stream_format: str, output_path: str) -> list[str]:
+    stem = glob.escape(_get_stem(output_path))
+    if stream_format == "hls":
+        return [output_path, *glob.glob(f"{stem}_init.mp4"), *glob.glob(f"{stem}_[0-9]*.m4s")]
+    if stream_format == "dash":
+        return [output_path, *glob.glob(f"{stem}-init-stream*.m4s"), *glob.glob(f"{stem}-stream*-*.m4s")]
+    return [output_path]
+
+
+def remove_stream_files(stream_format: str, output_path: str):
+    # Đoạn cũ của lần chạy trước sẽ bị báo nhầm là đoạn mới nếu còn nằm lại
+    for path in get_stream_files(stream_format, output_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _read_box_header(f, offset: int, file_size: int) -> tuple[bytes, int] | None:
+    if offset + 8 > file_size:
+        return None
+    f.seek(offset)
+    size, box_type = struct.unpack(">I4s", f.read(8))
+    if size == 1:
+        if offset + 16 > file_size:
+            return None
+        size = struct.unpack(">Q", f.read(8))[0]
+    elif size == 0:
+        return None
+    return box_type, size
+
+
+class SegmentWatcher:
+    """Theo dõi đầu ra đang được ghi và báo từng phần đã hoàn tất qua on_segment(SegmentEvent).
+
+    fMP4: đọc header các box cấp cao nhất, báo ftyp+moov rồi từng cặp moof+mdat khi đã ghi đủ byte.
+    HLS: đọc playlist, ffmpeg chỉ thêm đoạn vào playlist khi đoạn đã ghi xong.
+    DASH: đoạn thứ N của một luồng hoàn tất khi đoạn N+1 xuất hiện; phần còn lại được báo khi kết thúc.
+    """
+
+    def __init__(self, stream_format: str, output_path: str, on_segment,
+                 interval: float = STREAM_POLL_INTERVAL):
+        self.stream_format = stream_format
+        self.output_path = output_path
+        self.on_segment = on_segment
+        self.interval = interval
+        self.count = 0
+        self.segments = 0
+        self._offset = 0
+        self._fragment_start = None
+        self._announced = set()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, finished: bool):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        if finished:
+            try:
+                self.poll(final=True)
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except OSError:
+                pass
+
+    def _emit(self, event: SegmentEvent):
+        self.count += 1
+        if event.kind == "segment":
+            self.segments += 1
+            event.index = self.segments
+        self.on_segment(event)
+
+    def poll(self, final: bool = False):
+        if self.stream_format == "fmp4":
+            self._poll_fragments()
+        elif self.stream_format == "hls":
+            self._poll_playlist()
+        else:
+            self._poll_dash(final)
+
+    def _poll_fragments(self):
+        if not os.path.exists(self.output_path):
+            return
+        file_size = os.path.getsize(self.output_path)
+        with open(self.output_path, 'rb') as f:
+            while True:
+                header = _read_box_header(f, self._offset, file_size)
+                if header is None or self._offset + header[1] > file_size:
+                    return
+                box_type, size = header
+                end = self._offset + size
+                if box_type == b"moov":
+                    self._emit(SegmentEvent(self.output_path, 0, "init", 0, end))
+                elif box_type == b"moof":
+                    self._fragment_start = self._offset
+                elif box_type == b"mdat" and self._fragment_start is not None:
+                    self._emit(SegmentEvent(self.output_path, 0, "segment", self._fragment_start,
+                                            end - self._fragment_start))
+                    self._fragment_start = None
+                self._offset = end
+
+    def _poll_playlist(self):
+        try:
+            with open(self.output_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        directory = os.path.dirname(os.path.abspath(self.output_path))
+        duration = 0.0
+        for line in lines:
+            line = line.strip()
+            if line.startswith("#EXT-X-MAP:") and "init" not in self._announced:
+                uri = re.search(r'URI="([^"]+)"', line)
+                if uri:
+                    self._announced.add("init")
+                    path = os.path.join(directory, uri.group(1))
+                    self._emit(SegmentEvent(path, 0, "init", size=os.path.getsize(path)))
+            elif line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0] or 0)
+            elif line and not line.startswith("#") and line not in self._announced:
+                self._announced.add(line)
+                path = os.path.join(directory, line)
+                self._emit(SegmentEvent(path, 0, "segment", size=os.path.getsize(path), duration=duration))
+
+    def _poll_dash(self, final: bool):
+        stem = glob.escape(_get_stem(self.output_path))
+        for path in sorted(glob.glob(f"{stem}-init-stream*.m4s")):
+            if path not in self._announced:
+                self._announced.add(path)
+                self._emit(SegmentEvent(path, 0, "init", size=os.path.getsize(path)))
+        latest = {}
+        segments = []
+        for path in glob.glob(f"{stem}-stream*-*.m4s"):
+            match = DASH_SEGMENT_PATTERN.search(path)
+            if match:
+                stream, number = int(match.group(1)), int(match.group(2))
+                latest[stream] = max(latest.get(stream, 0), number)
+                segments.append((number, stream, path))
+        for number, stream, path in sorted(segments):
+            if path not in self._announced and (final or number < latest[stream]):
+                self._announced.add(path)
+                self._emit(SegmentEvent(path, 0, "segment", size=os.path.getsize(path)))
+
+
+def run_segment_hook(command: str, event: SegmentEvent):
+    # Hook chạy nền để không làm chậm bước mã hóa; thông tin đoạn được truyền qua biến môi trường
+    env = {**os.environ, 'SEGMENT_PATH': event.path, 'SEGMENT_INDEX': str(event.index), 'SEGMENT_KIND': event.kind,
+           'SEGMENT_OFFSET': str(event.offset), 'SEGMENT_SIZE': str(event.size),
+           'SEGMENT_DURATION': f"{event.duration:g}"}
+    subprocess.Popen(command, shell=True, env=env, stdin=subprocess.DEVNULL, creationflags=get_creation_flags())
@@ -0,0 +1,204 @@
+# supervisor.py
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+from ffmpeg_tools import get_creation_flags
+from progress import parse_progress_block
+
+SUPERVISOR_POLL_INTERVAL = 0.1
+STOP_TIMEOUT = 5
+LOG_TAIL_LINES = 20
+DEFAULT_STALL_TIMEOUT = 120
+DEFAULT_STALL_RETRIES = 1
+PROCESS_SUSPEND_RESUME = 0x0800
+
+
+class FFmpegError(RuntimeError):
+    def __init__(self, returncode: int, log_tail):
+        last_line = log_tail[-1] if log_tail else ""
+        super().__init__(f"FFmpeg thoát với mã lỗi {returncode}." + (f" {last_line}" if last_line else ""))
+        self.returncode = returncode
+        self.log_tail = list(log_tail)
+
+
+class FFmpegStalledError(RuntimeError):
+    pass
+
+
+class FFmpegTimeoutError(RuntimeError):
+    pass
+
+
+@dataclass
+class SupervisorLimits:
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT
+    stall_retries: int = DEFAULT_STALL_RETRIES
+    deadline: float | None = None
+    on_retry: Callable | None = None
+    on_exit: Callable | None = None
+
+
+def _call_nt_process_function(pid: int, function_name: str):
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_SUSPEND_RESUME, False, pid)
+    if not handle:
+        raise OSError(f"Không thể mở tiến trình {pid}.")
+    try:
+        getattr(ctypes.windll.ntdll, function_name)(handle)
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def suspend_process(pid: int):
+    if sys.platform == "win32":
+        _call_nt_process_function(pid, "NtSuspendProcess")
+    else:
+        os.kill(pid, signal.SIGSTOP)
+
+
+def resume_process(pid: int):
+    if sys.platform == "win32":
+        _call_nt_process_function(pid, "NtResumeProcess")
+    else:
+        os.kill(pid, signal.SIGCONT)
+
+
+class FFmpegSupervisor:
+    def __init__(self, command, pause_event, cancel_requested_getter, on_progress=None, on_log=None,
+                 stall_timeout: float = 0.0, deadline: float | None = None, on_exit=None):
+        self.command = command
+        self.pause_event = pause_event
+        self.cancel_requested_getter = cancel_requested_getter
+        self.on_progress = on_progress
+        self.on_log = on_log
+        self.stall_timeout = stall_timeout
+        self.deadline = deadline
+        self.on_exit = on_exit
+        self.process = None
+        self.startup_time = None
+        self.suspended = False
+        self.stop_reason = None
+        self.log_tail = deque(maxlen=LOG_TAIL_LINES)
+        self._last_activity = time.monotonic()
+        self._lock = threading.Lock()
+
+    def run(self) -> bool:
+        while not self.pause_event.is_set():
+            if self.cancel_requested_getter():
+                return False
+            self.pause_event.wait(SUPERVISOR_POLL_INTERVAL)
+        if self.cancel_requested_getter():
+            return False
+
+        # stdout chỉ chứa khối key=value của -progress, log của ffmpeg đi riêng qua stderr
+        self.process = subprocess.Popen(
+            [self.command[0], '-nostats', '-progress', 'pipe:1', *self.command[1:]],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+            universal_newlines=True, encoding='utf-8', errors='ignore',
+            creationflags=get_creation_flags()
+        )
+        started_at = self._last_activity = time.monotonic()
+        log_thread = threading.Thread(target=self._drain_log, daemon=True)
+        watch_thread = threading.Thread(target=self._watch, daemon=True)
+        log_thread.start()
+        watch_thread.start()
+        try:
+            self._read_progress()
+            self.process.wait()
+        finally:
+            if self.process.poll() is None:
+                self._stop("cancelled")
+        watch_thread.join(timeout=1)
+        log_thread.join(timeout=1)
+        if self.on_exit:
+            self.on_exit(self.process.returncode, time.monotonic() - started_at,
+                         self.startup_time - started_at if self.startup_time else None, self.stop_reason)
+
+        if self.stop_reason == "cancelled":
+            return False
+        if self.stop_reason == "stalled":
+            raise FFmpegStalledError(f"FFmpeg không tiến triển trong {self.stall_timeout:g} giây.")
+        if self.stop_reason == "timeout":
+            raise FFmpegTimeoutError("Job vượt quá thời gian cho phép.")
+        if self.process.returncode != 0:
+            if self.cancel_requested_getter():
+                return False
+            raise FFmpegError(self.process.returncode, self.log_tail)
+        return True
+
+    def _read_progress(self):
+        fields = {}
+        last_key = None
+        for line in self.process.stdout:
+            key, _, value = line.strip().partition("=")
+            fields[key] = value
+            if key != "progress":
+                continue
+            if self.startup_time is None:
+                self.startup_time = time.monotonic()
+            activity_key = (fields.get('frame'), fields.get('out_time_us'), fields.get('total_size'))
+            if activity_key != last_key:
+                last_key = activity_key
+                self._last_activity = time.monotonic()
+            if self.on_progress:
+                self.on_progress(parse_progress_block(fields))
+            fields = {}
+
+    def _drain_log(self):
+        for log_line in self.process.stderr:
+            log_line = log_line.rstrip()
+            if log_line:
+                self.log_tail.append(log_line)
+                if self.on_log:
+                    self.on_log(log_line)
+
+    def _watch(self):
+        while self.process.poll() is None:
+            now = time.monotonic()
+            if self.cancel_requested_getter():
+                self._stop("cancelled")
+            elif self.deadline is not None and now > self.deadline:
+                self._stop("timeout")
+            elif not self.pause_event.is_set():
+                if not self.suspended:
+                    self._set_suspended(True)
+            elif self.suspended:
+                self._set_suspended(False)
+                self._last_activity = time.monotonic()
+            elif self.stall_timeout > 0 and now - self._last_activity > self.stall_timeout:
+                self._stop("stalled")
+            time.sleep(SUPERVISOR_POLL_INTERVAL)
+
+    def _set_suspended(self, suspended: bool):
+        with self._lock:
+            if self.process.poll() is not None:
+                return
+            try:
+                if suspended:
+                    suspend_process(self.process.pid)
+                else:
+                    resume_process(self.process.pid)
+                self.suspended = suspended
+            except OSError:
+                pass
+
+    def _stop(self, reason: str):
+        with self._lock:
+            if self.stop_reason is None:
+                self.stop_reason = reason
+        if self.suspended:
+            self._set_suspended(False)
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_paths import atomic_write, evict_lru  # noqa: E402
+
+
+class AppPathsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_evict_lru_keeps_most_recent_matching_entries(self):
+        for index in range(4):
+            path = os.path.join(self.directory, f"{index}.json")
+            open(path, 'w').close()
+            os.utime(path, (index, index))
+        os.makedirs(os.path.join(self.directory, "old_dir"))
+        os.utime(os.path.join(self.directory, "old_dir"), (0, 0))
+        open(os.path.join(self.directory, "busy.partial"), 'w').close()
+        removed = evict_lru(self.directory, 2, lambda name: not name.endswith(".partial"))
+        self.assertEqual(sorted(os.path.basename(path) for path in removed), ["0.json", "1.json", "old_dir"])
+        self.assertEqual(sorted(os.listdir(self.directory)), ["2.json", "3.json", "busy.partial"])
+
+    def test_atomic_write_leaves_old_file_on_error(self):
+        path = os.path.join(self.directory, "state.json")
+        with atomic_write(path) as f:
+            f.write("old")
+        with self.assertRaises(RuntimeError):
+            with atomic_write(path) as f:
+                f.write("new")
+                raise RuntimeError
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "old")
+        self.assertEqual(os.listdir(self.directory), ["state.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
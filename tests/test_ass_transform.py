@@ -0,0 +1,47 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_transform import TransformResult, build_speaker_pattern, transform_lines  # noqa: E402
+
+SUBTITLE = """[Script Info]
+ScriptType: v4.00+
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize
+Style: Default,Arial,20
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,LILY: Hello, world
+Dialogue: 0,0:00:02.00,0:00:03.00,Default,,0,0,0,,{\\an8}Haewon:hi
+Dialogue: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,BAEK: not a speaker
+Dialogue: 0,0:00:04.00,0:00:05.00,Default,Narrator,0,0,0,,Existing actor"""
+
+
+def transform(lines) -> tuple[list[str], TransformResult]:
+    result = TransformResult(source="test.ass")
+    return list(transform_lines(lines, build_speaker_pattern(["LILY", "HAEWON", "BAE"]), result)), result
+
+
+class TransformLinesTest(unittest.TestCase):
+    def test_inserts_actor_lines(self):
+        output, result = transform(SUBTITLE.splitlines())
+        self.assertEqual(result.speakers, {"LILY": 1, "HAEWON": 1})
+        self.assertEqual((result.actor_lines, result.kept_actor_lines), (3, 0))
+        self.assertTrue(result.added_style)
+        self.assertIn("Dialogue: 0,0:00:01.00,0:00:02.00,ActorStyle,,0,0,0,,LILY", output)
+        self.assertEqual(output[-1], "Dialogue: 0,0:00:04.00,0:00:05.00,ActorStyle,,0,0,0,,Narrator")
+
+    def test_rerun_keeps_output_and_counts_nothing_new(self):
+        first, _ = transform(SUBTITLE.splitlines())
+        second, result = transform(first)
+        self.assertEqual(second, first)
+        self.assertEqual((result.actor_lines, result.kept_actor_lines), (0, 3))
+        self.assertFalse(result.added_style)
+
+
+if __name__ == "__main__":
+    unittest.main()
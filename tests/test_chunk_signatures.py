@@ -0,0 +1,100 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_journal import apply_chunk_signatures, get_chunk_signatures  # noqa: E402
+
+SUBTITLE = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+WrapStyle: 0
+
+[Aegisub Project Garbage]
+Active Line: 3
+Scroll Position: 0
+Video Position: 120
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize
+Style: Default,Arial,48
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,first chunk
+Dialogue: 0,0:00:11.00,0:00:13.00,Default,,0,0,0,,second chunk
+Dialogue: 0,0:00:19.00,0:00:21.00,Default,,0,0,0,,spans two chunks
+Dialogue: 0,0:00:25.00,0:00:27.00,Default,,0,0,0,,third chunk
+"""
+CHUNKS = [{'start': 0.0, 'end': 10.0}, {'start': 10.0, 'end': 20.0}, {'start': 20.0, 'end': 30.0}]
+
+
+def make_journal(lines) -> dict:
+    # Giống lần chạy đầu: ghi chữ ký khi chưa đoạn nào xong, rồi coi như mọi đoạn đã mã hóa
+    journal = {'chunks': [{**chunk, 'done': False} for chunk in CHUNKS], 'events': []}
+    apply_chunk_signatures(journal, *get_chunk_signatures(lines, journal['chunks']))
+    for chunk in journal['chunks']:
+        chunk['done'] = True
+    return journal
+
+
+def edit(text: str, old: str, new: str) -> list[str]:
+    assert old in text
+    return text.replace(old, new).splitlines()
+
+
+def changed_indexes(journal, lines) -> tuple[list[int], int, int]:
+    changed, added, removed = apply_chunk_signatures(journal, *get_chunk_signatures(lines, journal['chunks']))
+    return [journal['chunks'].index(chunk) for chunk in changed], added, removed
+
+
+class ChunkSignatureTest(unittest.TestCase):
+    def setUp(self):
+        self.journal = make_journal(SUBTITLE.splitlines())
+
+    def test_unchanged_subtitle_keeps_all_chunks(self):
+        self.assertEqual(changed_indexes(self.journal, SUBTITLE.splitlines()), ([], 0, 0))
+        self.assertTrue(all(chunk['done'] for chunk in self.journal['chunks']))
+
+    def test_edited_line_marks_only_its_chunk(self):
+        lines = edit(SUBTITLE, "second chunk", "second chunk, fixed typo")
+        self.assertEqual(changed_indexes(self.journal, lines), ([1], 1, 1))
+        self.assertEqual([chunk['done'] for chunk in self.journal['chunks']], [True, False, True])
+
+    def test_line_spanning_boundary_marks_both_chunks(self):
+        lines = edit(SUBTITLE, "spans two chunks", "spans two chunks!")
+        self.assertEqual(changed_indexes(self.journal, lines)[0], [1, 2])
+
+    def test_added_line_marks_its_chunk(self):
+        lines = edit(SUBTITLE, "Dialogue: 0,0:00:25.00",
+                     "Dialogue: 0,0:00:05.00,0:00:06.00,Default,,0,0,0,,new line\nDialogue: 0,0:00:25.00")
+        self.assertEqual(changed_indexes(self.journal, lines), ([0], 1, 0))
+
+    def test_aegisub_project_garbage_is_ignored(self):
+        lines = edit(SUBTITLE, "Active Line: 3\nScroll Position: 0", "Active Line: 17\nScroll Position: 42")
+        self.assertEqual(changed_indexes(self.journal, lines)[0], [])
+
+    def test_style_change_marks_every_chunk(self):
+        lines = edit(SUBTITLE, "Style: Default,Arial,48", "Style: Default,Arial,52")
+        self.assertEqual(changed_indexes(self.journal, lines)[0], [0, 1, 2])
+
+    def test_play_res_change_marks_every_chunk(self):
+        lines = edit(SUBTITLE, "PlayResY: 1080", "PlayResY: 720")
+        self.assertEqual(changed_indexes(self.journal, lines)[0], [0, 1, 2])
+
+    def test_kerning_and_language_change_marks_every_chunk(self):
+        for old, new in (("WrapStyle: 0", "WrapStyle: 0\nKerning: yes"), ("WrapStyle: 0", "WrapStyle: 0\nLanguage: vi")):
+            with self.subTest(new=new):
+                self.assertEqual(changed_indexes(make_journal(SUBTITLE.splitlines()), edit(SUBTITLE, old, new))[0],
+                                 [0, 1, 2])
+
+    def test_chunk_not_yet_encoded_is_not_reported(self):
+        self.journal['chunks'][1]['done'] = False
+        lines = edit(SUBTITLE, "second chunk", "second chunk, fixed typo")
+        self.assertEqual(changed_indexes(self.journal, lines)[0], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distributed import Coordinator, RenderWorker, serve_coordinator  # noqa: E402
+from job_queue import FINISHED_STATUSES, STATUS_DONE, STATUS_FAILED  # noqa: E402
+from processor import FFMPEG_PATH_ENV  # noqa: E402
+from render_journal import JOURNAL_FILE_NAME, get_parts_dir  # noqa: E402
+
+# ffmpeg giả: in thông tin của một video 4 giây (keyframe mỗi giây), chia đoạn theo -segment_times và ghi file đầu
+# ra cuối dòng lệnh, đủ để chạy qua các chế độ một lượt và có thể tiếp tục
+FAKE_FFMPEG = """import os
+import sys
+
+args = sys.argv[1:]
+
+
+def value(flag):
+    return args[args.index(flag) + 1] if flag in args else None
+
+
+sys.stderr.write("Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'source.mp4':\\n"
+                 "  Duration: 00:00:04.00, start: 0.000000, bitrate: 100 kb/s\\n"
+                 "  Stream #0:0(und): Video: h264 (High), yuv420p, 320x180, 25 fps, 25 tbr\\n")
+if args[-1] == '-':
+    if value('-f') == 'framecrc':
+        print("#tb 0: 1/25")
+        for pts in range(100):
+            print(f"0, {pts}, {pts}, 1, 100, 0x00000000" + ("" if pts % 25 == 0 else ", F=0x0"))
+    sys.exit(0)
+if value('-f') == 'segment':
+    times = [float(t) for t in (value('-segment_times') or "").split(",") if t]
+    bounds = [0.0] + times + [4.0]
+    with open(value('-segment_list'), 'w') as segment_list:
+        for index in range(len(bounds) - 1):
+            name = os.path.basename(args[-1]) % index
+            with open(os.path.join(os.path.dirname(args[-1]), name), 'wb') as f:
+                f.write(b"piece")
+            segment_list.write(f"{name},{bounds[index]:.6f},{bounds[index + 1]:.6f}\\n")
+else:
+    with open(args[-1], 'wb') as f:
+        f.write(b"video")
+print("out_time_us=4000000")
+print("progress=end")
+"""
+SUBTITLE = """[Script Info]
+ScriptType: v4.00+
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize
+Style: Default,Arial,20
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,xin chào
+"""
+
+
+@unittest.skipIf(os.name == 'nt', "ffmpeg giả là script chạy bằng shebang")
+class CoordinatorWorkerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.output_dir = self.path("out")
+        os.makedirs(self.output_dir)
+        ffmpeg_path = self.path("ffmpeg")
+        with open(ffmpeg_path, 'w', encoding='utf-8') as f:
+            f.write(f"#!{sys.executable}\n{FAKE_FFMPEG}")
+        os.chmod(ffmpeg_path, os.stat(ffmpeg_path).st_mode | stat.S_IXUSR)
+        for name, content in (("source.mp4", "video"), ("logo.png", "logo"), ("sub.ass", SUBTITLE)):
+            with open(self.path(name), 'w', encoding='utf-8') as f:
+                f.write(content)
+        patcher = mock.patch.dict(os.environ, {FFMPEG_PATH_ENV: ffmpeg_path,
+                                               'XDG_CACHE_HOME': self.path("cache")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.coordinator = Coordinator(lease_timeout=10)
+        server = serve_coordinator(self.coordinator, port=0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(self.coordinator.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        stop_event = threading.Event()
+        threads = [threading.Thread(target=RenderWorker(url, f"w{index}", self.path(f"worker{index}"),
+                                                        heartbeat_interval=0.2, poll_interval=0.1).run,
+                                    args=(stop_event,), daemon=True) for index in range(2)]
+        for thread in threads:
+            thread.start()
+        self.addCleanup(lambda: [thread.join(10) for thread in threads])
+        self.addCleanup(stop_event.set)
+
+    def path(self, *names) -> str:
+        return os.path.join(self.root, *names)
+
+    def submit(self, name: str, **options):
+        return self.coordinator.submit({'video_path': self.path("source.mp4"), 'logo_path': self.path("logo.png"),
+                                        'subtitle_path': self.path("sub.ass"),
+                                        'output_path': os.path.join(self.output_dir, name), 'logo_width': "32",
+                                        'margin_top': "4", 'margin_right': "4", 'bitrate': "500",
+                                        'codec': "libx264", **options})
+
+    def wait_for_jobs(self):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if all(job.status in FINISHED_STATUSES for job in self.coordinator.jobs.values()):
+                return
+            time.sleep(0.1)
+        self.fail("Job không xong trong thời gian chờ.")
+
+    def test_outputs_and_journal_reach_final_paths(self):
+        jobs = [self.submit("a.mp4"), self.submit("b.mp4", incremental=True), self.submit("c.mp4", resumable=True)]
+        self.wait_for_jobs()
+        self.assertEqual([(job.status, job.error) for job in jobs], [(STATUS_DONE, "")] * 3)
+        self.assertEqual({worker['worker_id'] for worker in self.coordinator.status()['workers']}, {"w0", "w1"})
+        # Không còn thư mục tạm của lượt thuê; nhật ký của chế độ incremental nằm cạnh file đích để lần sau dùng lại
+        self.assertEqual(sorted(os.listdir(self.output_dir)), [".b.mp4.parts", "a.mp4", "b.mp4", "c.mp4"])
+        parts_dir = get_parts_dir(os.path.join(self.output_dir, "b.mp4"))
+        self.assertTrue(os.path.exists(os.path.join(parts_dir, JOURNAL_FILE_NAME)))
+
+    def test_failed_rename_marks_job_failed(self):
+        # Chỗ đích là thư mục không rỗng nên bước đổi tên cuối cùng thất bại
+        os.makedirs(os.path.join(self.output_dir, "a.mp4", "keep"))
+        job = self.submit("a.mp4")
+        self.wait_for_jobs()
+        self.assertEqual(job.status, STATUS_FAILED)
+        self.assertIn("Không chuyển được kết quả", job.error)
+        self.assertEqual(os.listdir(self.output_dir), ["a.mp4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from font_resolver import collect_embedded_font_names, decode_embedded_font, prepare_fonts  # noqa: E402
+
+
+def make_font(family: str) -> bytes:
+    # sfnt tối giản chỉ có bảng name với một bản ghi họ font (Windows, UTF-16BE)
+    name = family.encode('utf-16-be')
+    name_table = struct.pack(">HHH", 0, 1, 18) + struct.pack(">HHHHHH", 3, 1, 0x409, 1, len(name), 0) + name
+    return (struct.pack(">IHHHH", 0x00010000, 1, 0, 0, 0) + struct.pack(">4sIII", b"name", 0, 28, len(name_table))
+            + name_table)
+
+
+def encode_embedded_font(data: bytes) -> list[str]:
+    encoded = ""
+    for start in range(0, len(data), 3):
+        group = data[start:start + 3]
+        value = int.from_bytes(group + b"\0" * (3 - len(group)), 'big')
+        chars = [chr(((value >> shift) & 0x3F) + 33) for shift in (18, 12, 6, 0)]
+        encoded += "".join(chars[:len(group) + 1])
+    return [encoded[start:start + 80] for start in range(0, len(encoded), 80)]
+
+
+def make_subtitle(*embedded) -> list[str]:
+    lines = ["[Script Info]", "ScriptType: v4.00+", "", "[V4+ Styles]", "Format: Name, Fontname, Fontsize",
+             "Style: Default,Embedded Sans,20", "Style: Sign,Truly Missing,20", "", "[Fonts]"]
+    for file_name, data in embedded:
+        lines += [f"fontname: {file_name}", *encode_embedded_font(data)]
+    return lines + ["", "[Events]", "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+                    "Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,a",
+                    "Dialogue: 0,0:00:01.00,0:00:02.00,Sign,,0,0,0,,b"]
+
+
+class EmbeddedFontTest(unittest.TestCase):
+    def test_decode_round_trips_every_tail_length(self):
+        for length in (1, 2, 3, 100, 101, 102):
+            data = bytes(range(256))[:length]
+            with self.subTest(length=length):
+                self.assertEqual(decode_embedded_font("".join(encode_embedded_font(data))), data)
+
+    def test_names_come_from_font_data_or_file_name(self):
+        lines = make_subtitle(("whatever_0.ttf", make_font("Embedded Sans")), ("Other Font_B0.ttf", b"not a font"))
+        self.assertEqual(collect_embedded_font_names(lines), {"embedded sans", "other font"})
+
+    def test_embedded_font_is_not_reported_missing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            subtitle_path = os.path.join(directory, "sub.ass")
+            with open(subtitle_path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(make_subtitle(("sans_0.ttf", make_font("Embedded Sans")))))
+            preflight = prepare_fonts(subtitle_path, cache_dir=os.path.join(directory, "cache"))
+        self.assertEqual(preflight.missing, ["Truly Missing"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processor import run_processing_logic  # noqa: E402
+
+
+class JobMetricsErrorTest(unittest.TestCase):
+    def test_unwritable_metrics_dir_is_reported_as_job_error(self):
+        with tempfile.NamedTemporaryFile() as blocker:
+            # metrics_dir nằm dưới một file thường nên không tạo được
+            params = {'metrics_dir': os.path.join(blocker.name, "metrics"), 'output_path': "out.mp4"}
+            messages = []
+            pause_event = threading.Event()
+            pause_event.set()
+            self.assertFalse(run_processing_logic(params, messages.append, pause_event, lambda: False))
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith("Lỗi:"), messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import (STATUS_DONE, STATUS_FAILED, STATUS_PENDING, STATUS_RUNNING, Job,  # noqa: E402
+                       JobQueue)
+
+
+class JobQueueStateTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.state_path = os.path.join(directory.name, "state.json")
+        day = 86400
+        jobs = [Job({}, job_id="old-done", status=STATUS_DONE, finished_at=time.time() - 10 * day),
+                Job({}, job_id="old-failed", status=STATUS_FAILED, finished_at=time.time() - day),
+                Job({}, job_id="pending", status=STATUS_PENDING),
+                Job({}, job_id="interrupted", status=STATUS_RUNNING)]
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump({'jobs': [asdict(job) for job in jobs]}, f)
+
+    def test_summary_of_current_run_skips_finished_jobs(self):
+        queue = JobQueue(state_path=self.state_path)
+        job = queue.submit({'output_path': "new.mp4"})
+        self.assertEqual({row['job_id'] for row in queue.summary(current_run=True)},
+                         {"pending", "interrupted", job.job_id})
+        self.assertEqual(len(queue.summary()), 5)
+
+    def test_prune_removes_only_finished_jobs(self):
+        queue = JobQueue(state_path=self.state_path)
+        removed = queue.prune(older_than=2 * 86400)
+        self.assertEqual([job.job_id for job in removed], ["old-done"])
+        removed = queue.prune((STATUS_FAILED,))
+        self.assertEqual([job.job_id for job in removed], ["old-failed"])
+        self.assertEqual(set(JobQueue(state_path=self.state_path).jobs), {"pending", "interrupted"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import load_manifest  # noqa: E402
+from processor import get_render_mode  # noqa: E402
+
+HEADER = "video_path,output_path,smart_render,resumable,parallel_segments,threads\n"
+
+
+class CsvManifestTest(unittest.TestCase):
+    def load(self, rows: str) -> list[dict]:
+        with tempfile.NamedTemporaryFile('w', suffix=".csv", delete=False, encoding='utf-8') as f:
+            f.write(HEADER + rows)
+        self.addCleanup(os.remove, f.name)
+        return load_manifest(f.name)
+
+    def test_false_strings_disable_flags(self):
+        for value in ("false", "0", "no", "off", ""):
+            job = self.load(f"a.mp4,b.mp4,{value},{value},,\n")[0]
+            self.assertIs(job['smart_render'], False)
+            self.assertEqual(get_render_mode(job, []), "single_pass")
+
+    def test_true_strings_enable_flags(self):
+        for value in ("true", "1", "Yes", "on"):
+            self.assertEqual(get_render_mode(self.load(f"a.mp4,b.mp4,{value},,,\n")[0], []), "smart_render")
+
+    def test_integers_are_converted(self):
+        job = self.load("a.mp4,b.mp4,,,4, 2 \n")[0]
+        self.assertEqual((job['parallel_segments'], job['threads']), (4, 2))
+        self.assertEqual(get_render_mode(job, []), "segmented")
+
+    def test_invalid_value_reports_line(self):
+        with self.assertRaisesRegex(ValueError, "dòng 3"):
+            self.load("a.mp4,b.mp4,,,,\na.mp4,b.mp4,maybe,,,\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
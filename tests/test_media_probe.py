@@ -0,0 +1,66 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_probe import probe_keyframes, probe_media  # noqa: E402
+
+# ffmpeg giả ghi lại từng lần gọi; chỉ in danh sách packet khi được yêu cầu framecrc
+FAKE_FFMPEG = """import sys
+
+with open(sys.argv[0] + ".calls", 'a') as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+sys.stderr.write("Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'source.mp4':\\n"
+                 "  Duration: 00:00:04.00, start: 0.000000, bitrate: 100 kb/s\\n"
+                 "  Stream #0:0(und): Video: h264 (High), yuv420p, 320x180, 25 fps, 25 tbr\\n"
+                 "  Stream #0:1(und): Audio: aac (LC), 44100 Hz, stereo, fltp, 128 kb/s\\n"
+                 "Stream mapping:\\n")
+if 'framecrc' in sys.argv:
+    print("#tb 0: 1/25")
+    for pts in range(100):
+        print(f"0, {pts}, {pts}, 1, 100, 0x00000000" + ("" if pts % 50 == 0 else ", F=0x0"))
+"""
+
+
+@unittest.skipIf(os.name == 'nt', "ffmpeg giả là script chạy bằng shebang")
+class ProbeMediaTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.ffmpeg_path = os.path.join(directory.name, "ffmpeg")
+        with open(self.ffmpeg_path, 'w', encoding='utf-8') as f:
+            f.write(f"#!{sys.executable}\n{FAKE_FFMPEG}")
+        os.chmod(self.ffmpeg_path, os.stat(self.ffmpeg_path).st_mode | stat.S_IXUSR)
+        self.video_path = os.path.join(directory.name, "source.mp4")
+        with open(self.video_path, 'wb') as f:
+            f.write(b"video")
+        self.cache_dir = os.path.join(directory.name, "cache")
+
+    def calls(self) -> list[str]:
+        try:
+            with open(self.ffmpeg_path + ".calls", encoding='utf-8') as f:
+                return ["framecrc" if "framecrc" in line else "header" for line in f]
+        except FileNotFoundError:
+            return []
+
+    def test_header_probe_does_not_scan_packets(self):
+        info = probe_media(self.video_path, self.ffmpeg_path, self.cache_dir)
+        self.assertEqual((info.duration, info.width, info.video_codec, info.has_audio), (4.0, 320, "h264", True))
+        self.assertIsNone(info.keyframes)
+        self.assertEqual(self.calls(), ["header"])
+
+    def test_keyframe_scan_runs_once_and_is_cached(self):
+        info = probe_media(self.video_path, self.ffmpeg_path, self.cache_dir)
+        self.assertEqual(probe_keyframes(self.video_path, info, self.ffmpeg_path, self.cache_dir), [0.0, 2.0])
+        self.assertEqual(probe_keyframes(self.video_path, info, self.ffmpeg_path, self.cache_dir), [0.0, 2.0])
+        cached = probe_media(self.video_path, self.ffmpeg_path, self.cache_dir)
+        self.assertEqual(cached.keyframes, [0.0, 2.0])
+        self.assertEqual(probe_keyframes(self.video_path, cached, self.ffmpeg_path, self.cache_dir), [0.0, 2.0])
+        self.assertEqual(self.calls(), ["header", "framecrc"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import preview  # noqa: E402
+from media_probe import MediaInfo  # noqa: E402
+
+
+def fake_run_ffmpeg(command, pause_event, cancel_requested_getter):
+    with open(command[-1], 'wb') as f:
+        f.write(b"png")
+    return True
+
+
+class RenderPreviewCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        for name in ("ffmpeg", "source.mp4", "logo.png", "sub.ass"):
+            with open(os.path.join(self.root, name), 'w', encoding='utf-8') as f:
+                f.write(name)
+        self.params = {'video_path': self.path("source.mp4"), 'logo_path': self.path("logo.png"),
+                       'subtitle_path': self.path("sub.ass"), 'logo_width': "32", 'margin_top': "4",
+                       'margin_right': "4", 'bitrate': "500", 'codec': "libx264"}
+        for target, value in (('get_ffmpeg_path', lambda: self.path("ffmpeg")),
+                              ('probe_media', lambda *args, **kwargs: MediaInfo(duration=10.0)),
+                              ('run_ffmpeg', fake_run_ffmpeg)):
+            patcher = mock.patch.object(preview, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(preview, 'run_font_preflight', return_value=None)
+        self.font_preflight = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def render(self, timestamp="2"):
+        return preview.render_preview(self.params, timestamp, cache_dir=self.path("cache"))
+
+    def test_cached_preview_skips_font_preflight(self):
+        first = self.render()
+        self.assertEqual(self.render(), first)
+        self.assertEqual(self.font_preflight.call_count, 1)
+
+    def test_changed_inputs_render_again(self):
+        first = self.render()
+        os.makedirs(self.path("fonts"))
+        with open(os.path.join(self.path("fonts"), "Roboto.ttf"), 'wb') as f:
+            f.write(b"font")
+        self.assertNotEqual(self.render(), first)
+        self.params['speaker_lines'] = True
+        with mock.patch.object(preview, 'run_speaker_preprocess', side_effect=lambda params, callback: params):
+            self.assertNotEqual(self.render(), first)
+        self.assertEqual(self.font_preflight.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
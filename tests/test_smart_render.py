@@ -0,0 +1,89 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import processor  # noqa: E402
+
+FFMPEG = os.getenv(processor.FFMPEG_PATH_ENV) or shutil.which("ffmpeg")
+SUBTITLE = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 320
+PlayResY: 180
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize
+Style: Default,Arial,20
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:02.50,0:00:03.50,Default,,0,0,0,,giữa video
+"""
+
+
+def has_libx264() -> bool:
+    if not FFMPEG:
+        return False
+    result = subprocess.run([FFMPEG, '-hide_banner', '-encoders'], capture_output=True, text=True)
+    return result.returncode == 0 and "libx264" in result.stdout
+
+
+def run_ffmpeg(*args) -> subprocess.CompletedProcess:
+    return subprocess.run([FFMPEG, '-hide_banner', '-v', 'error', *args], capture_output=True, text=True)
+
+
+@unittest.skipUnless(has_libx264(), "cần ffmpeg có libx264")
+class SmartRenderTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.work_dir = directory.name
+        environment = {processor.FFMPEG_PATH_ENV: FFMPEG, 'XDG_CACHE_HOME': os.path.join(self.work_dir, "cache")}
+        patcher = mock.patch.dict(os.environ, environment)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.work_dir, name)
+
+    def make_inputs(self):
+        # Video gốc baseline, 1 khung tham chiếu, keyframe mỗi giây: khác hẳn SPS/PPS mà libx264 mặc định tạo ra
+        result = run_ffmpeg('-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=25:duration=6',
+                            '-f', 'lavfi', '-i', 'sine=duration=6', '-c:v', 'libx264', '-profile:v', 'baseline',
+                            '-refs', '1', '-g', '25', '-c:a', 'aac', '-shortest', self.path("source.mp4"))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        result = run_ffmpeg('-f', 'lavfi', '-i', 'color=red:size=32x32', '-frames:v', '1', self.path("logo.png"))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        with open(self.path("sub.ass"), 'w', encoding='utf-8') as f:
+            f.write(SUBTITLE)
+
+    def test_mixed_output_decodes_cleanly(self):
+        self.make_inputs()
+        output_path = self.path("out.mp4")
+        params = {'video_path': self.path("source.mp4"), 'logo_path': self.path("logo.png"),
+                  'subtitle_path': self.path("sub.ass"), 'output_path': output_path, 'logo_width': '32',
+                  'margin_top': '4', 'margin_right': '4', 'bitrate': '500', 'codec': 'libx264',
+                  'smart_render': True, 'logo_start': '2', 'logo_end': '3'}
+        messages = []
+        pause_event = threading.Event()
+        pause_event.set()
+        self.assertTrue(processor.run_processing_logic(params, messages.append, pause_event, lambda: False),
+                        messages)
+        self.assertTrue(any("Mã hóa lại" in str(message) for message in messages), messages)
+
+        with open(output_path, 'rb') as f:
+            self.assertIn(processor.IN_BAND_HEADER_TAG.encode('ascii'), f.read())
+        decoded = run_ffmpeg('-i', output_path, '-f', 'null', '-')
+        self.assertEqual((decoded.returncode, decoded.stderr), (0, ""))
+        frames = run_ffmpeg('-i', output_path, '-map', '0:v', '-f', 'framecrc', '-')
+        self.assertEqual(sum(1 for line in frames.stdout.splitlines() if not line.startswith('#')), 150)
+
+
+if __name__ == "__main__":
+    unittest.main()
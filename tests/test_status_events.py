@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from status_events import LogBuffer, LogEvent  # noqa: E402
+
+
+def make_events(*messages) -> list[LogEvent]:
+    return [LogEvent(str(message)) for message in messages]
+
+
+class LogBufferTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spill_path = os.path.join(directory.name, "log.txt")
+        self.buffer = LogBuffer(max_lines=3, spill_path=self.spill_path)
+        self.addCleanup(self.buffer.close)
+
+    def messages(self) -> list[str]:
+        return [event.message for event in self.buffer.lines]
+
+    def test_small_batches_evict_oldest_lines(self):
+        self.assertEqual(self.buffer.extend(make_events(1, 2)), 0)
+        self.assertEqual(self.buffer.extend(make_events(3, 4)), 1)
+        self.assertEqual(self.messages(), ["2", "3", "4"])
+
+    def test_oversized_batch_counts_only_displayed_lines(self):
+        self.buffer.extend(make_events(1, 2))
+        batch = make_events(3, 4, 5, 6, 7)
+        self.assertEqual(self.buffer.extend(batch), 2)
+        self.assertEqual([event.message for event in self.buffer.get_visible(batch)], ["5", "6", "7"])
+        self.assertEqual(self.messages(), ["5", "6", "7"])
+        self.buffer.close()
+        with open(self.spill_path, encoding='utf-8') as f:
+            self.assertEqual([line.split()[-1] for line in f], ["1", "2", "3", "4"])
+
+
+if __name__ == "__main__":
+    unittest.main()